@@ -23,6 +23,7 @@ import salt.payload
 import salt.transport
 import salt.utils.args
 import salt.utils.jid
+import salt.utils.lazy
 import salt.defaults.exitcodes
 from salt.log import LOG_LEVELS
 from salt.utils import is_windows
@@ -194,6 +195,9 @@ class BaseCaller(object):
             func = self.minion.functions[fun]
             try:
                 ret['return'] = func(*args, **kwargs)
+                if isinstance(ret['return'], salt.utils.lazy.LazyDict):
+                    # The lazy grains and pillar of --lazy-startup
+                    ret['return'] = dict(ret['return'])
             except TypeError as exc:
                 sys.stderr.write('\nPassed invalid arguments: {0}.\n\nUsage:\n'.format(exc))
                 print_cli(func.__doc__)
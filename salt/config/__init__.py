@@ -234,6 +234,17 @@ VALID_OPTS = {
     # Whether or not processes should be forked when needed. The altnerative is to use threading.
     'multiprocessing': bool,
 
+    # The number of pre-forked processes which run the jobs of a minion. When
+    # set to 0 a new process is forked for each job.
+    'job_workers': int,
+
+    # The number of jobs a job worker runs before it is replaced by a new one
+    'job_worker_max_jobs': int,
+
+    # The number of jobs which may wait for a free job worker, 0 is unlimited.
+    # Jobs which do not fit in the queue run in a new process.
+    'job_worker_queue_size': int,
+
     # Schedule a mine update every n number of seconds
     'mine_interval': int,
 
@@ -246,6 +257,14 @@ VALID_OPTS = {
     # The chunk size to use when streaming files with the file server
     'file_buffer_size': int,
 
+    # The number of file_buffer_size chunks which are sent in a single reply
+    # when streaming files from the file server
+    'file_transfer_window': int,
+
+    # Only transfer the changed blocks of files which are already cached on
+    # the minion
+    'file_transfer_delta': bool,
+
     # The TCP port on which minion events should be published if ipc_mode is TCP
     'tcp_pub_port': int,
 
@@ -301,6 +320,14 @@ VALID_OPTS = {
     # Tell the loader to attempt to import *.zip archives
     'enable_zip_modules': bool,
 
+    # Tell the loader to remember which module files load under which name and
+    # which ones fail to load, and to skip importing them while nothing changed
+    'virtual_cache': bool,
+
+    # The number of seconds after which the loader checks again the module
+    # files recorded in the virtual cache
+    'virtual_cache_ttl': int,
+
     # Tell the client to show minions that have timed out
     'show_timeout': bool,
 
@@ -322,6 +349,17 @@ VALID_OPTS = {
     # Fire events as state chunks are processed by the state compiler
     'state_events': bool,
 
+    # The number of states with parallel: True which may run at the same time
+    'state_parallelism': int,
+
+    # Reuse the compiled highstate as long as the files, grains and pillar it was compiled from
+    # do not change
+    'state_compile_cache': bool,
+
+    # Request the hashes of all of the salt:// files referenced by a state run from the master at
+    # once before running the states
+    'state_prefetch_hashes': bool,
+
     # The number of seconds a minion should wait before retry when attempting authentication
     'acceptance_wait_time': float,
 
@@ -425,6 +463,10 @@ VALID_OPTS = {
     # the number of connected minions increases.
     'worker_threads': int,
 
+    # A dict of request commands, like _pillar, which each MWorker runs in a thread pool instead
+    # of inline, mapped to the number of them a worker may run at the same time
+    'worker_offload_cmds': dict,
+
     # The port for the master to listen to returns on. The minion needs to connect to this port
     # to send returns.
     'ret_port': int,
@@ -459,6 +501,7 @@ VALID_OPTS = {
     'gitfs_env_whitelist': list,
     'gitfs_env_blacklist': list,
     'gitfs_ssl_verify': bool,
+    'gitfs_tree_index': bool,
     'hgfs_remotes': list,
     'hgfs_mountpoint': str,
     'hgfs_root': str,
@@ -488,6 +531,18 @@ VALID_OPTS = {
     # Whether or not a copy of the master opts dict should be rendered into minion pillars
     'pillar_opts': bool,
 
+    # Cache the compiled pillar of each minion on the master, see salt.pillar.PillarCache
+    'pillar_cache': bool,
+
+    # The number of seconds a compiled pillar is served from the pillar cache
+    'pillar_cache_ttl': int,
+
+    # Where the pillar cache is kept, 'disk' or 'memory'
+    'pillar_cache_backend': str,
+
+    # Encrypt the pillar cache with a key kept in the pki_dir
+    'pillar_cache_encrypt': bool,
+
     'pillar_safe_render_error': bool,
 
     # When creating a pillar, there are several strategies to choose from when
@@ -525,6 +580,10 @@ VALID_OPTS = {
     'fileserver_ignoresymlinks': bool,
     'fileserver_limit_traversal': bool,
 
+    # Keep a journal of the file_roots trees on the master so that the fileserver
+    # update only rehashes and relists what changed, using inotify when available
+    'fileserver_journal': bool,
+
     # The number of open files a daemon is allowed to have open. Frequently needs to be increased
     # higher than the system default in order to account for the way zeromq consumes file handles.
     'max_open_files': int,
@@ -556,12 +615,24 @@ VALID_OPTS = {
     # Specify whether the master should store end times for jobs as returns come in
     'job_cache_store_endtime': bool,
 
+    # Queue minion returns in each master worker and write them to the
+    # master_job_cache in batches of up to return_batch_size returns, at most
+    # return_batch_latency seconds after they arrive. 0 disables batching.
+    'return_batch_size': int,
+    'return_batch_latency': float,
+
     # The minion data cache is a cache of information about the minions stored on the master.
     # This information is primarily the pillar and grains data. The data is cached in the master
     # cachedir under the name of the minion and used to predetermine what minions are expected to
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Keep an in-memory index of the minion data cache in each master process
+    # so grain, pillar and ipcidr targets are matched without reading the cache
+    # from disk. The index is fully reloaded every minion_data_index_ttl seconds.
+    'minion_data_index': bool,
+    'minion_data_index_ttl': int,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -614,6 +685,19 @@ VALID_OPTS = {
     # The number of minutes between the minion refreshing its cache of grains
     'grains_refresh_every': int,
 
+    # The number of grain functions run at the same time in threads
+    'grains_threads': int,
+
+    # The number of seconds after which a grain function is given up on
+    'grains_timeout': int,
+
+    # Globs of grain function names mapped to the number of seconds their
+    # grains are cached for, instead of grains_cache_expiration
+    'grains_cache_ttl': dict,
+
+    # Only compute the grains and compile the pillar which salt-call reads
+    'lazy_startup': bool,
+
     # Use lspci to gather system data for grains on a minion
     'enable_lspci': bool,
 
@@ -628,6 +712,9 @@ VALID_OPTS = {
     # If this is set to True the first newline after a Jinja block is removed
     'jinja_trim_blocks': bool,
 
+    # Keep the bytecode of compiled Jinja templates in the cachedir
+    'jinja_bytecode_cache': bool,
+
     # FIXME Appears to be unused
     'minion_id_caching': bool,
 
@@ -640,6 +727,16 @@ VALID_OPTS = {
     # The transport system for this deamon. (i.e. zeromq, raet, etc)
     'transport': str,
 
+    # The compression to offer for encrypted payloads, negotiated when
+    # minions sign in. Set to False to disable compression
+    'transport_compression': str,
+
+    # Payloads smaller than this many bytes are not compressed
+    'transport_compression_threshold': int,
+
+    # Compress publications, every minion must support compression
+    'transport_compression_publish': bool,
+
     # FIXME Appears to be unused
     'enumerate_proxy_minions': bool,
 
@@ -723,6 +820,10 @@ VALID_OPTS = {
     # Use zmq.SUSCRIBE to limit listening sockets to only process messages bound for them
     'zmq_filtering': bool,
 
+    # Only deliver publications to the minions they target when using the
+    # TCP transport
+    'tcp_filtering': bool,
+
     # Connection caching. Can greatly speed up salt performance.
     'con_cache': bool,
     'rotate_aes_key': bool,
@@ -772,10 +873,15 @@ DEFAULT_MINION_OPTS = {
     'cache_jobs': False,
     'grains_cache': False,
     'grains_cache_expiration': 300,
+    'grains_cache_ttl': {},
+    'grains_threads': 0,
+    'grains_timeout': 0,
+    'lazy_startup': False,
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'minion'),
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'minion'),
     'backup_mode': '',
     'renderer': 'yaml_jinja',
+    'jinja_bytecode_cache': True,
     'failhard': False,
     'autoload_dynamic_modules': True,
     'environment': None,
@@ -848,10 +954,15 @@ DEFAULT_MINION_OPTS = {
     'auto_accept': True,
     'autosign_timeout': 120,
     'multiprocessing': _DFLT_MULTIPROCESSING_MODE,
+    'job_workers': 0,
+    'job_worker_max_jobs': 100,
+    'job_worker_queue_size': 0,
     'mine_interval': 60,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
     'file_buffer_size': 262144,
+    'file_transfer_window': 8,
+    'file_transfer_delta': True,
     'tcp_pub_port': 4510,
     'tcp_pull_port': 4511,
     'log_file': os.path.join(salt.syspaths.LOGS_DIR, 'minion'),
@@ -867,12 +978,17 @@ DEFAULT_MINION_OPTS = {
     'ext_job_cache': '',
     'cython_enable': False,
     'enable_zip_modules': False,
+    'virtual_cache': True,
+    'virtual_cache_ttl': 3600,
     'state_verbose': True,
     'state_output': 'full',
     'state_output_diff': False,
     'state_auto_order': True,
     'state_events': False,
     'state_aggregate': False,
+    'state_parallelism': 4,
+    'state_compile_cache': False,
+    'state_prefetch_hashes': True,
     'acceptance_wait_time': 10,
     'acceptance_wait_time_max': 0,
     'rejected_retry': False,
@@ -917,6 +1033,8 @@ DEFAULT_MINION_OPTS = {
     'minion_id_caching': True,
     'keysize': 2048,
     'transport': 'zeromq',
+    'transport_compression': 'zlib',
+    'transport_compression_threshold': 4096,
     'auth_timeout': 60,
     'auth_tries': 7,
     'auth_safemode': False,
@@ -957,6 +1075,7 @@ DEFAULT_MASTER_OPTS = {
     'auth_mode': 1,
     'user': 'root',
     'worker_threads': 5,
+    'worker_offload_cmds': {},
     'sock_dir': os.path.join(salt.syspaths.SOCK_DIR, 'master'),
     'ret_port': '4506',
     'timeout': 5,
@@ -1003,6 +1122,7 @@ DEFAULT_MASTER_OPTS = {
     'gitfs_env_whitelist': [],
     'gitfs_env_blacklist': [],
     'gitfs_ssl_verify': False,
+    'gitfs_tree_index': True,
     'hgfs_remotes': [],
     'hgfs_mountpoint': '',
     'hgfs_root': '',
@@ -1028,6 +1148,10 @@ DEFAULT_MASTER_OPTS = {
     'ext_pillar': [],
     'pillar_version': 2,
     'pillar_opts': False,
+    'pillar_cache': False,
+    'pillar_cache_ttl': 3600,
+    'pillar_cache_backend': 'disk',
+    'pillar_cache_encrypt': False,
     'pillar_safe_render_error': True,
     'pillar_source_merging_strategy': 'smart',
     'ping_on_rotate': False,
@@ -1045,18 +1169,22 @@ DEFAULT_MASTER_OPTS = {
     'file_recv': False,
     'file_recv_max_size': 100,
     'file_buffer_size': 1048576,
+    'file_transfer_window': 8,
+    'file_transfer_delta': True,
     'file_ignore_regex': None,
     'file_ignore_glob': None,
     'fileserver_backend': ['roots'],
     'fileserver_followsymlinks': True,
     'fileserver_ignoresymlinks': False,
     'fileserver_limit_traversal': False,
+    'fileserver_journal': True,
     'max_open_files': 100000,
     'hash_type': 'md5',
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'master'),
     'open_mode': False,
     'auto_accept': False,
     'renderer': 'yaml_jinja',
+    'jinja_bytecode_cache': True,
     'failhard': False,
     'state_top': 'top.sls',
     'state_top_saltenv': None,
@@ -1066,7 +1194,11 @@ DEFAULT_MASTER_OPTS = {
     'ext_job_cache': '',
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
+    'return_batch_size': 0,
+    'return_batch_latency': 0.1,
     'minion_data_cache': True,
+    'minion_data_index': True,
+    'minion_data_index_ttl': 3600,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
@@ -1130,6 +1262,9 @@ DEFAULT_MASTER_OPTS = {
     'sign_pub_messages': False,
     'keysize': 2048,
     'transport': 'zeromq',
+    'transport_compression': 'zlib',
+    'transport_compression_threshold': 4096,
+    'transport_compression_publish': False,
     'enumerate_proxy_minions': False,
     'gather_job_timeout': 5,
     'syndic_event_forward_timeout': 0.5,
@@ -1169,6 +1304,7 @@ DEFAULT_MASTER_OPTS = {
     'master_pubkey_signature': 'master_pubkey_signature',
     'master_use_pubkey_signature': False,
     'zmq_filtering': False,
+    'tcp_filtering': False,
     'zmq_monitor': False,
     'con_cache': False,
     'rotate_aes_key': True,
@@ -15,6 +15,8 @@ import logging
 import traceback
 import binascii
 import weakref
+import zlib
+import salt.ext.six as six
 from salt.ext.six.moves import zip  # pylint: disable=import-error,redefined-builtin
 
 # Import third party libs
@@ -45,6 +47,25 @@ import tornado.gen
 
 log = logging.getLogger(__name__)
 
+# Payload compression types, in order of preference
+COMPRESSION_TYPES = ('zlib',)
+
+
+def negotiate_compression(opts, offered):
+    '''
+    Return the payload compression to use with a peer which offered the
+    compression type, or list of types, ``offered``. Returns None if the
+    peer offered nothing which is enabled locally.
+    '''
+    local = opts.get('transport_compression')
+    if not local or local not in COMPRESSION_TYPES or not offered:
+        return None
+    if isinstance(offered, six.string_types):
+        offered = [offered]
+    if local in offered:
+        return local
+    return None
+
 
 def dropfile(cachedir, user=None):
     '''
@@ -369,7 +390,9 @@ class AsyncAuth(object):
         if key in AsyncAuth.creds_map:
             creds = AsyncAuth.creds_map[key]
             self._creds = creds
-            self._crypticle = Crypticle(self.opts, creds['aes'])
+            self._crypticle = Crypticle(self.opts,
+                                        creds['aes'],
+                                        compression=creds.get('compression'))
             self._authenticate_future = tornado.concurrent.Future()
             self._authenticate_future.set_result(True)
         else:
@@ -457,7 +480,9 @@ class AsyncAuth(object):
         else:
             AsyncAuth.creds_map[self.__key(self.opts)] = creds
             self._creds = creds
-            self._crypticle = Crypticle(self.opts, creds['aes'])
+            self._crypticle = Crypticle(self.opts,
+                                        creds['aes'],
+                                        compression=creds.get('compression'))
             self._authenticate_future.set_result(True)  # mark the sign-in as complete
 
     @tornado.gen.coroutine
@@ -562,6 +587,9 @@ class AsyncAuth(object):
                 if salt.utils.pem_finger(m_pub_fn) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['compression'] = negotiate_compression(
+            self.opts, payload.get('compression'))
+        auth['zmq_filtering'] = payload.get('zmq_filtering', False)
         raise tornado.gen.Return(auth)
 
     def get_keys(self):
@@ -622,6 +650,8 @@ class AsyncAuth(object):
             pass
         with salt.utils.fopen(self.pub_path) as f:
             payload['pub'] = f.read()
+        if self.opts.get('transport_compression') in COMPRESSION_TYPES:
+            payload['compression'] = [self.opts['transport_compression']]
         return payload
 
     def decrypt_aes(self, payload, master_pub=True):
@@ -970,7 +1000,9 @@ class SAuth(AsyncAuth):
                 continue
             break
         self._creds = creds
-        self._crypticle = Crypticle(self.opts, creds['aes'])
+        self._crypticle = Crypticle(self.opts,
+                                    creds['aes'],
+                                    compression=creds.get('compression'))
 
     def sign_in(self, timeout=60, safe=True, tries=1):
         '''
@@ -1075,6 +1107,9 @@ class SAuth(AsyncAuth):
                 if salt.utils.pem_finger(m_pub_fn) != self.opts['master_finger']:
                     self._finger_fail(self.opts['master_finger'], m_pub_fn)
         auth['publish_port'] = payload['publish_port']
+        auth['compression'] = negotiate_compression(
+            self.opts, payload.get('compression'))
+        auth['zmq_filtering'] = payload.get('zmq_filtering', False)
         return auth
 
     def _finger_fail(self, finger, master_key):
@@ -1098,17 +1133,28 @@ class Crypticle(object):
 
     Encryption algorithm: AES-CBC
     Signing algorithm: HMAC-SHA256
+
+    If a compression type is passed, serialized payloads larger than the
+    ``transport_compression_threshold`` are compressed before they are
+    encrypted. Compressed payloads are always accepted by ``loads``.
     '''
 
     PICKLE_PAD = 'pickle::'
+    ZLIB_PAD = 'zlib::'
     AES_BLOCK_SIZE = 16
     SIG_SIZE = hashlib.sha256().digest_size
 
-    def __init__(self, opts, key_string, key_size=192):
+    def __init__(self, opts, key_string, key_size=192, compression=None):
         self.key_string = key_string
         self.keys = self.extract_keys(self.key_string, key_size)
         self.key_size = key_size
         self.serial = salt.payload.Serial(opts)
+        self.compression = compression
+        self.compression_threshold = opts.get(
+            'transport_compression_threshold', 4096)
+        self.stats = {'compressed': 0,
+                      'raw_bytes': 0,
+                      'compressed_bytes': 0}
 
     @classmethod
     def generate_key_string(cls, key_size=192):
@@ -1157,18 +1203,38 @@ class Crypticle(object):
         data = cypher.decrypt(data)
         return data[:-ord(data[-1])]
 
-    def dumps(self, obj):
+    def dumps(self, obj, compression=None):
         '''
-        Serialize and encrypt a python object
+        Serialize and encrypt a python object, ``compression`` overrides the
+        compression type this Crypticle was created with
         '''
-        return self.encrypt(self.PICKLE_PAD + self.serial.dumps(obj))
+        data = self.serial.dumps(obj)
+        if compression is None:
+            compression = self.compression
+        if compression == 'zlib' and len(data) >= self.compression_threshold:
+            zdata = zlib.compress(data, 1)
+            if len(zdata) < len(data):
+                log.trace(
+                    'Compressed payload from {0} to {1} bytes'.format(
+                        len(data), len(zdata)
+                    )
+                )
+                self.stats['compressed'] += 1
+                self.stats['raw_bytes'] += len(data)
+                self.stats['compressed_bytes'] += len(zdata)
+                return self.encrypt(self.ZLIB_PAD + zdata)
+        return self.encrypt(self.PICKLE_PAD + data)
 
     def loads(self, data):
         '''
         Decrypt and un-serialize a python object
         '''
         data = self.decrypt(data)
+        if data.startswith(self.ZLIB_PAD):
+            data = zlib.decompress(data[len(self.ZLIB_PAD):])
         # simple integrity check to verify that we got meaningful data
-        if not data.startswith(self.PICKLE_PAD):
+        elif data.startswith(self.PICKLE_PAD):
+            data = data[len(self.PICKLE_PAD):]
+        else:
             return {}
-        return self.serial.loads(data[len(self.PICKLE_PAD):])
+        return self.serial.loads(data)
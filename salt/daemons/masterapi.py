@@ -411,6 +411,10 @@ class RemoteFuncs(object):
                 self.opts,
                 states=False,
                 rend=False)
+        if self.opts.get('pillar_cache', False):
+            self.pillar_cache = salt.pillar.PillarCache(self.opts)
+        else:
+            self.pillar_cache = None
         self.__setup_fileserver()
 
     def __setup_fileserver(self):
@@ -420,6 +424,7 @@ class RemoteFuncs(object):
         fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = fs_.serve_file
         self._file_hash = fs_.file_hash
+        self._file_hash_list = fs_.file_hash_list
         self._file_list = fs_.file_list
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
@@ -700,16 +705,28 @@ class RemoteFuncs(object):
         '''
         if any(key not in load for key in ('id', 'grains')):
             return False
-        pillar = salt.pillar.Pillar(
-                self.opts,
-                load['grains'],
-                load['id'],
-                load.get('saltenv', load.get('env')),
-                load.get('ext'),
-                self.mminion.functions,
-                pillar=load.get('pillar_override', {}))
+        if not salt.utils.verify.valid_id(self.opts, load['id']):
+            return False
         pillar_dirs = {}
-        data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
+        if self.pillar_cache is not None:
+            data = self.pillar_cache.compile_pillar(
+                    load['grains'],
+                    load['id'],
+                    load.get('saltenv', load.get('env')),
+                    load.get('ext'),
+                    self.mminion.functions,
+                    pillar=load.get('pillar_override', {}),
+                    pillar_dirs=pillar_dirs)
+        else:
+            pillar = salt.pillar.Pillar(
+                    self.opts,
+                    load['grains'],
+                    load['id'],
+                    load.get('saltenv', load.get('env')),
+                    load.get('ext'),
+                    self.mminion.functions,
+                    pillar=load.get('pillar_override', {}))
+            data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
         if self.opts.get('minion_data_cache', False):
             cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
             if not os.path.isdir(cdir):
@@ -725,6 +742,7 @@ class RemoteFuncs(object):
                             )
             # On Windows, os.rename will fail if the destination file exists.
             salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            salt.utils.minions.note_minion_data_change(self.opts, load['id'])
         return data
 
     def _minion_event(self, load):
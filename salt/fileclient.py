@@ -10,6 +10,7 @@ import logging
 import hashlib
 import os
 import shutil
+import tempfile
 
 # Import salt libs
 from salt.exceptions import (
@@ -22,6 +23,8 @@ import salt.payload
 import salt.transport
 import salt.fileserver
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.delta
 import salt.utils.files
 import salt.utils.templates
 import salt.utils.url
@@ -30,6 +33,7 @@ import salt.utils.http
 from salt.utils.openstack.swift import SaltSwift
 
 # pylint: disable=no-name-in-module,import-error
+import salt.ext.six as six
 import salt.ext.six.moves.BaseHTTPServer as BaseHTTPServer
 from salt.ext.six.moves.urllib.error import HTTPError, URLError
 from salt.ext.six.moves.urllib.parse import urlparse, urlunparse
@@ -53,6 +57,48 @@ def get_file_client(opts, pillar=False):
     }.get(client, RemoteClient)(opts)
 
 
+class FetchRecorder(object):
+    '''
+    Record the hash of every file fetched from the fileserver through any
+    client while the recorder is active, used to tell later on if the files
+    something was built from changed. Nothing is recorded when ``record`` is
+    False.
+
+    .. code-block:: python
+
+        with FetchRecorder() as recorder:
+            client.cache_file('salt://top.sls')
+        recorder.fetched  # {('salt://top.sls', 'base'): '<hsum>'}
+    '''
+    active = []
+
+    def __init__(self, record=True):
+        self.record = record
+        self.fetched = {}
+
+    def __enter__(self):
+        if self.record:
+            FetchRecorder.active.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.record:
+            FetchRecorder.active.remove(self)
+
+    @classmethod
+    def note(cls, path, saltenv, hash_server):
+        '''
+        Record a fetched file in all active recorders
+        '''
+        if not cls.active:
+            return
+        hsum = ''
+        if isinstance(hash_server, dict):
+            hsum = hash_server.get('hsum', '')
+        for recorder in cls.active:
+            recorder.fetched[(path, saltenv)] = hsum
+
+
 class Client(object):
     '''
     Base class for Salt file interactions
@@ -224,9 +270,9 @@ class Client(object):
                 path, saltenv
             )
         )
-        # go through the list of all files finding ones that are in
-        # the target directory and caching them
-        for fn_ in self.file_list(saltenv):
+        # go through the files under the target directory and cache them,
+        # the fileserver only sends back the files starting with the path
+        for fn_ in self.file_list(saltenv, prefix=path):
             if fn_.strip() and fn_.startswith(path):
                 if salt.utils.check_include_exclude(
                         fn_, include_pat, exclude_pat):
@@ -249,7 +295,7 @@ class Client(object):
                 'files',
                 saltenv
             )
-            for fn_ in self.file_list_emptydirs(saltenv):
+            for fn_ in self.file_list_emptydirs(saltenv, prefix=path):
                 if fn_.startswith(path):
                     minion_dir = '{0}/{1}'.format(dest, fn_)
                     if not os.path.isdir(minion_dir):
@@ -752,6 +798,8 @@ class LocalClient(Client):
             # Backwards compatibility
             saltenv = env
 
+        if FetchRecorder.active:
+            FetchRecorder.note(path, saltenv, self.hash_file(path, saltenv))
         path = self._check_proto(path)
         fnd = self._find_file(path, saltenv)
         if not fnd['path']:
@@ -940,6 +988,8 @@ class RemoteClient(Client):
             self.auth = self.channel.auth
         else:
             self.auth = ''
+        # Hashes fetched ahead of time by prefetch_hashes
+        self.hash_prefetch = {}
 
     def _refresh_channel(self):
         '''
@@ -948,6 +998,19 @@ class RemoteClient(Client):
         self.channel = salt.transport.Channel.factory(self.opts)
         return self.channel
 
+    @staticmethod
+    def _download_hasher(hash_server):
+        '''
+        Return a new hash object matching the hash the master reported for a
+        file, or None if the file cannot be verified
+        '''
+        if not isinstance(hash_server, dict) or 'hsum' not in hash_server:
+            return None
+        try:
+            return hashlib.new(hash_server.get('hash_type', 'md5'))
+        except ValueError:
+            return None
+
     def get_file(self,
                  path,
                  dest='',
@@ -969,6 +1032,7 @@ class RemoteClient(Client):
         # Check if file exists on server, before creating files and
         # directories
         hash_server = self.hash_file(path, saltenv)
+        FetchRecorder.note(path, saltenv, hash_server)
         if hash_server == '':
             log.debug(
                 'Could not find file from saltenv \'{0}\', \'{1}\''.format(
@@ -1025,13 +1089,36 @@ class RemoteClient(Client):
         path = self._check_proto(path)
         load = {'path': path,
                 'saltenv': saltenv,
+                'window': self.opts.get('file_transfer_window', 1),
                 'cmd': '_serve_file'}
         if gzip:
             gzip = int(gzip)
             load['gzip'] = gzip
 
+        # Hash the data as it is written so that the download can be verified
+        # against the master's hash without reading the file back
+        hasher = self._download_hasher(hash_server)
         fn_ = None
-        if dest:
+        # If an older copy of the file is cached, send the digests of its
+        # blocks so that the master only sends back the blocks which changed
+        delta_src = None
+        if hasher is not None \
+                and self.opts.get('file_transfer_delta', True) \
+                and dest2check and os.path.isfile(dest2check) \
+                and os.path.getsize(dest2check) >= salt.utils.delta.MIN_SIZE:
+            bsize = salt.utils.delta.block_size(os.path.getsize(dest2check))
+            delta_src = salt.utils.fopen(dest2check, 'rb')
+            blocks = salt.utils.delta.signatures(delta_src, bsize, hasher.name)
+            load['delta'] = [block[2] for block in blocks]
+            load['block_size'] = bsize
+            load['hash_type'] = hasher.name
+            # The cached copy is read while the new file is written, so the
+            # new file is written next to it and renamed into place
+            dest = dest2check
+            tmp_fd, tmp_dest = tempfile.mkstemp(dir=os.path.dirname(dest))
+            os.close(tmp_fd)
+            fn_ = salt.utils.fopen(tmp_dest, 'wb+')
+        elif dest:
             destdir = os.path.dirname(dest)
             if not os.path.isdir(destdir):
                 if makedirs:
@@ -1049,22 +1136,27 @@ class RemoteClient(Client):
                 load['loc'] = fn_.tell()
             data = self.channel.send(load)
             try:
-                if not data['data']:
+                if not data['data'] and not data.get('delta'):
                     if not fn_ and data['dest']:
                         # This is a 0 byte file on the master
                         with self._cache_loc(data['dest'], saltenv) as cache_dest:
                             dest = cache_dest
                             with salt.utils.fopen(cache_dest, 'wb+') as ofile:
                                 ofile.write(data['data'])
-                    if 'hsum' in data and d_tries < 3:
-                        # Master has prompted a file verification, if the
-                        # verification fails, re-download the file. Try 3 times
+                    if fn_ and hasher is not None \
+                            and hasher.hexdigest() != hash_server['hsum'] \
+                            and d_tries < 3:
+                        # The download does not match the hash the master
+                        # reported, re-download the file. Try 3 times
                         d_tries += 1
-                        hsum = salt.utils.get_hash(dest, data.get('hash_type', 'md5'))
-                        if hsum != data['hsum']:
-                            log.warn('Bad download of file {0}, attempt {1} '
-                                     'of 3'.format(path, d_tries))
-                            continue
+                        log.warn('Bad download of file {0}, attempt {1} '
+                                 'of 3'.format(path, d_tries))
+                        fn_.seek(0)
+                        fn_.truncate()
+                        hasher = self._download_hasher(hash_server)
+                        # Fetch the whole file on the next attempt
+                        load.pop('delta', None)
+                        continue
                     break
                 if not fn_:
                     with self._cache_loc(data['dest'], saltenv) as cache_dest:
@@ -1074,11 +1166,23 @@ class RemoteClient(Client):
                         if os.path.isdir(dest):
                             salt.utils.rm_rf(dest)
                         fn_ = salt.utils.fopen(dest, 'wb+')
+                if data.get('delta'):
+                    ops = data['delta']
+                    if data.get('gzip', None):
+                        ops = [op if isinstance(op, six.integer_types)
+                               else salt.utils.gzip_util.uncompress(op)
+                               for op in ops]
+                    for data in salt.utils.delta.patch(delta_src, blocks, ops):
+                        fn_.write(data)
+                        hasher.update(data)
+                    continue
                 if data.get('gzip', None):
                     data = salt.utils.gzip_util.uncompress(data['data'])
                 else:
                     data = data['data']
                 fn_.write(data)
+                if hasher is not None:
+                    hasher.update(data)
             except (TypeError, KeyError) as e:
                 transport_tries += 1
                 log.error('Data transport is broken, got: {0}, type: {1}, '
@@ -1089,8 +1193,12 @@ class RemoteClient(Client):
                 if transport_tries > 3:
                     break
 
+        if delta_src is not None:
+            delta_src.close()
         if fn_:
             fn_.close()
+            if delta_src is not None:
+                salt.utils.atomicfile.atomic_rename(tmp_dest, dest)
             log.info(
                 'Fetching file from saltenv \'{0}\', ** done ** '
                 '\'{1}\''.format(saltenv, path)
@@ -1186,6 +1294,12 @@ class RemoteClient(Client):
             # Backwards compatibility
             saltenv = env
 
+        if (path, saltenv) in self.hash_prefetch:
+            hash_server = self.hash_prefetch[(path, saltenv)]
+            if isinstance(hash_server, dict):
+                return dict(hash_server)
+            return hash_server
+
         try:
             path = self._check_proto(path)
         except MinionError:
@@ -1205,6 +1319,54 @@ class RemoteClient(Client):
                 'cmd': '_file_hash'}
         return self.channel.send(load)
 
+    def hash_file_list(self, paths, saltenv='base'):
+        '''
+        Return the hashes of a list of files, keyed by path. The hashes of the
+        files on the salt master are requested all at once.
+        '''
+        ret = {}
+        remote = {}
+        for path in paths:
+            try:
+                remote[self._check_proto(path)] = path
+            except MinionError:
+                ret[path] = self.hash_file(path, saltenv)
+        if not remote:
+            return ret
+        load = {'paths': list(remote),
+                'saltenv': saltenv,
+                'cmd': '_file_hash_list'}
+        hashes = self.channel.send(load)
+        if not isinstance(hashes, dict):
+            # The master does not support hashing a list of files
+            for path in six.itervalues(remote):
+                ret[path] = self.hash_file(path, saltenv)
+            return ret
+        for rel_path, path in six.iteritems(remote):
+            ret[path] = hashes.get(rel_path, '')
+        return ret
+
+    def prefetch_hashes(self, paths, saltenv='base'):
+        '''
+        Fetch the hashes of files on the salt master which are about to be
+        requested in one round trip. hash_file returns the prefetched hashes
+        until clear_prefetched_hashes is called.
+        '''
+        paths = [path for path in paths
+                 if path.startswith('salt://')
+                 and (path, saltenv) not in self.hash_prefetch]
+        if not paths:
+            return
+        for path, hash_server in six.iteritems(
+                self.hash_file_list(paths, saltenv)):
+            self.hash_prefetch[(path, saltenv)] = hash_server
+
+    def clear_prefetched_hashes(self):
+        '''
+        Forget the hashes fetched by prefetch_hashes
+        '''
+        self.hash_prefetch.clear()
+
     def list_env(self, saltenv='base', env=None):
         '''
         Return a list of the files in the file server's specified environment
@@ -1259,6 +1421,7 @@ class FSClient(RemoteClient):
         self.opts = opts
         self.channel = salt.fileserver.FSChan(opts)
         self.auth = DumbAuth()
+        self.hash_prefetch = {}
 
 
 class DumbAuth(object):
@@ -7,6 +7,7 @@ File server pluggable modules and generic backend functions
 from __future__ import absolute_import
 import errno
 import fnmatch
+import hashlib
 import logging
 import os
 import re
@@ -15,7 +16,10 @@ import time
 # Import salt libs
 import salt.loader
 import salt.utils
+import salt.utils.delta
+import salt.utils.gzip_util
 import salt.utils.locales
+import salt.utils.pathindex
 
 # Import 3rd-party libs
 import salt.ext.six as six
@@ -96,61 +100,57 @@ def wait_lock(lk_fn, dest, wait_timeout=0):
     return False
 
 
-def check_file_list_cache(opts, form, list_cache, w_lock):
+def check_file_list_cache(opts, form, list_cache, w_lock, prefix=''):
     '''
     Checks the cache file to see if there is a new enough file list cache, and
     returns the match (if found, along with booleans used by the fileserver
     backend to determine if the cache needs to be refreshed/written).
+
+    The cache is a :py:mod:`path index <salt.utils.pathindex>`, which is
+    mapped into memory and shared by every process reading it. Only the
+    entries starting with ``prefix`` are decoded. While another process holds
+    the write lock to refresh the cache, the current cache keeps being served.
     '''
-    refresh_cache = False
-    save_cache = True
-    serial = salt.payload.Serial(opts)
-    wait_lock(w_lock, list_cache, 5 * 60)
-    if not os.path.isfile(list_cache) and _lock_cache(w_lock):
-        refresh_cache = True
-    else:
-        attempt = 0
-        while attempt < 11:
-            try:
-                if os.path.exists(w_lock):
-                    # wait for a filelist lock for max 15min
-                    wait_lock(w_lock, list_cache, 15 * 60)
-                if os.path.exists(list_cache):
-                    # calculate filelist age is possible
-                    cache_stat = os.stat(list_cache)
-                    age = time.time() - cache_stat.st_mtime
-                else:
-                    # if filelist does not exists yet, mark it as expired
-                    age = opts.get('fileserver_list_cache_time', 30) + 1
-                if age < opts.get('fileserver_list_cache_time', 30):
-                    # Young enough! Load this sucker up!
-                    with salt.utils.fopen(list_cache, 'rb') as fp_:
-                        log.trace('Returning file_lists cache data from '
-                                  '{0}'.format(list_cache))
-                        return serial.load(fp_).get(form, []), False, False
-                elif _lock_cache(w_lock):
-                    # Set the w_lock and go
-                    refresh_cache = True
-                    break
-            except Exception:
-                time.sleep(0.2)
-                attempt += 1
-                continue
-        if attempt > 10:
-            save_cache = False
-            refresh_cache = True
-    return None, refresh_cache, save_cache
+    index = salt.utils.pathindex.load(list_cache)
+    if index is not None:
+        age = time.time() - index.mtime
+        if age < opts.get('fileserver_list_cache_time', 30):
+            # Young enough! Load this sucker up!
+            log.trace('Returning file_lists cache data from '
+                      '{0}'.format(list_cache))
+            return index.get(form, prefix), False, False
+        try:
+            lock_age = time.time() - os.path.getmtime(w_lock)
+        except OSError:
+            lock_age = None
+        if lock_age is not None:
+            if lock_age < 15 * 60:
+                log.trace('Returning file_lists cache data from {0} while '
+                          'it is refreshed'.format(list_cache))
+                return index.get(form, prefix), False, False
+            # The process refreshing the cache went away
+            _unlock_cache(w_lock)
+    if _lock_cache(w_lock):
+        return None, True, True
+    # Another process is writing the first cache, wait for it
+    try:
+        wait_lock(w_lock, list_cache, 15 * 60)
+    except ValueError as exc:
+        log.trace(exc)
+    index = salt.utils.pathindex.load(list_cache)
+    if index is not None:
+        return index.get(form, prefix), False, False
+    return None, True, _lock_cache(w_lock)
 
 
 def write_file_list_cache(opts, data, list_cache, w_lock):
     '''
-    Checks the cache file to see if there is a new enough file list cache, and
-    returns the match (if found, along with booleans used by the fileserver
-    backend to determine if the cache needs to be refreshed/written).
+    Write the file lists in data to the path index at list_cache and release
+    the write lock taken by check_file_list_cache
     '''
-    serial = salt.payload.Serial(opts)
-    with salt.utils.fopen(list_cache, 'w+b') as fp_:
-        fp_.write(serial.dumps(data))
+    try:
+        salt.utils.pathindex.write(list_cache, data)
+    finally:
         _unlock_cache(w_lock)
         log.trace('Lockfile {0} removed'.format(w_lock))
 
@@ -272,6 +272,22 @@ def is_file_ignored(opts, fname):
     return False
 
 
+def serve_chunk_size(opts, load):
+    '''
+    Return the number of bytes to read for a single serve_file reply.
+
+    Minions can ask for a window of several ``file_buffer_size`` chunks per
+    round trip, the window is capped by the master's ``file_transfer_window``.
+    Minions which do not send a window get a single chunk.
+    '''
+    try:
+        window = int(load.get('window', 1))
+    except (TypeError, ValueError):
+        window = 1
+    window = max(1, min(window, opts.get('file_transfer_window', 1)))
+    return opts['file_buffer_size'] * window
+
+
 class Fileserver(object):
     '''
     Create a fileserver wrapper object that wraps the fileserver functions and
@@ -505,11 +521,62 @@ class Fileserver(object):
         fnd = self.find_file(load['path'], load['saltenv'])
         if not fnd.get('back'):
             return ret
+        if load.get('delta') and self.opts.get('file_transfer_delta', True):
+            delta = self._serve_delta(load, fnd)
+            if delta is not None:
+                return delta
         fstr = '{0}.serve_file'.format(fnd['back'])
         if fstr in self.servers:
             return self.servers[fstr](load, fnd)
         return ret
 
+    def _serve_delta(self, load, fnd):
+        '''
+        Serve the changes between a file and the copy the minion has cached,
+        described by the block digests passed in the load. Returns None if
+        the delta cannot be served and the file should be sent whole.
+
+        Only files found on the local disk of the master are diffed; for the
+        other backends, such as s3fs, the backend serves the file.
+        '''
+        if 'rel' not in fnd or not os.path.isfile(fnd['path']):
+            return None
+        try:
+            bsize = int(load['block_size'])
+            hash_type = load.get('hash_type', self.opts['hash_type'])
+            hashlib.new(hash_type)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if bsize < salt.utils.delta.MIN_BLOCK_SIZE \
+                or bsize > salt.utils.delta.MAX_BLOCK_SIZE:
+            return None
+        ret = {'data': '',
+               'dest': fnd['rel']}
+        chunk_size = serve_chunk_size(self.opts, load)
+        try:
+            with salt.utils.fopen(fnd['path'], 'rb') as fp_:
+                fp_.seek(load['loc'])
+                ops = salt.utils.delta.diff(
+                    fp_,
+                    load['delta'],
+                    bsize,
+                    hash_type,
+                    chunk_size,
+                    chunk_size * 16)
+        except Exception as exc:
+            log.debug(
+                'Unable to serve {0} as a delta, sending it whole: {1}'.format(
+                    fnd['path'], exc))
+            return None
+        gzip = load.get('gzip', None)
+        if gzip:
+            ops = [op if isinstance(op, six.integer_types)
+                   else salt.utils.gzip_util.compress(op, gzip)
+                   for op in ops]
+            ret['gzip'] = gzip
+        ret['delta'] = ops
+        return ret
+
     def file_hash(self, load):
         '''
         Return the hash of a given file
@@ -533,6 +600,28 @@ class Fileserver(object):
             return self.servers[fstr](load, fnd)
         return ''
 
+    def file_hash_list(self, load):
+        '''
+        Return the hashes of a list of files, keyed by path. Files which are
+        not found have an empty string as their hash.
+        '''
+        if 'env' in load:
+            salt.utils.warn_until(
+                'Boron',
+                'Passing a salt environment should be done using \'saltenv\' '
+                'not \'env\'. This functionality will be removed in Salt '
+                'Boron.'
+            )
+            load['saltenv'] = load.pop('env')
+
+        ret = {}
+        if 'paths' not in load or 'saltenv' not in load:
+            return ret
+        for path in load['paths']:
+            ret[path] = self.file_hash({'path': path,
+                                        'saltenv': load['saltenv']})
+        return ret
+
     def file_list(self, load):
         '''
         Return a list of files from the dominant environment
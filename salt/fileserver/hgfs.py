@@ -714,7 +714,7 @@ def serve_file(load, fnd):
     gzip = load.get('gzip', None)
     with salt.utils.fopen(fnd['path'], 'rb') as fp_:
         fp_.seek(load['loc'])
-        data = fp_.read(__opts__['file_buffer_size'])
+        data = fp_.read(salt.fileserver.serve_chunk_size(__opts__, load))
         if gzip and data:
             data = salt.utils.gzip_util.compress(data, gzip)
             ret['gzip'] = gzip
@@ -778,7 +778,8 @@ def _file_lists(load, form):
     w_lock = os.path.join(list_cachedir, '.{0}.w'.format(load['saltenv']))
     cache_match, refresh_cache, save_cache = \
         salt.fileserver.check_file_list_cache(
-            __opts__, form, list_cache, w_lock
+            __opts__, form, list_cache, w_lock,
+            prefix=load.get('prefix', '').strip('/')
         )
     if cache_match is not None:
         return cache_match
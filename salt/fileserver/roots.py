@@ -14,21 +14,46 @@ be in the :conf_master:`fileserver_backend` list to enable this backend.
 
 Fileserver environments are defined using the :conf_master:`file_roots`
 configuration option.
+
+File hashes are kept in a single index in the master cachedir, which is
+shared by all of the master worker processes. A file is hashed the first time
+it is served, and each fileserver update merges the new hashes into the index
+and drops the files which changed or are gone.
+
+When :conf_master:`fileserver_journal` is enabled the fileserver update keeps
+a journal of the ``file_roots`` trees, driven by inotify when pyinotify is
+installed and by polling otherwise. Only the files and directories which
+changed are looked at, and the file lists of the environments they belong to
+are rewritten for the worker processes to serve.
 '''
 from __future__ import absolute_import
 
 # Import python libs
 import os
+import shutil
+import stat
+import time
 import logging
+import tempfile
 
 # Import salt libs
 import salt.fileserver
+import salt.payload
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.filejournal
+import salt.utils.pathindex
 from salt.utils.event import tagify
 import salt.ext.six as six
 
 log = logging.getLogger(__name__)
 
+# The file hash index, see _hash_index()
+_HASH_INDEX = {}
+
+# The change journal kept by update(), see _journal()
+_JOURNAL = {}
+
 
 def find_file(path, saltenv='base', env=None, **kwargs):
     '''
@@ -102,7 +127,7 @@ def serve_file(load, fnd):
     gzip = load.get('gzip', None)
     with salt.utils.fopen(os.path.normpath(fnd['path']), 'rb') as fp_:
         fp_.seek(load['loc'])
-        data = fp_.read(__opts__['file_buffer_size'])
+        data = fp_.read(salt.fileserver.serve_chunk_size(__opts__, load))
         if gzip and data:
             data = salt.utils.gzip_util.compress(data, gzip)
             ret['gzip'] = gzip
@@ -112,25 +137,27 @@ def serve_file(load, fnd):
 
 def update():
     '''
-    When we are asked to update (regular interval) lets reap the cache
+    When we are asked to update (regular interval) lets refresh the mtime map
+    and the file hash index
     '''
-    try:
-        salt.fileserver.reap_fileserver_cache_dir(
-            os.path.join(__opts__['cachedir'], 'roots/hash'),
-            find_file
-        )
-    except (IOError, OSError):
-        # Hash file won't exist if no files have yet been served up
-        pass
+    # file hashes used to be cached in one file each under roots/hash
+    legacy_hash_dir = os.path.join(__opts__['cachedir'], 'roots', 'hash')
+    if os.path.isdir(legacy_hash_dir):
+        shutil.rmtree(legacy_hash_dir, ignore_errors=True)
 
     mtime_map_path = os.path.join(__opts__['cachedir'], 'roots/mtime_map')
     # data to send on event
     data = {'changed': False,
             'backend': 'roots'}
 
+    # the journal knows which files changed, unless it was just built
+    journal = changed = None
+    if __opts__.get('fileserver_journal', True):
+        journal, changed = _journal()
+
     old_mtime_map = {}
     # if you have an old map, load that
-    if os.path.exists(mtime_map_path):
+    if changed is None and os.path.exists(mtime_map_path):
         with salt.utils.fopen(mtime_map_path, 'r') as fp_:
             for line in fp_:
                 try:
@@ -142,19 +169,33 @@ def update():
                                 .format(mtime_map_path, line))
 
     # generate the new map
-    new_mtime_map = salt.fileserver.generate_mtime_map(__opts__['file_roots'])
+    if journal is None:
+        new_mtime_map = salt.fileserver.generate_mtime_map(__opts__['file_roots'])
+    else:
+        new_mtime_map = journal.mtime_map()
 
     # compare the maps, set changed to the return value
-    data['changed'] = salt.fileserver.diff_mtime_map(old_mtime_map, new_mtime_map)
+    if changed is None:
+        data['changed'] = salt.fileserver.diff_mtime_map(old_mtime_map, new_mtime_map)
+    else:
+        data['changed'] = bool(changed)
+
+    # merge the hashes of the files served since the last update
+    index = _update_hash_index(new_mtime_map, changed, _JOURNAL.get('index'))
+
+    if journal is not None:
+        _JOURNAL['index'] = index
+        _write_journal_file_lists(journal, changed)
 
     # write out the new map
-    mtime_map_path_dir = os.path.dirname(mtime_map_path)
-    if not os.path.exists(mtime_map_path_dir):
-        os.makedirs(mtime_map_path_dir)
-    with salt.utils.fopen(mtime_map_path, 'w') as fp_:
-        for file_path, mtime in six.iteritems(new_mtime_map):
-            fp_.write('{file_path}:{mtime}\n'.format(file_path=file_path,
-                                                     mtime=mtime))
+    if changed is None or changed:
+        mtime_map_path_dir = os.path.dirname(mtime_map_path)
+        if not os.path.exists(mtime_map_path_dir):
+            os.makedirs(mtime_map_path_dir)
+        with salt.utils.fopen(mtime_map_path, 'w') as fp_:
+            for file_path, mtime in six.iteritems(new_mtime_map):
+                fp_.write('{file_path}:{mtime}\n'.format(file_path=file_path,
+                                                         mtime=mtime))
 
     if __opts__.get('fileserver_events', False):
         # if there is a change, fire an event
@@ -167,6 +208,82 @@ def update():
         event.fire_event(data, tagify(['roots', 'update'], prefix='fileserver'))
 
 
+def _journal():
+    '''
+    Return the change journal of the file_roots and the set of paths which
+    changed since the last update. The set is None when the journal was just
+    built, in which case every file has to be looked at.
+    '''
+    roots = sorted(set(
+        os.path.normpath(path)
+        for paths in six.itervalues(__opts__['file_roots'])
+        for path in paths
+    ))
+    key = (roots, __opts__['fileserver_followsymlinks'])
+    if _JOURNAL.get('key') != key:
+        _JOURNAL.clear()
+        _JOURNAL['key'] = key
+        _JOURNAL['journal'] = salt.utils.filejournal.FileJournal(
+            roots,
+            followlinks=__opts__['fileserver_followsymlinks']
+        )
+        log.debug(
+            'Built the file_roots change journal, changes are found by {0}'
+            .format('inotify' if _JOURNAL['journal'].inotify else 'polling')
+        )
+        return _JOURNAL['journal'], None
+    return _JOURNAL['journal'], _JOURNAL['journal'].refresh()
+
+
+def _journal_stamp_path():
+    '''
+    Return the path to the file update() touches each time it brings the
+    journal file lists up to date
+    '''
+    return os.path.join(__opts__['cachedir'], 'roots', 'journal')
+
+
+def _journal_is_current():
+    '''
+    The file lists written by the journal are served as long as the
+    fileserver update which maintains them is running
+    '''
+    try:
+        age = time.time() - os.path.getmtime(_journal_stamp_path())
+    except OSError:
+        return False
+    return age < 2 * __opts__.get('loop_interval', 60)
+
+
+def _write_journal_file_lists(journal, changed):
+    '''
+    Rewrite the file list caches of the environments with changed paths, or
+    of all environments when changed is None, from the journal
+    '''
+    list_cachedir = os.path.join(__opts__['cachedir'], 'file_lists/roots')
+    if not os.path.isdir(list_cachedir):
+        os.makedirs(list_cachedir)
+    for saltenv, paths in six.iteritems(__opts__['file_roots']):
+        list_cache = os.path.join(list_cachedir, '{0}.p'.format(saltenv))
+        if changed is not None and os.path.isfile(list_cache):
+            prefixes = tuple(os.path.join(os.path.normpath(path), '')
+                             for path in paths)
+            if not any(os.path.join(path, '').startswith(prefixes)
+                       for path in changed):
+                continue
+        salt.utils.pathindex.write(
+            list_cache,
+            _build_file_lists(saltenv, journal.walk, journal.islink)
+        )
+        log.trace('Journal rewrote file_lists cache {0}'.format(list_cache))
+    stamp = _journal_stamp_path()
+    if os.path.exists(stamp):
+        os.utime(stamp, None)
+    else:
+        with salt.utils.fopen(stamp, 'w'):
+            pass
+
+
 def file_hash(load, fnd):
     '''
     Return a file hash, the hash type is set in the master config file
@@ -185,62 +302,184 @@ def file_hash(load, fnd):
     ret = {}
 
     # if the file doesn't exist, we can't get a hash
-    if not path or not os.path.isfile(path):
+    if not path:
+        return ret
+    try:
+        pstat = os.stat(path)
+    except OSError:
+        return ret
+    if not stat.S_ISREG(pstat.st_mode):
         return ret
 
     # set the hash_type as it is determined by config-- so mechanism won't change that
     ret['hash_type'] = __opts__['hash_type']
 
-    # check if the hash is cached
-    # cache file's contents should be "hash:mtime"
-    cache_path = os.path.join(__opts__['cachedir'],
-                              'roots/hash',
-                              load['saltenv'],
-                              u'{0}.hash.{1}'.format(fnd['rel'],
-                              __opts__['hash_type']))
-    # if we have a cache, serve that if the mtime hasn't changed
-    if os.path.exists(cache_path):
-        try:
-            with salt.utils.fopen(cache_path, 'r') as fp_:
-                try:
-                    hsum, mtime = fp_.read().split(':')
-                except ValueError:
-                    log.debug('Fileserver attempted to read incomplete cache file. Retrying.')
-                    # Delete the file since its incomplete (either corrupted or incomplete)
-                    try:
-                        os.unlink(cache_path)
-                    except OSError:
-                        pass
-                    return file_hash(load, fnd)
-                if os.path.getmtime(path) == mtime:
-                    # check if mtime changed
-                    ret['hsum'] = hsum
-                    return ret
-        except (os.error, IOError):  # Can't use Python select() because we need Windows support
-            log.debug("Fileserver encountered lock when reading cache file. Retrying.")
-            # Delete the file since its incomplete (either corrupted or incomplete)
-            try:
-                os.unlink(cache_path)
-            except OSError:
-                pass
-            return file_hash(load, fnd)
+    # serve the indexed hash if the file has not changed since it was hashed
+    index = _hash_index()
+    entry = index.get(path)
+    if entry and entry[1] == pstat.st_mtime and entry[2] == pstat.st_size:
+        ret['hsum'] = entry[0]
+        return ret
 
-    # if we don't have a cache entry-- lets make one
+    # if we don't have an index entry-- lets make one for this process and
+    # queue it for the shared index, which picks it up on the next update()
     ret['hsum'] = salt.utils.get_hash(path, __opts__['hash_type'])
-    cache_dir = os.path.dirname(cache_path)
-    # make cache directory if it doesn't exist
-    if not os.path.exists(cache_dir):
+    index[path] = [ret['hsum'], pstat.st_mtime, pstat.st_size]
+    _queue_hash(path, index[path])
+    return ret
+
+
+def _hash_index_path():
+    '''
+    Return the path to the file hash index written by update()
+    '''
+    return os.path.join(__opts__['cachedir'], 'roots', 'hash_index.p')
+
+
+def _hash_queue_path():
+    '''
+    Return the path to the file the worker processes append new hashes to
+    '''
+    return os.path.join(__opts__['cachedir'], 'roots', 'hash_queue')
+
+
+def _queue_hash(path, entry):
+    '''
+    Queue the hash of a served file for the next update() to merge into the
+    file hash index. Each hash is one line, appended in a single write.
+    '''
+    path = salt.utils.to_str(path)
+    if '\n' in path:
+        return
+    line = '{0}:{1}:{2!r}:{3}:{4}\n'.format(
+        __opts__['hash_type'], entry[0], entry[1], entry[2], path
+    )
+    queue = _hash_queue_path()
+    try:
+        if not os.path.isdir(os.path.dirname(queue)):
+            os.makedirs(os.path.dirname(queue))
+        with salt.utils.fopen(queue, 'a') as fp_:
+            fp_.write(line)
+    except (IOError, OSError) as exc:
+        log.debug('Could not queue the hash of {0}: {1}'.format(path, exc))
+
+
+def _read_hash_queue():
+    '''
+    Take the hashes queued by the worker processes since the last update().
+    Returns a list of (path, [hash, mtime, size]).
+    '''
+    queue = _hash_queue_path()
+    taken = '{0}.{1}'.format(queue, os.getpid())
+    try:
+        os.rename(queue, taken)
+    except OSError:
+        return []
+    ret = []
+    try:
+        with salt.utils.fopen(taken, 'r') as fp_:
+            for line in fp_:
+                # skip a line which was still being written
+                if not line.endswith('\n'):
+                    continue
+                try:
+                    hash_type, hsum, mtime, size, path = \
+                        line[:-1].split(':', 4)
+                    entry = [hsum, float(mtime), int(size)]
+                except ValueError:
+                    continue
+                if hash_type == __opts__['hash_type']:
+                    ret.append((path, entry))
+    except (IOError, OSError):
+        pass
+    finally:
         try:
-            os.makedirs(cache_dir)
+            os.remove(taken)
         except OSError:
             pass
-    # save the cache object "hash:mtime"
-    cache_object = '{0}:{1}'.format(ret['hsum'], os.path.getmtime(path))
-    with salt.utils.flopen(cache_path, 'w') as fp_:
-        fp_.write(cache_object)
     return ret
 
 
+def _read_hash_index():
+    '''
+    Read the file hash index from disk. The index maps the full path of each
+    file to a list of [hash, mtime, size].
+    '''
+    serial = salt.payload.Serial(__opts__)
+    try:
+        with salt.utils.fopen(_hash_index_path(), 'rb') as fp_:
+            data = serial.load(fp_)
+    except (IOError, OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) \
+            or data.get('hash_type') != __opts__['hash_type']:
+        return {}
+    return data.get('files', {})
+
+
+def _hash_index():
+    '''
+    Return the in-memory file hash index, reloading it if update() has
+    written a new one. The index file is checked at most once a second.
+    '''
+    now = time.time()
+    if now - _HASH_INDEX.get('checked', 0) < 1:
+        return _HASH_INDEX['files']
+    _HASH_INDEX['checked'] = now
+    try:
+        mtime = os.path.getmtime(_hash_index_path())
+    except OSError:
+        mtime = None
+    if 'files' not in _HASH_INDEX or mtime != _HASH_INDEX.get('mtime'):
+        _HASH_INDEX['mtime'] = mtime
+        _HASH_INDEX['files'] = _read_hash_index() if mtime else {}
+    return _HASH_INDEX['files']
+
+
+def _update_hash_index(mtime_map, changed=None, index=None):
+    '''
+    Merge the hashes queued by the worker processes into the file hash index,
+    drop the files which changed or are gone and write out the index for all
+    of the master processes. Files are hashed when they are first served, not
+    here.
+
+    When the set of changed paths and the index written by the last update
+    are passed in only the changed paths are looked at. The index is returned.
+    '''
+    if changed is not None and index is not None \
+            and os.path.isfile(_hash_index_path()):
+        updated = False
+        for file_path in changed:
+            if index.pop(file_path, None) is not None:
+                updated = True
+    else:
+        old_index = _read_hash_index()
+        index = dict(
+            (file_path, entry)
+            for file_path, entry in six.iteritems(old_index)
+            if mtime_map.get(file_path) == entry[1]
+        )
+        updated = len(index) != len(old_index) \
+            or not os.path.isfile(_hash_index_path())
+    for file_path, entry in _read_hash_queue():
+        if mtime_map.get(file_path) == entry[1] \
+                and index.get(file_path) != entry:
+            index[file_path] = entry
+            updated = True
+    if not updated:
+        return index
+    serial = salt.payload.Serial(__opts__)
+    index_dir = os.path.dirname(_hash_index_path())
+    if not os.path.isdir(index_dir):
+        os.makedirs(index_dir)
+    tmpfh, tmpfname = tempfile.mkstemp(dir=index_dir)
+    os.close(tmpfh)
+    with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+        serial.dump({'hash_type': __opts__['hash_type'], 'files': index}, fp_)
+    salt.utils.atomicfile.atomic_rename(tmpfname, _hash_index_path())
+    return index
+
+
 def _file_lists(load, form):
     '''
     Return a dict containing the file lists for files, dirs, emtydirs and symlinks
@@ -263,45 +502,27 @@ def _file_lists(load, form):
             log.critical('Unable to make cachedir {0}'.format(list_cachedir))
             return []
     list_cache = os.path.join(list_cachedir, '{0}.p'.format(load['saltenv']))
+    if __opts__.get('fileserver_journal', True) and _journal_is_current():
+        # the fileserver update keeps this list cache up to date
+        index = salt.utils.pathindex.load(list_cache)
+        if index is not None:
+            return index.get(form, load.get('prefix', '').strip('/'))
     w_lock = os.path.join(list_cachedir, '.{0}.w'.format(load['saltenv']))
     cache_match, refresh_cache, save_cache = \
         salt.fileserver.check_file_list_cache(
-            __opts__, form, list_cache, w_lock
+            __opts__, form, list_cache, w_lock,
+            prefix=load.get('prefix', '').strip('/')
         )
     if cache_match is not None:
         return cache_match
     if refresh_cache:
-        ret = {
-            'files': [],
-            'dirs': [],
-            'empty_dirs': [],
-            'links': []
-        }
-        for path in __opts__['file_roots'][load['saltenv']]:
-            for root, dirs, files in os.walk(
-                    path,
-                    followlinks=__opts__['fileserver_followsymlinks']):
-                dir_rel_fn = os.path.relpath(root, path)
-                if __opts__.get('file_client', 'remote') == 'local' and os.path.sep == "\\":
-                    dir_rel_fn = dir_rel_fn.replace('\\', '/')
-                ret['dirs'].append(dir_rel_fn)
-                if len(dirs) == 0 and len(files) == 0:
-                    if not salt.fileserver.is_file_ignored(__opts__, dir_rel_fn):
-                        ret['empty_dirs'].append(dir_rel_fn)
-                for fname in files:
-                    is_link = os.path.islink(os.path.join(root, fname))
-                    if is_link:
-                        ret['links'].append(fname)
-                    if __opts__['fileserver_ignoresymlinks'] and is_link:
-                        continue
-                    rel_fn = os.path.relpath(
-                                os.path.join(root, fname),
-                                path
-                            )
-                    if not salt.fileserver.is_file_ignored(__opts__, rel_fn):
-                        if __opts__.get('file_client', 'remote') == 'local' and os.path.sep == "\\":
-                            rel_fn = rel_fn.replace('\\', '/')
-                        ret['files'].append(rel_fn)
+        ret = _build_file_lists(
+            load['saltenv'],
+            lambda path: os.walk(
+                path,
+                followlinks=__opts__['fileserver_followsymlinks']),
+            os.path.islink
+        )
         if save_cache:
             try:
                 salt.fileserver.write_file_list_cache(
@@ -315,6 +536,43 @@ def _file_lists(load, form):
     return []
 
 
+def _build_file_lists(saltenv, walk, islink):
+    '''
+    Build the file lists for files, dirs, empty_dirs and symlinks of an
+    environment, walking each of its roots with the walk function
+    '''
+    ret = {
+        'files': [],
+        'dirs': [],
+        'empty_dirs': [],
+        'links': []
+    }
+    for path in __opts__['file_roots'][saltenv]:
+        for root, dirs, files in walk(path):
+            dir_rel_fn = os.path.relpath(root, path)
+            if __opts__.get('file_client', 'remote') == 'local' and os.path.sep == "\\":
+                dir_rel_fn = dir_rel_fn.replace('\\', '/')
+            ret['dirs'].append(dir_rel_fn)
+            if len(dirs) == 0 and len(files) == 0:
+                if not salt.fileserver.is_file_ignored(__opts__, dir_rel_fn):
+                    ret['empty_dirs'].append(dir_rel_fn)
+            for fname in files:
+                is_link = islink(os.path.join(root, fname))
+                if is_link:
+                    ret['links'].append(fname)
+                if __opts__['fileserver_ignoresymlinks'] and is_link:
+                    continue
+                rel_fn = os.path.relpath(
+                            os.path.join(root, fname),
+                            path
+                        )
+                if not salt.fileserver.is_file_ignored(__opts__, rel_fn):
+                    if __opts__.get('file_client', 'remote') == 'local' and os.path.sep == "\\":
+                        rel_fn = rel_fn.replace('\\', '/')
+                    ret['files'].append(rel_fn)
+    return ret
+
+
 def file_list(load):
     '''
     Return a list of all files on the file server in a specified
@@ -20,6 +20,7 @@ import salt.crypt
 import salt.utils
 import salt.exceptions
 import salt.utils.event
+import salt.utils.minions
 import salt.daemons.masterapi
 from salt.utils import kinds
 from salt.utils.event import tagify
@@ -573,6 +574,8 @@ class Key(object):
             for minion in os.listdir(m_cache):
                 if minion not in minions and minion not in preserve_minions:
                     shutil.rmtree(os.path.join(m_cache, minion))
+                    salt.utils.minions.note_minion_data_change(self.opts,
+                                                               minion)
 
     def check_master(self):
         '''
@@ -11,12 +11,17 @@ from __future__ import absolute_import
 import os
 import imp
 import sys
+import json
 import salt
 import time
+import hashlib
 import logging
 import inspect
 import tempfile
+import fnmatch
 import functools
+import threading
+import copy
 from collections import MutableMapping
 from zipimport import zipimporter
 
@@ -25,9 +30,12 @@ from salt.exceptions import LoaderError
 from salt.template import check_render_pipe_str
 from salt.utils.decorators import Depends
 from salt.utils import context
+import salt.payload
+import salt.version
 import salt.utils.lazy
 import salt.utils.event
 import salt.utils.odict
+import salt.utils.atomicfile
 
 # Solve the Chicken and egg problem where grains need to run before any
 # of the modules are loaded and are generally available for any usage.
@@ -35,6 +43,7 @@ import salt.modules.cmdmod
 
 # Import 3rd-party libs
 import salt.ext.six as six
+from salt.ext.six.moves import queue  # pylint: disable=import-error
 
 __salt__ = {
     'cmd.run': salt.modules.cmdmod._run_quiet
@@ -546,40 +555,200 @@ def grains(opts, force_refresh=False):
         __grains__ = salt.loader.grains(__opts__)
         print __grains__['id']
     '''
-    # if we hae no grains, lets try loading from disk (TODO: move to decorator?)
-    if not force_refresh:
-        if opts.get('grains_cache', False):
-            cfn = os.path.join(
-                opts['cachedir'],
-                'grains.cache.p'
-            )
-            if os.path.isfile(cfn):
-                grains_cache_age = int(time.time() - os.path.getmtime(cfn))
-                if opts.get('grains_cache_expiration', 300) >= grains_cache_age and not \
-                        opts.get('refresh_grains_cache', False) and not force_refresh:
-                    log.debug('Retrieving grains from cache')
-                    try:
-                        serial = salt.payload.Serial(opts)
-                        with salt.utils.fopen(cfn, 'rb') as fp_:
-                            cached_grains = serial.load(fp_)
-                        return cached_grains
-                    except (IOError, OSError):
-                        pass
-                else:
-                    if force_refresh:
-                        log.debug('Grains refresh requested. Refreshing grains.')
-                    else:
-                        log.debug('Grains cache last modified {0} seconds ago and '
-                                  'cache expiration is set to {1}. '
-                                  'Grains cache expired. Refreshing.'.format(
-                                      grains_cache_age,
-                                      opts.get('grains_cache_expiration', 300)
-                                  ))
+    if opts.get('skip_grains', False):
+        return {}
+    _static_grains(opts)
+
+    cache = None
+    if opts.get('grains_cache', False):
+        cfn = os.path.join(opts['cachedir'], 'grains.cache.p')
+        if opts.get('refresh_grains_cache', False):
+            log.debug('Grains refresh requested. Refreshing grains.')
+            cache = {}
+        else:
+            cache = _read_grains_cache(opts, cfn)
+
+    now = time.time()
+    if cache and all(name in cache
+                     and _grains_cache_fresh(opts, name, cache[name], now,
+                                             force_refresh)
+                     for name in cache['funcs']):
+        # Nothing needs to run, so the grain modules need not be loaded
+        log.debug('Retrieving grains from cache')
+        order = cache['funcs']
+        results = dict((name, cache[name]['grains']) for name in order)
+    else:
+        funcs = grain_funcs(opts)
+        if force_refresh:  # if we refresh, lets reload grain modules
+            funcs.clear()
+        order = _grain_order(funcs)
+        results = {}
+        stale = []
+        for name in order:
+            if cache and name in cache \
+                    and _grains_cache_fresh(opts, name, cache[name], now,
+                                            force_refresh):
+                results[name] = cache[name]['grains']
+            else:
+                stale.append(name)
+        if cache and stale:
+            log.debug('Refreshing the cached grains of {0}'.format(
+                ', '.join(stale)))
+        ran = _run_grains(opts, funcs, stale)
+        for name in stale:
+            if name in ran:
+                results[name] = ran[name]
+            elif cache and name in cache:
+                log.warning('Using the cached grains of {0}'.format(name))
+                results[name] = cache[name]['grains']
             else:
-                log.debug('Grains cache file does not exist.')
+                results[name] = {}
 
-    if opts.get('skip_grains', False):
+        # Write cache if enabled
+        if cache is not None:
+            for name in ran:
+                cache[name] = {'time': now, 'grains': ran[name]}
+            _write_grains_cache(opts, cfn, order, cache)
+
+    grains_data = {}
+    for name in order:
+        grains_data.update(results[name])
+    grains_data.update(opts['grains'])
+    if opts.get('lazy_startup', False):
+        # Keep the record the lazy grains run from up to date
+        _write_grains_keymap(opts, order, results, _grains_fingerprint(grains_data))
+    return grains_data
+
+
+def _grains_cache_fresh(opts, name, entry, now, force_refresh=False):
+    '''
+    Return whether the cached grains of a grain function are still valid.
+    The ttl of a grain function is the first of the grains_cache_ttl globs
+    matching its name, or grains_cache_expiration. A forced refresh only
+    keeps the grains of the functions with a ttl of their own.
+    '''
+    ttl = None
+    for glob, glob_ttl in sorted(six.iteritems(opts.get('grains_cache_ttl') or {})):
+        if fnmatch.fnmatch(name, glob):
+            ttl = glob_ttl
+            break
+    if ttl is None:
+        if force_refresh:
+            return False
+        ttl = opts.get('grains_cache_expiration', 300)
+    return now - entry['time'] <= ttl
+
+
+def _read_grains_cache(opts, cfn):
+    '''
+    Return the grains cache, which holds the grains returned by each grain
+    function and when they were returned
+    '''
+    if not os.path.isfile(cfn):
+        log.debug('Grains cache file does not exist.')
+        return {}
+    try:
+        serial = salt.payload.Serial(opts)
+        with salt.utils.fopen(cfn, 'rb') as fp_:
+            cache = serial.load(fp_)
+    except Exception as exc:
+        log.debug('Unable to read grains cache file {0}: {1}'.format(cfn, exc))
+        return {}
+    if not isinstance(cache, dict) or not isinstance(cache.get('funcs'), list):
+        # Written by an older version, which cached all of the grains at once
         return {}
+    return cache
+
+
+def _write_grains_cache(opts, cfn, order, cache):
+    '''
+    Write the cached grains of the grain functions in order
+    '''
+    data = dict((name, cache[name]) for name in order if name in cache)
+    data['funcs'] = order
+    cumask = os.umask(0o77)
+    try:
+        if salt.utils.is_windows():
+            # Make sure cache file isn't read-only
+            __salt__['cmd.run']('attrib -R "{0}"'.format(cfn))
+        with salt.utils.fopen(cfn, 'w+b') as fp_:
+            try:
+                serial = salt.payload.Serial(opts)
+                serial.dump(data, fp_)
+            except TypeError:
+                # Can't serialize pydsl
+                pass
+    except (IOError, OSError):
+        msg = 'Unable to write to grains cache file {0}'
+        log.error(msg.format(cfn))
+    os.umask(cumask)
+
+
+def _run_grains(opts, funcs, names):
+    '''
+    Run the grain functions in names and return the grains they returned.
+
+    With grains_threads set, that many grain functions run at the same time
+    in threads. With grains_timeout set, a grain function which did not
+    return after that many seconds is left behind and missing from the
+    returned dict. Its thread is given up on, not stopped, and no longer
+    counts towards grains_threads.
+    '''
+    threads = opts.get('grains_threads', 0)
+    timeout = opts.get('grains_timeout', 0)
+    if not timeout and (threads < 2 or len(names) < 2):
+        return dict((name, _run_grain(name, funcs[name])) for name in names)
+
+    done = queue.Queue()
+
+    def run(name, fun):
+        try:
+            done.put((name, _run_grain(name, fun), None))
+        except Exception:
+            done.put((name, None, sys.exc_info()))
+
+    ret = {}
+    pending = list(names)
+    running = {}
+    while pending or running:
+        while pending and len(running) < max(threads, 1):
+            name = pending.pop(0)
+            thread = threading.Thread(target=run,
+                                      args=(name, funcs[name]),
+                                      name='grains-{0}'.format(name))
+            thread.daemon = True
+            thread.start()
+            running[name] = time.time()
+        wait = None
+        if timeout:
+            wait = max(min(running.values()) + timeout - time.time(), 0)
+        try:
+            name, grains_data, exc_info = done.get(timeout=wait)
+        except queue.Empty:
+            now = time.time()
+            for name, started in list(running.items()):
+                if now - started >= timeout:
+                    log.warning(
+                        'The grain function {0} did not return within {1} '
+                        'seconds'.format(name, timeout)
+                    )
+                    del running[name]
+            continue
+        if name not in running:
+            # A grain function which timed out returned after all
+            continue
+        del running[name]
+        if exc_info is not None:
+            # The exceptions of the core grains are not caught
+            six.reraise(*exc_info)
+        ret[name] = grains_data
+    return ret
+
+
+def _static_grains(opts):
+    '''
+    Set opts['grains'] to the grains set in the minion config
+    '''
     if 'conf_file' in opts:
         pre_opts = {}
         pre_opts.update(salt.config.load_config(
@@ -603,24 +772,26 @@ def grains(opts, force_refresh=False):
     else:
         opts['grains'] = {}
 
-    grains_data = {}
-    funcs = grain_funcs(opts)
-    if force_refresh:  # if we refresh, lets reload grain modules
-        funcs.clear()
-    # Run core grains
-    for key, fun in six.iteritems(funcs):
-        if not key.startswith('core.'):
-            continue
+
+def _grain_order(funcs):
+    '''
+    Return the names of the grain functions in the order they run in, the
+    core grains first so that the other grains can override them
+    '''
+    core = [key for key in funcs if key.startswith('core.')]
+    rest = [key for key in funcs
+            if not key.startswith('core.') and key != '_errors']
+    return core + rest
+
+
+def _run_grain(key, fun):
+    '''
+    Run a grain function and return the grains it returned
+    '''
+    if key.startswith('core.'):
         log.trace('Loading {0} grain'.format(key))
         ret = fun()
-        if not isinstance(ret, dict):
-            continue
-        grains_data.update(ret)
-
-    # Run the rest of the grains
-    for key, fun in six.iteritems(funcs):
-        if key.startswith('core.') or key == '_errors':
-            continue
+    else:
         try:
             ret = fun()
         except Exception:
@@ -631,32 +802,230 @@ def grains(opts, force_refresh=False):
                 ),
                 exc_info=True
             )
-            continue
-        if not isinstance(ret, dict):
-            continue
-        grains_data.update(ret)
+            return {}
+    if not isinstance(ret, dict):
+        return {}
+    return ret
 
-    # Write cache if enabled
-    if opts.get('grains_cache', False):
-        cumask = os.umask(0o77)
+
+def _grains_fingerprint(grains_data):
+    '''
+    Return a hash of the values of the grains
+    '''
+    data = json.dumps(grains_data, sort_keys=True, default=repr)
+    return hashlib.sha1(salt.utils.to_bytes(data)).hexdigest()
+
+
+def _read_grains_keymap(opts, order):
+    '''
+    Return the record of which grains each grain function returned the last
+    time all of them ran, if the same grain functions were found then
+    '''
+    path = os.path.join(opts['cachedir'], 'grains.keys.p')
+    try:
+        with salt.utils.fopen(path, 'rb') as fp_:
+            keymap = salt.payload.Serial('msgpack').load(fp_)
+    except (IOError, OSError):
+        return None
+    except Exception as exc:
+        log.debug('Unable to read {0}: {1}'.format(path, exc))
+        return None
+    if not isinstance(keymap, dict) or keymap.get('funcs') != order:
+        return None
+    keymap['keys'] = dict((name, set(keys))
+                          for name, keys in six.iteritems(keymap['keys']))
+    return keymap
+
+
+def _write_grains_keymap(opts, order, results, fingerprint):
+    '''
+    Record which grains each grain function returned, and the hash of all of
+    the grains
+    '''
+    keys = dict((name, set(results[name])) for name in order)
+    keymap = _read_grains_keymap(opts, order)
+    if keymap is not None \
+            and keymap['fingerprint'] == fingerprint \
+            and keymap['keys'] == keys:
+        return
+    path = os.path.join(opts['cachedir'], 'grains.keys.p')
+    try:
+        if not os.path.isdir(opts['cachedir']):
+            os.makedirs(opts['cachedir'])
+        tmpfh, tmpfname = tempfile.mkstemp(dir=opts['cachedir'])
+        os.close(tmpfh)
+        with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+            fp_.write(salt.payload.Serial('msgpack').dumps(
+                {'funcs': order,
+                 'keys': dict((name, sorted(names))
+                              for name, names in six.iteritems(keys)),
+                 'fingerprint': fingerprint}))
+        salt.utils.atomicfile.atomic_rename(tmpfname, path)
+    except (IOError, OSError) as exc:
+        log.debug('Unable to write {0}: {1}'.format(path, exc))
+
+
+def clear_virtual_cache(opts):
+    '''
+    Remove the virtual caches of all of the module types, so that the next
+    loaders import every module file again
+    '''
+    cachedir = os.path.join(opts['cachedir'], 'loader')
+    try:
+        names = os.listdir(cachedir)
+    except OSError:
+        return
+    for fn_ in names:
         try:
-            if salt.utils.is_windows():
-                # Make sure cache file isn't read-only
-                __salt__['cmd.run']('attrib -R "{0}"'.format(cfn))
-            with salt.utils.fopen(cfn, 'w+b') as fp_:
-                try:
-                    serial = salt.payload.Serial(opts)
-                    serial.dump(grains_data, fp_)
-                except TypeError:
-                    # Can't serialize pydsl
-                    pass
-        except (IOError, OSError):
-            msg = 'Unable to write to grains cache file {0}'
-            log.error(msg.format(cfn))
-        os.umask(cumask)
+            os.remove(os.path.join(cachedir, fn_))
+        except OSError as exc:
+            log.debug('Unable to remove {0}: {1}'.format(fn_, exc))
 
-    grains_data.update(opts['grains'])
-    return grains_data
+
+def _virtual_cache_default(obj):
+    '''
+    Return what the fingerprint of the virtual cache uses for an object json
+    does not know. Lazy grains are represented by the hash of their values,
+    which does not run the grain functions, and a pillar which was not
+    compiled yet is left out.
+    '''
+    if isinstance(obj, LazyGrains):
+        return obj.fingerprint()
+    if isinstance(obj, salt.utils.lazy.LazyDict) and obj.loaded:
+        return dict(obj)
+    return '<{0}>'.format(type(obj).__name__)
+
+
+def lazy_grains(opts):
+    '''
+    Return the grains as a :py:class:`LazyGrains` mapping, which only runs
+    the grain functions providing the grains which are read. A fresh grains
+    cache is used as is.
+
+    .. code-block:: python
+
+        import salt.config
+        import salt.loader
+
+        __opts__ = salt.config.minion_config('/etc/salt/minion')
+        __grains__ = salt.loader.lazy_grains(__opts__)
+        print __grains__['os']
+    '''
+    if opts.get('skip_grains', False) or opts.get('grains_cache', False):
+        return grains(opts)
+    _static_grains(opts)
+    return LazyGrains(opts, grain_funcs(opts))
+
+
+class LazyGrains(salt.utils.lazy.LazyDict):
+    '''
+    The grains of a minion, which are computed as they are read
+
+    Which grain function returned which grains the last time all of them ran
+    is kept in ``grains.keys.p`` in the cachedir. Reading a grain only runs
+    the functions which returned it then, and a grain none of them returned
+    is missing without running anything. When that record is missing or
+    outdated, when a grain is not where the record says, and when all of the
+    grains are needed, to iterate over them for instance, all of the grain
+    functions run.
+    '''
+    def __init__(self, opts, funcs):
+        self.opts = opts
+        self.funcs = funcs
+        self.static = opts.get('grains', {})
+        self.order = _grain_order(funcs)
+        # the grains returned by each grain function which ran
+        self.results = {}
+        self.keymap = _read_grains_keymap(opts, self.order)
+        super(LazyGrains, self).__init__()
+
+    def _run(self, name):
+        if name not in self.results:
+            self.results[name] = _run_grain(name, self.funcs[name])
+        return self.results[name]
+
+    def _missing(self, key):
+        '''
+        The grain is missing if no grain function returned it the last time
+        '''
+        return not self.loaded \
+            and key not in self._dict \
+            and key not in self.static \
+            and self.keymap is not None \
+            and not any(key in keys for keys in six.itervalues(self.keymap['keys']))
+
+    def _load(self, key):
+        '''
+        Run the grain functions which return the grain
+        '''
+        if key in self.static:
+            self._dict[key] = self.static[key]
+            return True
+        if self.keymap is not None:
+            names = [name for name in self.order
+                     if key in self.keymap['keys'].get(name, ())]
+            # the grain functions which run later override the earlier ones
+            for name in reversed(names):
+                self._run(name)
+            for name in reversed(names):
+                if key in self.results[name]:
+                    self._dict[key] = self.results[name][key]
+                    return True
+        self._load_all()
+        return key in self._dict
+
+    def _load_all(self):
+        '''
+        Run all of the grain functions
+        '''
+        data = {}
+        for name in self.order:
+            data.update(self._run(name))
+        data.update(self.static)
+        self._dict = data
+        self.loaded = True
+        _write_grains_keymap(self.opts, self.order, self.results,
+                             self.fingerprint())
+
+    def fingerprint(self):
+        '''
+        Return a hash of the values of the grains. Before all of the grain
+        functions ran it is a hash of the grain functions, of the files they
+        are loaded from and of the static grains, which does not run them.
+        '''
+        if self.loaded:
+            return _grains_fingerprint(dict(self))
+        files = []
+        for path, _ in sorted(six.itervalues(getattr(self.funcs, 'file_mapping', {}))):
+            try:
+                files.append([path, os.path.getmtime(path)])
+            except OSError:
+                files.append([path, None])
+        return _grains_fingerprint({'funcs': self.order,
+                                    'files': files,
+                                    'static': self.static})
+
+    def __setitem__(self, key, val):
+        if not self.loaded:
+            self._load_all()
+        self._dict[key] = val
+
+    def __delitem__(self, key):
+        if not self.loaded:
+            self._load_all()
+        del self._dict[key]
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
 
 
 # TODO: get rid of? Does anyone use this? You should use raw() instead
@@ -891,6 +1260,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         self.disabled = set(self.opts.get('disable_{0}s'.format(self.tag), []))
 
+        self._load_virtual_cache()
         self.refresh_file_mapping()
 
         super(LazyLoader, self).__init__()  # late init the lazy loader
@@ -930,6 +1300,8 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 # if we got what we wanted, we are done
                 if self._load_module(name) and mod_name in self.loaded_modules:
                     break
+            if self._virtual_cache is not None:
+                self._write_virtual_cache()
         if mod_name in self.loaded_modules:
             return self.loaded_modules[mod_name]
         else:
@@ -983,6 +1355,10 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         # create mapping of filename (without suffix) to (path, suffix)
         self.file_mapping = {}
+        # the virtual cache entries which were checked against the files
+        self._virtual_valid = {}
+        # the modules whose __virtual__ function raised or returned None
+        self._virtual_raised = set()
 
         for mod_dir in self.module_dirs:
             files = []
@@ -1046,6 +1422,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         # if we have been loaded before, lets clear the file mapping since
         # we obviously want a re-do
         if hasattr(self, 'opts'):
+            self._load_virtual_cache()
             self.refresh_file_mapping()
         self.initial_load = False
 
@@ -1073,20 +1450,204 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         '''
         Iterate over all file_mapping files in order of closeness to mod_name
         '''
+        if self._virtual_cache is not None:
+            # the files known to load as mod_name come first, and the files
+            # known to load as something else or not at all are skipped
+            known = []
+            for k in self.file_mapping:
+                entry = self._cached_virtual(k)
+                if entry is None:
+                    continue
+                if entry['virtual'] == mod_name:
+                    yield k
+                elif entry['virtual'] is None:
+                    self._skip_known_failure(k, entry)
+                known.append(k)
+            known = set(known)
+        else:
+            known = ()
+
         # do we have an exact match?
-        if mod_name in self.file_mapping:
+        if mod_name in self.file_mapping and mod_name not in known:
             yield mod_name
 
         # do we have a partial match?
         for k in self.file_mapping:
-            if mod_name in k:
+            if mod_name in k and k not in known:
                 yield k
 
         # anyone else? Bueller?
         for k in self.file_mapping:
-            if mod_name not in k:
+            if mod_name not in k and k not in known:
                 yield k
 
+    def _load_virtual_cache(self):
+        '''
+        Read the cache of the outcome of loading each module file. The cache
+        is only valid for the same inputs to the __virtual__ functions, so it
+        is kept in a file named after a hash of them.
+        '''
+        self._virtual_cache = None
+        self._virtual_cache_path = None
+        self._virtual_cache_dirty = False
+        if not self.opts.get('virtual_cache', False) \
+                or not self.virtual_enable \
+                or not self.opts.get('cachedir'):
+            return
+        fingerprint = self._virtual_cache_fingerprint()
+        if fingerprint is None:
+            return
+        self._virtual_cache_path = os.path.join(
+            self.opts['cachedir'],
+            'loader',
+            '{0}-{1}.p'.format(self.tag, fingerprint)
+        )
+        self._virtual_cache = self._read_virtual_cache()
+
+    def _virtual_cache_fingerprint(self):
+        '''
+        Return a hash of what the __virtual__ functions of the modules look
+        at: the opts, grains and pillar, the versions of salt and python, and
+        the directories python libraries and executables are found in. The
+        mtimes of those directories change when software is installed.
+        '''
+        paths = []
+        for path in sys.path + os.environ.get('PATH', '').split(os.pathsep):
+            try:
+                paths.append([path, os.stat(path).st_mtime])
+            except OSError:
+                paths.append([path, None])
+        inputs = {'salt': salt.version.__version__,
+                  'python': sys.version,
+                  'tag': self.tag,
+                  'module_dirs': self.module_dirs,
+                  'static_modules': self.static_modules,
+                  'whitelist': self.whitelist,
+                  'pack': sorted(self.pack),
+                  'paths': paths,
+                  'opts': self.opts}
+        try:
+            data = json.dumps(inputs,
+                              sort_keys=True,
+                              default=_virtual_cache_default)
+        except (TypeError, ValueError) as exc:
+            log.debug('Not caching the {0} modules: {1}'.format(self.tag, exc))
+            return None
+        return hashlib.sha1(salt.utils.to_bytes(data)).hexdigest()
+
+    def _read_virtual_cache(self):
+        '''
+        Return the entries of the virtual cache file
+        '''
+        try:
+            with salt.utils.fopen(self._virtual_cache_path, 'rb') as fp_:
+                cache = salt.payload.Serial('msgpack').load(fp_)
+        except (IOError, OSError):
+            return {}
+        except Exception as exc:
+            log.debug('Unable to read the virtual cache {0}: {1}'.format(
+                self._virtual_cache_path, exc))
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def _write_virtual_cache(self):
+        '''
+        Add the modules loaded since the last write to the virtual cache file
+        '''
+        if not self._virtual_cache_dirty:
+            return
+        self._virtual_cache_dirty = False
+        cachedir = os.path.dirname(self._virtual_cache_path)
+        new = not os.path.exists(self._virtual_cache_path)
+        # other processes may have added modules in the meantime
+        cache = self._read_virtual_cache()
+        cache.update(self._virtual_cache)
+        try:
+            if not os.path.isdir(cachedir):
+                os.makedirs(cachedir)
+            tmpfh, tmpfname = tempfile.mkstemp(dir=cachedir)
+            os.close(tmpfh)
+            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+                fp_.write(salt.payload.Serial('msgpack').dumps(cache))
+            salt.utils.atomicfile.atomic_rename(tmpfname, self._virtual_cache_path)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the virtual cache {0}: {1}'.format(
+                self._virtual_cache_path, exc))
+            return
+        if new:
+            # drop the caches of inputs which have not been seen for a day
+            prefix = '{0}-'.format(self.tag)
+            for fn_ in os.listdir(cachedir):
+                path = os.path.join(cachedir, fn_)
+                if not fn_.startswith(prefix) or path == self._virtual_cache_path:
+                    continue
+                try:
+                    if time.time() - os.path.getmtime(path) > 86400:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _cached_virtual(self, name):
+        '''
+        Return the virtual cache entry of the module file ``name`` if the file
+        did not change since it was recorded, and the entry did not expire
+        '''
+        if name in self._virtual_valid:
+            return self._virtual_valid[name]
+        entry = self._virtual_cache.get(name)
+        fpath, _ = self.file_mapping.get(name, (None, None))
+        if entry is not None:
+            try:
+                pstat = os.stat(fpath)
+                if entry['path'] != fpath \
+                        or entry['mtime'] != pstat.st_mtime \
+                        or entry['size'] != pstat.st_size \
+                        or time.time() - entry['time'] \
+                        > self.opts.get('virtual_cache_ttl', 3600):
+                    entry = None
+            except (OSError, TypeError, KeyError):
+                entry = None
+        self._virtual_valid[name] = entry
+        return entry
+
+    def _cache_virtual(self, name, virtual, missing=None, error=None):
+        '''
+        Record the outcome of loading the module file ``name``, ``virtual``
+        is the name the module was loaded as or None if it was not loaded
+        '''
+        if self._virtual_cache is None:
+            return
+        fpath, suffix = self.file_mapping[name]
+        if suffix in ('', '.o'):
+            # only the files themselves tell whether they changed
+            return
+        try:
+            pstat = os.stat(fpath)
+        except OSError:
+            return
+        if error is not None and not isinstance(error, six.string_types):
+            error = str(error)
+        entry = {'path': fpath,
+                 'mtime': pstat.st_mtime,
+                 'size': pstat.st_size,
+                 'time': time.time(),
+                 'virtual': virtual,
+                 'missing': missing,
+                 'error': error}
+        self._virtual_cache[name] = entry
+        self._virtual_valid[name] = entry
+        self._virtual_cache_dirty = True
+
+    def _skip_known_failure(self, name, entry):
+        '''
+        Account for a module file which is known not to load without
+        importing it
+        '''
+        self.loaded_files.add(name)
+        if entry['missing'] is not None:
+            self.missing_modules[entry['missing']] = entry['error']
+            self.missing_modules[name] = entry['error']
+
     def _reload_submodules(self, mod):
         submodules = (
             getattr(mod, sname) for sname in dir(mod) if
@@ -1225,6 +1786,12 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 # If a module has information about why it could not be loaded, record it
                 self.missing_modules[module_name] = virtual_err
                 self.missing_modules[name] = virtual_err
+                if module_name in self._virtual_raised:
+                    # only a __virtual__ function which cleanly returned
+                    # False is asked again once the entry expires
+                    self._virtual_raised.discard(module_name)
+                else:
+                    self._cache_virtual(name, None, module_name, virtual_err)
                 return False
 
         # If this is a proxy minion then MOST modules cannot work. Therefore, require that
@@ -1240,6 +1807,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     err_string = 'not a proxy_minion enabled module'
                     self.missing_modules[module_name] = err_string
                     self.missing_modules[name] = err_string
+                    self._cache_virtual(name, None, module_name, err_string)
                     return False
 
         if getattr(mod, '__load__', False) is not False:
@@ -1280,6 +1848,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                      'for reasons: {0}'.format(exc))
 
         self.loaded_modules[module_name] = mod_dict
+        self._cache_virtual(name, module_name)
         return True
 
     def _load(self, key):
@@ -1324,6 +1893,8 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     reloaded = True
                 continue
 
+        if self._virtual_cache is not None:
+            self._write_virtual_cache()
         return ret
 
     def _load_all(self):
@@ -1333,8 +1904,15 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         for name in self.file_mapping:
             if name in self.loaded_files or name in self.missing_modules:
                 continue
+            if self._virtual_cache is not None:
+                entry = self._cached_virtual(name)
+                if entry is not None and entry['virtual'] is None:
+                    self._skip_known_failure(name, entry)
+                    continue
             self._load_module(name)
 
+        if self._virtual_cache is not None:
+            self._write_virtual_cache()
         self.loaded = True
 
     def _apply_outputter(self, func, mod):
@@ -1396,6 +1974,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                                   ' for {0}. Module will not be loaded: {1}'.format(
                                       module_name, exc),
                                   exc_info_on_loglevel=logging.DEBUG)
+                        self._virtual_raised.add(module_name)
                         virtual = None
                 # Get the module's virtual name
                 virtualname = getattr(mod, '__virtualname__', virtual)
@@ -1407,6 +1986,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     # Some modules might accidentally return None and are
                     # improperly loaded
                     if virtual is None:
+                        self._virtual_raised.add(module_name)
                         log.warning(
                             '{0}.__virtual__() is wrongly returning `None`. '
                             'It should either return `True`, `False` or a new '
@@ -1486,6 +2066,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 ),
                 exc_info=True
             )
+            self._virtual_raised.add(module_name)
             return (False, module_name, error_reason)
 
         return (True, module_name, None)
@@ -12,6 +12,7 @@ import re
 import sys
 import time
 import errno
+import signal
 import logging
 import tempfile
 import traceback
@@ -29,6 +30,8 @@ import zmq.eventloop.ioloop
 if not hasattr(zmq.eventloop.ioloop, 'ZMQIOLoop'):
     zmq.eventloop.ioloop.ZMQIOLoop = zmq.eventloop.ioloop.IOLoop
 import tornado.gen  # pylint: disable=F0401
+import tornado.locks  # pylint: disable=F0401
+from concurrent.futures import ThreadPoolExecutor  # pylint: disable=F0401
 
 # Import salt libs
 import salt.crypt
@@ -56,6 +59,7 @@ import salt.utils.job
 import salt.utils.reactor
 import salt.utils.verify
 import salt.utils.minions
+import salt.utils.gitfs
 import salt.utils.gzip_util
 import salt.utils.process
 import salt.utils.zeromq
@@ -86,6 +90,12 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# The commands worker_offload_cmds can run in the thread pool of a worker. The
+# others use state of the worker which is not safe to share between threads,
+# like the job cache connections, the IOLoop of the worker or, for _pillar,
+# the fileserver modules, which compiling a pillar loads again with its opts.
+OFFLOAD_CMDS = ('_file_recv',)
+
 
 class SMaster(object):
     '''
@@ -171,6 +181,9 @@ class Maintenance(MultiprocessingProcess):
         self.event = salt.utils.event.get_master_event(self.opts, self.opts['sock_dir'], listen=False)
         # Init any values needed by the git ext pillar
         self.git_pillar = salt.daemons.masterapi.init_git_pillar(self.opts)
+        # The pillar_roots mtime map the compiled pillar cache was checked
+        # against last
+        self.pillar_roots_map = None
         # Set up search object
         self.search = salt.search.Search(self.opts)
 
@@ -202,6 +215,7 @@ class Maintenance(MultiprocessingProcess):
                 salt.daemons.masterapi.clean_expired_tokens(self.opts)
             self.handle_search(now, last)
             self.handle_git_pillar()
+            self.handle_pillar_cache()
             self.handle_schedule()
             self.handle_presence(old_present)
             self.handle_key_rotate(now)
@@ -259,15 +273,44 @@ class Maintenance(MultiprocessingProcess):
         '''
         Update git pillar
         '''
+        changed = False
         try:
             for pillar in self.git_pillar:
-                pillar.update()
+                if isinstance(pillar, salt.utils.gitfs.GitPillar):
+                    if pillar.update():
+                        changed = True
+                else:
+                    # The legacy git_pillar only reports whether the update
+                    # worked, compare the checked out commit instead
+                    before = pillar.repo.head.commit.hexsha
+                    pillar.update()
+                    if pillar.repo.head.commit.hexsha != before:
+                        changed = True
         except Exception as exc:
             log.error(
                 'Exception \'{0}\' caught while updating git_pillar'
                 .format(exc),
                 exc_info_on_loglevel=logging.DEBUG
             )
+        if changed and self.opts.get('pillar_cache', False):
+            log.debug('git_pillar changed, invalidating the pillar cache')
+            salt.pillar.pillar_cache_stamp(self.opts)
+
+    def handle_pillar_cache(self):
+        '''
+        Invalidate the compiled pillar cache when a file in the pillar_roots
+        is added, removed or changed
+        '''
+        if not self.opts.get('pillar_cache', False):
+            return
+        pillar_roots_map = salt.fileserver.generate_mtime_map(
+            self.opts['pillar_roots']
+        )
+        if self.pillar_roots_map is not None \
+                and pillar_roots_map != self.pillar_roots_map:
+            log.debug('pillar_roots changed, invalidating the pillar cache')
+            salt.pillar.pillar_cache_stamp(self.opts)
+        self.pillar_roots_map = pillar_roots_map
 
     def handle_schedule(self):
         '''
@@ -411,6 +454,16 @@ class Master(SMaster):
         if not self.opts['fileserver_backend']:
             errors.append('No fileserver backends are configured')
 
+        unsafe_offload_cmds = sorted(
+            set(self.opts.get('worker_offload_cmds') or {}) - set(OFFLOAD_CMDS)
+        )
+        if unsafe_offload_cmds:
+            critical_errors.append(
+                'worker_offload_cmds cannot run {0} in threads, only {1} '
+                'are supported'.format(', '.join(unsafe_offload_cmds),
+                                       ', '.join(OFFLOAD_CMDS))
+            )
+
         non_legacy_git_pillars = [
             x for x in self.opts.get('ext_pillar', [])
             if 'git' in x
@@ -460,6 +513,11 @@ class Master(SMaster):
         enable_sigusr2_handler()
 
         self.__set_max_open_files()
+        if self.opts.get('pillar_cache', False) \
+                and self.opts.get('pillar_cache_encrypt', False):
+            # Create the key before the workers are started so that they do
+            # not race to write it
+            salt.pillar.pillar_cache_key(self.opts)
         log.info('Creating master process manager')
         process_manager = salt.utils.process.ProcessManager()
         log.info('Creating master maintenance process')
@@ -709,12 +767,34 @@ class MWorker(MultiprocessingProcess):
         # using ZMQIOLoop since we *might* need zmq in there
         zmq.eventloop.ioloop.install()
         self.io_loop = zmq.eventloop.ioloop.ZMQIOLoop()
+        if self.aes_funcs.return_batch is not None:
+            self.aes_funcs.return_batch.io_loop = self.io_loop
         for req_channel in self.req_channels:
             req_channel.post_fork(self._handle_payload, io_loop=self.io_loop)  # TODO: cleaner? Maybe lazily?
+        signal.signal(signal.SIGTERM, self._handle_signals)
         try:
             self.io_loop.start()
         except KeyboardInterrupt:
             self.io_loop.add_callback(self.io_loop.stop)
+        finally:
+            self._shutdown()
+
+    def _handle_signals(self, signum, sigframe):
+        '''
+        Stop the IOLoop once the request being handled is done, so that the
+        worker shuts down cleanly
+        '''
+        log.debug('MWorker received signal {0}, shutting down'.format(signum))
+        self.io_loop.add_callback_from_signal(self.io_loop.stop)
+
+    def _shutdown(self):
+        '''
+        Wait for the offloaded commands and write the returns still queued to
+        the job cache
+        '''
+        if self.offload_limits:
+            self.executor.shutdown(wait=True)
+        self.aes_funcs.destroy()
 
     @tornado.gen.coroutine
     def _handle_payload(self, payload):
@@ -740,8 +820,16 @@ class MWorker(MultiprocessingProcess):
         '''
         key = payload['enc']
         load = payload['load']
-        ret = {'aes': self._handle_aes,
-               'clear': self._handle_clear}[key](load)
+        handler = {'aes': self._handle_aes,
+                   'clear': self._handle_clear}[key]
+        cmd = load.get('cmd')
+        if cmd in self.offload_limits:
+            # Run slow commands in the thread pool so that the worker keeps
+            # serving other requests, at most the configured number at once
+            with (yield self.offload_limits[cmd].acquire()):
+                ret = yield self.executor.submit(handler, load)
+        else:
+            ret = handler(load)
         raise tornado.gen.Return(ret)
 
     def _handle_clear(self, load):
@@ -783,6 +871,15 @@ class MWorker(MultiprocessingProcess):
             self.key,
             )
         self.aes_funcs = AESFuncs(self.opts)
+        self.offload_limits = {}
+        offload_cmds = dict(
+            (cmd, max(1, int(limit)))
+            for cmd, limit in six.iteritems(self.opts.get('worker_offload_cmds') or {})
+        )
+        if offload_cmds:
+            for cmd, limit in six.iteritems(offload_cmds):
+                self.offload_limits[cmd] = tornado.locks.Semaphore(limit)
+            self.executor = ThreadPoolExecutor(max_workers=sum(offload_cmds.values()))
         salt.utils.reinit_crypto()
         self.__bind()
 
@@ -814,9 +911,24 @@ class AESFuncs(object):
             self.opts,
             states=False,
             rend=False)
+        if self.opts.get('return_batch_size', 0) > 1:
+            self.return_batch = salt.utils.job.ReturnBatch(self.opts, self.mminion)
+        else:
+            self.return_batch = None
+        if self.opts.get('pillar_cache', False):
+            self.pillar_cache = salt.pillar.PillarCache(self.opts)
+        else:
+            self.pillar_cache = None
         self.__setup_fileserver()
         self.masterapi = salt.daemons.masterapi.RemoteFuncs(opts)
 
+    def destroy(self):
+        '''
+        Write the minion returns still queued to the job cache
+        '''
+        if self.return_batch is not None:
+            self.return_batch.flush()
+
     def __setup_fileserver(self):
         '''
         Set the local file objects from the file server interface
@@ -824,6 +936,7 @@ class AESFuncs(object):
         self.fs_ = salt.fileserver.Fileserver(self.opts)
         self._serve_file = self.fs_.serve_file
         self._file_hash = self.fs_.file_hash
+        self._file_hash_list = self.fs_.file_hash_list
         self._file_list = self.fs_.file_list
         self._file_list_emptydirs = self.fs_.file_list_emptydirs
         self._dir_list = self.fs_.dir_list
@@ -1152,15 +1265,25 @@ class AESFuncs(object):
         load['grains']['id'] = load['id']
 
         pillar_dirs = {}
-        pillar = salt.pillar.Pillar(
-            self.opts,
-            load['grains'],
-            load['id'],
-            load.get('saltenv', load.get('env')),
-            ext=load.get('ext'),
-            pillar=load.get('pillar_override', {}),
-            pillarenv=load.get('pillarenv'))
-        data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
+        if self.pillar_cache is not None:
+            data = self.pillar_cache.compile_pillar(
+                load['grains'],
+                load['id'],
+                load.get('saltenv', load.get('env')),
+                ext=load.get('ext'),
+                pillar=load.get('pillar_override', {}),
+                pillarenv=load.get('pillarenv'),
+                pillar_dirs=pillar_dirs)
+        else:
+            pillar = salt.pillar.Pillar(
+                self.opts,
+                load['grains'],
+                load['id'],
+                load.get('saltenv', load.get('env')),
+                ext=load.get('ext'),
+                pillar=load.get('pillar_override', {}),
+                pillarenv=load.get('pillarenv'))
+            data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
         self.fs_.update_opts()
         if self.opts.get('minion_data_cache', False):
             cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
@@ -1177,6 +1300,7 @@ class AESFuncs(object):
                     )
             # On Windows, os.rename will fail if the destination file exists.
             salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            salt.utils.minions.note_minion_data_change(self.opts, load['id'])
         return data
 
     def _minion_event(self, load):
@@ -1215,7 +1339,11 @@ class AESFuncs(object):
         '''
         try:
             salt.utils.job.store_job(
-                self.opts, load, event=self.event, mminion=self.mminion)
+                self.opts,
+                load,
+                event=self.event,
+                mminion=self.mminion,
+                batch=self.return_batch)
         except salt.exceptions.SaltCacheError:
             log.error('Could not store job information for load: {0}'.format(load))
 
@@ -2216,6 +2344,8 @@ class FloMWorker(MWorker):
                 self.key,
                 )
         self.aes_funcs = salt.master.AESFuncs(self.opts)
+        # Requests are answered in order here, nothing is offloaded
+        self.offload_limits = {}
         self.context = zmq.Context(1)
         self.socket = self.context.socket(zmq.REP)
         if self.opts.get('ipc_mode', '') == 'tcp':
@@ -2243,6 +2373,9 @@ class FloMWorker(MWorker):
                 payload = self.serial.loads(package)
                 ret = self.serial.dumps(self._handle_payload(payload))
                 self.socket.send(ret)
+            # there is no IOLoop here to time out the queued returns
+            if self.aes_funcs.return_batch is not None:
+                self.aes_funcs.return_batch.flush_expired()
         except KeyboardInterrupt:
             raise
         except Exception as exc:
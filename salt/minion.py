@@ -86,6 +86,7 @@ import salt.utils.args
 import salt.utils.event
 import salt.utils.minions
 import salt.utils.schedule
+import salt.utils.process
 import salt.utils.error
 import salt.utils.zeromq
 import salt.defaults.exitcodes
@@ -509,7 +510,10 @@ class SMinion(MinionBase):
     '''
     def __init__(self, opts):
         # Late setup of the opts grains, so we can log from the grains module
-        opts['grains'] = salt.loader.grains(opts)
+        if opts.get('lazy_startup', False):
+            opts['grains'] = salt.loader.lazy_grains(opts)
+        else:
+            opts['grains'] = salt.loader.grains(opts)
         super(SMinion, self).__init__(opts)
 
         # Clean out the proc directory (default /var/cache/salt/minion/proc)
@@ -522,13 +526,23 @@ class SMinion(MinionBase):
         '''
         Load all of the modules for the minion
         '''
-        self.opts['pillar'] = salt.pillar.get_pillar(
-            self.opts,
-            self.opts['grains'],
-            self.opts['id'],
-            self.opts['environment'],
-            pillarenv=self.opts.get('pillarenv'),
-        ).compile_pillar()
+        if self.opts.get('lazy_startup', False):
+            # Compile the pillar when it is first read
+            self.opts['pillar'] = salt.pillar.LazyPillar(
+                self.opts,
+                self.opts['grains'],
+                self.opts['id'],
+                self.opts['environment'],
+                pillarenv=self.opts.get('pillarenv'),
+            )
+        else:
+            self.opts['pillar'] = salt.pillar.get_pillar(
+                self.opts,
+                self.opts['grains'],
+                self.opts['id'],
+                self.opts['environment'],
+                pillarenv=self.opts.get('pillarenv'),
+            ).compile_pillar()
         self.utils = salt.loader.utils(self.opts)
         self.functions = salt.loader.minion_mods(self.opts, utils=self.utils,
                                                  include_errors=True)
@@ -683,6 +697,11 @@ class Minion(MinionBase):
         self._running = None
         self.win_proc = []
         self.loaded_base_name = loaded_base_name
+        # The pool of pre-forked job workers, see _start_job_pool()
+        self.job_pool = None
+        # Set in the job workers, where the return channel is kept open
+        self._job_worker = False
+        self._job_channel = None
 
         if io_loop is None:
             zmq.eventloop.ioloop.install()
@@ -949,6 +968,22 @@ class Minion(MinionBase):
                 self.functions, self.returners, self.function_errors, self.executors = self._load_modules()
                 self.schedule.functions = self.functions
                 self.schedule.returners = self.returners
+                if self.job_pool is not None:
+                    self.job_pool.recycle()
+        if self.job_pool is not None:
+            # Until a worker takes the job and records its own pid, the job
+            # is recorded as run by the minion, so that saltutil.running and
+            # saltutil.find_job report the jobs waiting in the queue
+            sdata = {'pid': os.getpid()}
+            sdata.update(data)
+            with salt.utils.fopen(os.path.join(self.proc_dir, data['jid']), 'w+b') as fp_:
+                fp_.write(self.serial.dumps(sdata))
+            if self.job_pool.fire_async(data):
+                return
+            log.warning(
+                'The job worker queue is full, running job {0} in a new '
+                'process'.format(data['jid'])
+            )
         if isinstance(data['fun'], tuple) or isinstance(data['fun'], list):
             target = Minion._thread_multi_return
         else:
@@ -978,6 +1013,47 @@ class Minion(MinionBase):
         else:
             self.win_proc.append(process)
 
+    def _start_job_pool(self):
+        '''
+        Fork the pool of job workers if ``job_workers`` is set. The workers
+        are forked from the minion after its modules are loaded and run the
+        jobs which would otherwise each fork a new process.
+        '''
+        if not self.opts.get('job_workers') or self.job_pool is not None:
+            return
+        if not self.opts['multiprocessing']:
+            log.warning('job_workers is ignored when multiprocessing is off')
+            return
+        if salt.utils.is_windows():
+            log.warning('job_workers is not supported on Windows, a new '
+                        'process is started for each job')
+            return
+        self.job_pool = salt.utils.process.ProcessPool(
+            self._run_pooled_job,
+            num_procs=self.opts['job_workers'],
+            max_tasks=self.opts.get('job_worker_max_jobs', 0),
+            queue_size=self.opts.get('job_worker_queue_size', 0),
+            initializer=self._init_job_worker,
+            name='JobWorker',
+        )
+
+    def _init_job_worker(self):
+        '''
+        Prepare a freshly forked job worker, the channel to return the jobs
+        on is opened once and kept for all of the jobs of the worker
+        '''
+        self._job_worker = True
+        self._job_channel = salt.transport.Channel.factory(self.opts)
+
+    def _run_pooled_job(self, data):
+        '''
+        Run a job inside of a job worker
+        '''
+        if isinstance(data['fun'], tuple) or isinstance(data['fun'], list):
+            self._thread_multi_return(self, self.opts, data)
+        else:
+            self._thread_return(self, self.opts, data)
+
     @classmethod
     def _thread_return(cls, minion_instance, opts, data):
         '''
@@ -1012,10 +1088,11 @@ class Minion(MinionBase):
                     )
 
         fn_ = os.path.join(minion_instance.proc_dir, data['jid'])
-        if opts['multiprocessing']:
-            salt.utils.daemonize_if(opts)
-
-        salt.utils.appendproctitle(data['jid'])
+        if not minion_instance._job_worker:
+            if opts['multiprocessing']:
+                salt.utils.daemonize_if(opts)
+            # the job workers outlive their jobs, leave their title alone
+            salt.utils.appendproctitle(data['jid'])
 
         sdata = {'pid': os.getpid()}
         sdata.update(data)
@@ -1170,11 +1247,12 @@ class Minion(MinionBase):
         This method should be used as a threading target, start the actual
         minion side execution.
         '''
-        salt.utils.appendproctitle(data['jid'])
         # this seems awkward at first, but it's a workaround for Windows
         # multiprocessing communication.
         if not minion_instance:
             minion_instance = cls(opts)
+        if not minion_instance._job_worker:
+            salt.utils.appendproctitle(data['jid'])
         ret = {
             'return': {},
             'success': {},
@@ -1238,7 +1316,7 @@ class Minion(MinionBase):
                     # The file is gone already
                     pass
         log.info('Returning information for job: {0}'.format(jid))
-        channel = salt.transport.Channel.factory(self.opts)
+        channel = self._job_channel or salt.transport.Channel.factory(self.opts)
         if ret_cmd == '_syndic_return':
             load = {'cmd': ret_cmd,
                     'id': self.opts['id'],
@@ -1357,9 +1435,13 @@ class Minion(MinionBase):
         Refresh the functions and returners.
         '''
         log.debug('Refreshing modules. Notify={0}'.format(notify))
+        salt.loader.clear_virtual_cache(self.opts)
         self.functions, self.returners, _, self.executors = self._load_modules(force_refresh, notify=notify)
         self.schedule.functions = self.functions
         self.schedule.returners = self.returners
+        # the job workers still have the old modules
+        if self.job_pool is not None:
+            self.job_pool.recycle()
 
     # TODO: only allow one future in flight at a time?
     @tornado.gen.coroutine
@@ -1672,6 +1754,9 @@ class Minion(MinionBase):
         # On first startup execute a state run if configured to do so
         self._state_run()
 
+        # Fork the job workers now that the modules are loaded
+        self._start_job_pool()
+
         loop_interval = self.opts['loop_interval']
 
         try:
@@ -1712,6 +1797,10 @@ class Minion(MinionBase):
 
         self.periodic_callbacks['cleanup'] = tornado.ioloop.PeriodicCallback(self._fallback_cleanups, loop_interval * 1000, io_loop=self.io_loop)
 
+        if self.job_pool is not None:
+            # replace the job workers which exited
+            self.periodic_callbacks['job_pool'] = tornado.ioloop.PeriodicCallback(self.job_pool.check_workers, 1000, io_loop=self.io_loop)
+
         def handle_beacons():
             # Process Beacons
             try:
@@ -1782,6 +1871,9 @@ class Minion(MinionBase):
         if hasattr(self, 'periodic_callbacks'):
             for cb in six.itervalues(self.periodic_callbacks):
                 cb.stop()
+        if getattr(self, 'job_pool', None) is not None:
+            self.job_pool.stop()
+            self.job_pool = None
 
     def __del__(self):
         self.destroy()
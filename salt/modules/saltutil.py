@@ -43,6 +43,7 @@ import salt.state
 import salt.client
 import salt.client.ssh.client
 import salt.config
+import salt.loader
 import salt.runner
 import salt.utils
 import salt.utils.process
@@ -161,6 +162,7 @@ def _sync(form, saltenv=None):
         mod_file = os.path.join(__opts__['cachedir'], 'module_refresh')
         with salt.utils.fopen(mod_file, 'a+') as ofile:
             ofile.write('')
+        salt.loader.clear_virtual_cache(__opts__)
     if form == 'grains' and \
        __opts__.get('grains_cache') and \
        os.path.isfile(os.path.join(__opts__['cachedir'], 'grains.cache.p')):
@@ -552,6 +554,7 @@ def refresh_modules(async=True):
 
         salt '*' saltutil.refresh_modules
     '''
+    salt.loader.clear_virtual_cache(__opts__)
     try:
         if async:
             #  If we're going to block, first setup a listener
@@ -494,12 +494,20 @@ def highstate(test=None,
         "roots" of salt directories (with their own minion config, pillars,
         file_roots) to run highstate out of.
 
+    compile_cache
+        Set to ``False`` to compile the highstate again even if the compiled
+        highstate is cached, or ``True`` to use the cache when
+        :conf_minion:`state_compile_cache` is not set.
+
+        .. versionadded:: Boron
+
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' state.highstate
 
+        salt '*' state.highstate compile_cache=False
         salt '*' state.highstate whitelist=sls1_to_run,sls2_to_run
         salt '*' state.highstate exclude=sls_to_exclude
         salt '*' state.highstate exclude="[{'id': 'id_to_exclude'}, {'sls': 'sls_to_exclude'}]"
@@ -564,7 +572,8 @@ def highstate(test=None,
                 cache=kwargs.get('cache', None),
                 cache_name=kwargs.get('cache_name', 'highstate'),
                 force=kwargs.get('force', False),
-                whitelist=kwargs.get('whitelist')
+                whitelist=kwargs.get('whitelist'),
+                compile_cache=kwargs.get('compile_cache')
                 )
     finally:
         st_.pop_active()
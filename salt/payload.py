@@ -11,6 +11,7 @@ from __future__ import absolute_import
 import logging
 import gc
 import datetime
+import collections
 
 # Import salt libs
 import salt.log
@@ -188,6 +189,24 @@ class Serial(object):
             if "datetime.datetime" in str(e):
                 return msgpack.dumps(datetime_encoder(msg))
 
+            # Mappings which are not dicts, like the lazy grains and pillar
+            # of lazy_startup, are serialized as dicts
+            def mapping_encoder(obj):
+                if isinstance(obj, collections.Mapping):
+                    # copying keeps the order of the OrderedDicts
+                    obj = obj.copy() if isinstance(obj, dict) else dict(obj)
+                    for key, value in list(six.iteritems(obj)):
+                        obj[key] = mapping_encoder(value)
+                    return obj
+                elif isinstance(obj, (list, tuple)):
+                    return [mapping_encoder(entry) for entry in obj]
+                return obj
+
+            try:
+                return msgpack.dumps(mapping_encoder(msg))
+            except TypeError:
+                pass
+
             if msgpack.version >= (0, 2, 0):
                 # Should support OrderedDict serialization, so, let's
                 # raise the exception
@@ -8,14 +8,22 @@ from __future__ import absolute_import
 import copy
 import os
 import collections
+import hashlib
+import json
 import logging
+import tempfile
+import time
 
 # Import salt libs
 import salt.loader
 import salt.fileclient
 import salt.minion
 import salt.crypt
+import salt.payload
 import salt.transport
+import salt.utils
+import salt.utils.atomicfile
+import salt.utils.lazy
 import salt.utils.url
 from salt.exceptions import SaltClientError
 from salt.template import compile_template
@@ -52,6 +60,72 @@ def get_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=None,
                  pillar=pillar, pillarenv=pillarenv)
 
 
+class LazyPillar(salt.utils.lazy.LazyDict):
+    '''
+    The pillar of a minion, which is compiled the first time it is read
+
+    The arguments are those of :py:func:`get_pillar`. The grains are passed
+    on to the pillar as a plain dict, so compiling the pillar computes all of
+    the grains of lazy grains.
+    '''
+    def __init__(self, opts, grains, id_, saltenv=None, pillarenv=None):
+        self.opts = opts
+        self.grains = grains
+        self.id_ = id_
+        self.saltenv = saltenv
+        self.pillarenv = pillarenv
+        super(LazyPillar, self).__init__()
+
+    def _compile(self):
+        '''
+        Compile the pillar
+        '''
+        log.debug('Compiling the pillar of {0}'.format(self.id_))
+        # The pillar being compiled must not read this one
+        opts = dict(self.opts)
+        opts['pillar'] = {}
+        self._dict = get_pillar(
+            opts,
+            dict(self.grains),
+            self.id_,
+            self.saltenv,
+            pillarenv=self.pillarenv,
+        ).compile_pillar()
+        self.loaded = True
+
+    def _load(self, key):
+        self._compile()
+        return key in self._dict
+
+    def _load_all(self):
+        self._compile()
+
+    def __setitem__(self, key, val):
+        if not self.loaded:
+            self._compile()
+        self._dict[key] = val
+
+    def __delitem__(self, key):
+        if not self.loaded:
+            self._compile()
+        del self._dict[key]
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        if not self.loaded:
+            return LazyPillar(self.opts, self.grains, self.id_, self.saltenv,
+                              self.pillarenv)
+        return copy.deepcopy(self._dict, memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
 # TODO: migrate everyone to this one!
 def get_async_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=None,
                pillar=None, pillarenv=None):
@@ -704,6 +778,192 @@ class Pillar(object):
         return pillar
 
 
+def pillar_cache_key(opts):
+    '''
+    Return the key used to encrypt the pillar cache, generating it the first
+    time it is needed. The key is kept in the pki_dir so that a copy of the
+    cachedir alone does not reveal the cached pillar data.
+    '''
+    keyfile = os.path.join(opts['pki_dir'], '.pillar_cache_key')
+    if not os.path.isfile(keyfile):
+        cumask = os.umask(191)
+        try:
+            with salt.utils.fopen(keyfile, 'w+') as fp_:
+                fp_.write(salt.crypt.Crypticle.generate_key_string())
+        finally:
+            os.umask(cumask)
+    with salt.utils.fopen(keyfile, 'r') as fp_:
+        return fp_.read().strip()
+
+
+def pillar_cache_stamp(opts, minion_id=None):
+    '''
+    Invalidate the pillar cache of a single minion, or of all minions when no
+    minion id is passed, by writing the current time to the matching stamp
+    file. Entries cached before that time are recompiled on their next
+    request.
+    '''
+    cachedir = os.path.join(opts['cachedir'], 'pillar_cache')
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir, 0o700)
+    if minion_id is None:
+        stamp = os.path.join(cachedir, '.invalidated')
+    else:
+        stamp = os.path.join(cachedir, '{0}.invalidated'.format(minion_id))
+        datap = os.path.join(cachedir, '{0}.p'.format(minion_id))
+        if os.path.isfile(datap):
+            os.remove(datap)
+    # The time is written out rather than using the mtime of the stamp, which
+    # only has a resolution of a second on some filesystems
+    tmpfh, tmpfname = tempfile.mkstemp(dir=cachedir)
+    os.close(tmpfh)
+    with salt.utils.fopen(tmpfname, 'w+') as fp_:
+        fp_.write(repr(time.time()))
+    salt.utils.atomicfile.atomic_rename(tmpfname, stamp)
+    return True
+
+
+class PillarCache(object):
+    '''
+    Keep compiled pillar data on the master so that it is not rendered again
+    for every request of a minion.
+
+    Entries are keyed on the minion id and a fingerprint of everything the
+    minion sends which the compilation depends on: grains, saltenv,
+    pillarenv, ext and the pillar override. They expire after
+    ``pillar_cache_ttl`` seconds, or when they were compiled before the
+    global or per minion stamp written by :func:`pillar_cache_stamp`.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.cachedir = os.path.join(opts['cachedir'], 'pillar_cache')
+        self.ttl = opts.get('pillar_cache_ttl', 3600)
+        self.backend = opts.get('pillar_cache_backend', 'disk')
+        self.serial = salt.payload.Serial(opts)
+        self.memory = {}
+        self.crypticle = None
+        if opts.get('pillar_cache_encrypt'):
+            self.crypticle = salt.crypt.Crypticle(opts,
+                                                  pillar_cache_key(opts),
+                                                  compression='zlib')
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir, 0o700)
+
+    @staticmethod
+    def fingerprint(grains, saltenv=None, ext=None, pillar=None, pillarenv=None):
+        '''
+        Return a stable hash of the inputs a pillar is compiled from
+        '''
+        data = json.dumps([grains, saltenv, ext, pillar, pillarenv],
+                          sort_keys=True,
+                          default=repr)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _stamp(self, minion_id=None):
+        '''
+        Return the time of the last invalidation for the minion or all minions
+        '''
+        if minion_id is None:
+            stamp = os.path.join(self.cachedir, '.invalidated')
+        else:
+            stamp = os.path.join(self.cachedir, '{0}.invalidated'.format(minion_id))
+        try:
+            with salt.utils.fopen(stamp, 'r') as fp_:
+                return float(fp_.read())
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def _valid(self, entry, minion_id):
+        '''
+        Check an entry against the TTL and the invalidation stamps
+        '''
+        if time.time() - entry['time'] > self.ttl:
+            return False
+        return entry['time'] >= max(self._stamp(), self._stamp(minion_id))
+
+    def _load_entries(self, minion_id):
+        if self.backend == 'memory':
+            return self.memory.get(minion_id, {})
+        datap = os.path.join(self.cachedir, '{0}.p'.format(minion_id))
+        try:
+            with salt.utils.fopen(datap, 'rb') as fp_:
+                return self.serial.load(fp_)
+        except (IOError, OSError):
+            return {}
+        except Exception:
+            log.debug('Unable to read the pillar cache of {0}'.format(minion_id))
+            return {}
+
+    def _save_entries(self, minion_id, entries):
+        if self.backend == 'memory':
+            self.memory[minion_id] = entries
+            return
+        datap = os.path.join(self.cachedir, '{0}.p'.format(minion_id))
+        tmpfh, tmpfname = tempfile.mkstemp(dir=self.cachedir)
+        os.close(tmpfh)
+        with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+            fp_.write(self.serial.dumps(entries))
+        salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+
+    def fetch(self, minion_id, fingerprint):
+        '''
+        Return the cached pillar for the fingerprint, or None
+        '''
+        entry = self._load_entries(minion_id).get(fingerprint)
+        if entry is None or not self._valid(entry, minion_id):
+            return None
+        data = entry['data']
+        if self.crypticle is not None:
+            try:
+                data = self.crypticle.loads(data)
+            except Exception:
+                log.debug('Unable to decrypt the pillar cache of {0}'.format(minion_id))
+                return None
+        return data
+
+    def store(self, minion_id, fingerprint, compiled, data):
+        '''
+        Cache the pillar compiled for the fingerprint at time ``compiled``
+        '''
+        if self.crypticle is not None:
+            data = self.crypticle.dumps(data)
+        entries = dict(
+            (key, entry)
+            for key, entry in six.iteritems(self._load_entries(minion_id))
+            if self._valid(entry, minion_id)
+        )
+        entries[fingerprint] = {'time': compiled, 'data': data}
+        self._save_entries(minion_id, entries)
+
+    def compile_pillar(self, grains, minion_id, saltenv, ext=None,
+                       functions=None, pillar=None, pillarenv=None,
+                       pillar_dirs=None):
+        '''
+        Return the pillar of the minion from the cache, compiling and caching
+        it when there is no valid entry
+        '''
+        fingerprint = self.fingerprint(grains, saltenv, ext, pillar, pillarenv)
+        data = self.fetch(minion_id, fingerprint)
+        if data is not None:
+            log.trace('Serving the pillar of {0} from the cache'.format(minion_id))
+            return data
+        # Take the time before compiling so that an invalidation during the
+        # compilation is not lost
+        compiled = time.time()
+        data = Pillar(
+            self.opts,
+            grains,
+            minion_id,
+            saltenv,
+            ext=ext,
+            functions=functions,
+            pillar=pillar,
+            pillarenv=pillarenv).compile_pillar(pillar_dirs=pillar_dirs)
+        if '_errors' not in data:
+            self.store(minion_id, fingerprint, compiled, data)
+        return data
+
+
 # TODO: actually migrate from Pillar to AsyncPillar to allow for futures in
 # ext_pillar etc.
 class AsyncPillar(Pillar):
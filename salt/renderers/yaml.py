@@ -13,7 +13,7 @@ from yaml.constructor import ConstructorError
 
 # Import salt libs
 import salt.utils.url
-from salt.utils.yamlloader import SaltYamlSafeLoader, load
+from salt.utils.yamlloader import SaltYamlFastLoader, load
 from salt.utils.odict import OrderedDict
 from salt.exceptions import SaltRenderError
 import salt.ext.six as six
@@ -24,16 +24,33 @@ log = logging.getLogger(__name__)
 
 _ERROR_MAP = {
     ("found character '\\t' that cannot "
-     "start any token"): 'Illegal tab character'
+     "start any token"): 'Illegal tab character',
+    # libyaml does not name the character
+    'found character that cannot start any token': 'Illegal character'
 }
 
 
+def _error_type(exc, yaml_data):
+    '''
+    Return a readable description of a scanner error
+    '''
+    err_type = _ERROR_MAP.get(exc.problem, exc.problem)
+    if err_type == 'Illegal character':
+        mark = exc.problem_mark
+        try:
+            if yaml_data.splitlines()[mark.line][mark.column] == '\t':
+                err_type = 'Illegal tab character'
+        except (IndexError, AttributeError):
+            pass
+    return err_type
+
+
 def get_yaml_loader(argline):
     '''
     Return the ordered dict yaml loader
     '''
     def yaml_loader(*args):
-        return SaltYamlSafeLoader(*args, dictclass=OrderedDict)
+        return SaltYamlFastLoader(*args, dictclass=OrderedDict)
     return yaml_loader
 
 
@@ -50,9 +67,12 @@ def render(yaml_data, saltenv='base', sls='', argline='', **kws):
         try:
             data = load(yaml_data, Loader=get_yaml_loader(argline))
         except ScannerError as exc:
-            err_type = _ERROR_MAP.get(exc.problem, exc.problem)
+            err_type = _error_type(exc, yaml_data)
             line_num = exc.problem_mark.line + 1
-            raise SaltRenderError(err_type, line_num, exc.problem_mark.buffer)
+            # Marks from libyaml do not carry the buffer
+            raise SaltRenderError(err_type,
+                                  line_num,
+                                  exc.problem_mark.buffer or yaml_data)
         except ConstructorError as exc:
             raise SaltRenderError(exc)
         if len(warn_list) > 0:
@@ -182,6 +182,14 @@ def returner(load):
         )
 
 
+def returner_batch(loads):
+    '''
+    Return a batch of returns to the local job cache
+    '''
+    for load in loads:
+        returner(load)
+
+
 def save_load(jid, clear_load):
     '''
     Save the load to the specified jid
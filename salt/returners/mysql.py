@@ -262,6 +262,28 @@ def returner(ret):
         log.critical('Could not store return with MySQL returner. MySQL server unavailable.')
 
 
+def returner_batch(rets):
+    '''
+    Return a batch of returns to a mysql server in a single transaction
+    '''
+    if not rets:
+        return
+    try:
+        with _get_serv(rets[0], commit=True) as cur:
+            sql = '''INSERT INTO `salt_returns`
+                    (`fun`, `jid`, `return`, `id`, `success`, `full_ret` )
+                    VALUES (%s, %s, %s, %s, %s, %s)'''
+
+            cur.executemany(sql, [(ret['fun'], ret['jid'],
+                                   json.dumps(ret['return']),
+                                   ret['id'],
+                                   ret.get('success', False),
+                                   json.dumps(ret)) for ret in rets])
+    except salt.exceptions.SaltMasterError as exc:
+        log.critical(exc)
+        log.critical('Could not store returns with MySQL returner. MySQL server unavailable.')
+
+
 def event_return(events):
     '''
     Return event to mysql server
@@ -181,6 +181,29 @@ def returner(ret):
     _close_conn(conn)
 
 
+def returner_batch(rets):
+    '''
+    Return a batch of returns to a postgres server in a single transaction
+    '''
+    if not rets:
+        return
+    conn = _get_conn(rets[0])
+    cur = conn.cursor()
+    sql = '''INSERT INTO salt_returns
+            (fun, jid, return, id, success)
+            VALUES (%s, %s, %s, %s, %s)'''
+    cur.executemany(
+        sql, [(
+            ret['fun'],
+            ret['jid'],
+            json.dumps(ret['return']),
+            ret['id'],
+            ret['success']
+        ) for ret in rets]
+    )
+    _close_conn(conn)
+
+
 def save_load(jid, load):
     '''
     Save the load to the specified jid id
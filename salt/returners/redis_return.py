@@ -106,6 +106,22 @@ def returner(ret):
     pipe.execute()
 
 
+def returner_batch(rets):
+    '''
+    Return a batch of returns to a redis data store in a single pipeline
+    '''
+    if not rets:
+        return
+    serv = _get_serv(rets[0])
+    pipe = serv.pipeline()
+    for ret in rets:
+        pipe.set('{0}:{1}'.format(ret['id'], ret['jid']), json.dumps(ret))
+        pipe.lpush('{0}:{1}'.format(ret['id'], ret['fun']), ret['jid'])
+        pipe.sadd('minions', ret['id'])
+        pipe.sadd('jids', ret['jid'])
+    pipe.execute()
+
+
 def save_load(jid, load):
     '''
     Save the load to the specified jid
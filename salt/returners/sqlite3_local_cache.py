@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+'''
+Use a single SQLite database file for the master job cache.
+
+:maturity:      New
+:depends:       None
+:platform:      all
+
+The default ``local_cache`` job cache creates a directory per job id and a
+directory per returning minion, which means millions of inodes on a busy
+master and directory walks for every job listing. This job cache keeps the
+same data, serialized with the master's serializer, in one database file with
+the job id, minion id and job start time indexed. Job lookups are index
+lookups and ``clean_old_jobs`` expires old jobs with a single range delete.
+
+To enable this job cache set the following in the master config:
+
+.. code-block:: yaml
+
+    master_job_cache: sqlite3_local_cache
+
+The database is created on first use. It defaults to ``jobs.sqlite`` in the
+master cachedir and can be placed elsewhere, for example on a tmpfs:
+
+.. code-block:: yaml
+
+    master_job_cache.sqlite3.database: /var/cache/salt/master/jobs.sqlite
+    master_job_cache.sqlite3.timeout: 30.0
+
+.. versionadded:: Boron
+'''
+from __future__ import absolute_import
+
+# Import python libs
+import logging
+import os
+import time
+
+# Import salt libs
+import salt.payload
+import salt.utils
+import salt.utils.jid
+import salt.utils.minions
+import salt.exceptions
+
+# Better safe than sorry here. Even though sqlite3 is included in python
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
+
+log = logging.getLogger(__name__)
+
+# Define the module's virtual name
+__virtualname__ = 'sqlite3_local_cache'
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jids (
+         jid TEXT PRIMARY KEY,
+         started REAL NOT NULL,
+         nocache INTEGER NOT NULL DEFAULT 0,
+         fun TEXT,
+         load BLOB,
+         minions BLOB,
+         endtime TEXT
+       )''',
+    '''CREATE INDEX IF NOT EXISTS jids_started ON jids (started)''',
+    '''CREATE TABLE IF NOT EXISTS salt_returns (
+         jid TEXT NOT NULL,
+         id TEXT NOT NULL,
+         ret BLOB,
+         out BLOB,
+         PRIMARY KEY (jid, id)
+       )''',
+)
+
+# The connection is opened lazily and is not shared with forked children
+_CONN = {}
+
+
+def __virtual__():
+    if not HAS_SQLITE3:
+        return False
+    return __virtualname__
+
+
+def _get_conn():
+    '''
+    Return the sqlite3 connection for this process, creating the database
+    schema on first use
+    '''
+    pid = os.getpid()
+    if _CONN.get('pid') == pid:
+        return _CONN['conn']
+    database = __opts__.get(
+        'master_job_cache.sqlite3.database',
+        os.path.join(__opts__['cachedir'], 'jobs.sqlite'))
+    timeout = float(__opts__.get('master_job_cache.sqlite3.timeout', 30.0))
+    try:
+        conn = sqlite3.connect(database, timeout=timeout)
+        # Concurrent readers, one writer, no fsync per transaction
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+    except sqlite3.Error as exc:
+        raise salt.exceptions.SaltCacheError(
+            'Unable to open job cache database {0}: {1}'.format(database, exc)
+        )
+    _CONN.update({'pid': pid, 'conn': conn})
+    return conn
+
+
+def _serial():
+    '''
+    Return the serializer used for stored loads and returns
+    '''
+    return salt.payload.Serial(__opts__)
+
+
+def _dumps(data):
+    '''
+    Serialize data for a BLOB column
+    '''
+    return sqlite3.Binary(_serial().dumps(data))
+
+
+def _loads(data):
+    '''
+    Deserialize data from a BLOB column
+    '''
+    if data is None:
+        return None
+    return _serial().loads(bytes(data))
+
+
+def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
+    '''
+    Return a job id and record it in the job cache
+
+    This is the function responsible for making sure jids don't collide
+    (unless it is passed a jid).
+    '''
+    if recurse_count >= 5:
+        err = 'prep_jid could not store a jid after {0} tries.'.format(recurse_count)
+        log.error(err)
+        raise salt.exceptions.SaltCacheError(err)
+    if passed_jid is None:  # this can be a None or an empty string.
+        jid = salt.utils.jid.gen_jid()
+    else:
+        jid = passed_jid
+
+    conn = _get_conn()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT INTO jids (jid, started, nocache) VALUES (?, ?, ?)',
+                (jid, time.time(), int(bool(nocache)))
+            )
+    except sqlite3.IntegrityError:
+        # Someone else is using this jid
+        if passed_jid is None:
+            time.sleep(0.1)
+            return prep_jid(nocache=nocache, recurse_count=recurse_count+1)
+    return jid
+
+
+def returner(load):
+    '''
+    Return data to the job cache
+    '''
+    return _store_returns([load]).get(load['jid'], {}).get(load['id'])
+
+
+def returner_batch(loads):
+    '''
+    Return a batch of returns to the job cache in a single transaction
+    '''
+    _store_returns(loads)
+
+
+def _store_returns(loads):
+    '''
+    Insert returns into the job cache, returns a dict of the returns which
+    were rejected, as {jid: {minion_id: False}}
+    '''
+    for load in loads:
+        # if a minion is returning a standalone job, get a jobid
+        if load['jid'] == 'req':
+            load['jid'] = prep_jid(nocache=load.get('nocache', False))
+
+    rejected = {}
+    conn = _get_conn()
+    nocache = {}
+    with conn:
+        for load in loads:
+            jid = load['jid']
+            if jid not in nocache:
+                row = conn.execute(
+                    'SELECT nocache FROM jids WHERE jid = ?', (jid,)
+                ).fetchone()
+                nocache[jid] = row[0] if row is not None else None
+            if nocache[jid] is None:
+                log.error(
+                    'An inconsistency occurred, a job was received with a job '
+                    'id that is not present in the local cache: {jid}'.format(
+                        **load
+                    )
+                )
+                rejected.setdefault(jid, {})[load['id']] = False
+                continue
+            if nocache[jid]:
+                continue
+            try:
+                conn.execute(
+                    'INSERT INTO salt_returns (jid, id, ret, out) '
+                    'VALUES (?, ?, ?, ?)',
+                    (jid,
+                     load['id'],
+                     _dumps(load['return']),
+                     _dumps(load['out']) if 'out' in load else None)
+                )
+            except sqlite3.IntegrityError:
+                # Minion has already returned this jid and it should be dropped
+                log.error(
+                    'An extra return was detected from minion {0}, please '
+                    'verify the minion, this could be a replay attack'.format(
+                        load['id']
+                    )
+                )
+                rejected.setdefault(jid, {})[load['id']] = False
+    return rejected
+
+
+def save_load(jid, clear_load):
+    '''
+    Save the load to the specified jid
+    '''
+    minions = None
+    # if you have a tgt, save that for the UI etc
+    if 'tgt' in clear_load:
+        ckminions = salt.utils.minions.CkMinions(__opts__)
+        # Retrieve the minions list
+        minions = ckminions.check_minions(
+                clear_load['tgt'],
+                clear_load.get('tgt_type', 'glob')
+                )
+
+    conn = _get_conn()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO jids (jid, started) VALUES (?, ?)',
+                (jid, time.time())
+            )
+            conn.execute(
+                'UPDATE jids SET fun = ?, load = ?, minions = ? WHERE jid = ?',
+                (clear_load.get('fun'),
+                 _dumps(clear_load),
+                 _dumps(minions) if minions is not None else None,
+                 jid)
+            )
+    except sqlite3.Error as exc:
+        log.warning('Could not write job invocation cache: {0}'.format(exc))
+
+
+def get_load(jid):
+    '''
+    Return the load data that marks a specified jid
+    '''
+    row = _get_conn().execute(
+        'SELECT load, minions FROM jids WHERE jid = ?', (jid,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return {}
+    ret = _loads(row[0])
+    if row[1] is not None:
+        ret['Minions'] = _loads(row[1])
+    return ret
+
+
+def get_jid(jid):
+    '''
+    Return the information returned when the specified job id was executed
+    '''
+    ret = {}
+    for minion_id, ret_data, out in _get_conn().execute(
+            'SELECT id, ret, out FROM salt_returns WHERE jid = ?', (jid,)):
+        ret[minion_id] = {'return': _loads(ret_data)}
+        if out is not None:
+            ret[minion_id]['out'] = _loads(out)
+    return ret
+
+
+def get_jids():
+    '''
+    Return a dict mapping all job ids to job information
+    '''
+    ret = {}
+    for jid, load, endtime in _get_conn().execute(
+            'SELECT jid, load, endtime FROM jids WHERE load IS NOT NULL'):
+        ret[jid] = salt.utils.jid.format_jid_instance(jid, _loads(load))
+
+        if __opts__.get('job_cache_store_endtime') and endtime:
+            ret[jid]['EndTime'] = endtime
+
+    return ret
+
+
+def get_jids_filter(count, filter_find_job=True):
+    '''
+    Return a list of all jobs information filtered by the given criteria.
+    :param int count: show not more than the count of most recent jobs
+    :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
+    '''
+    sql = 'SELECT jid, load FROM jids WHERE load IS NOT NULL'
+    if filter_find_job:
+        sql += ' AND fun IS NOT \'saltutil.find_job\''
+    sql += ' ORDER BY jid DESC LIMIT ?'
+    rows = _get_conn().execute(sql, (count,)).fetchall()
+    return [salt.utils.jid.format_jid_instance_ext(jid, _loads(load))
+            for jid, load in reversed(rows)]
+
+
+def clean_old_jobs():
+    '''
+    Clean out the old jobs from the job cache
+    '''
+    if __opts__['keep_jobs'] == 0:
+        return
+    cutoff = time.time() - __opts__['keep_jobs'] * 3600.0
+    conn = _get_conn()
+    with conn:
+        conn.execute(
+            'DELETE FROM salt_returns WHERE jid IN '
+            '(SELECT jid FROM jids WHERE started < ?)', (cutoff,)
+        )
+        conn.execute('DELETE FROM jids WHERE started < ?', (cutoff,))
+
+
+def update_endtime(jid, time):
+    '''
+    Update (or store) the end time for a given job
+
+    Endtime is stored as a plain text string
+    '''
+    conn = _get_conn()
+    try:
+        with conn:
+            conn.execute('UPDATE jids SET endtime = ? WHERE jid = ?',
+                         (time, jid))
+    except sqlite3.Error as exc:
+        log.warning('Could not write job invocation cache: {0}'.format(exc))
+
+
+def get_endtime(jid):
+    '''
+    Retrieve the stored endtime for a given job
+
+    Returns False if no endtime is present
+    '''
+    row = _get_conn().execute(
+        'SELECT endtime FROM jids WHERE jid = ?', (jid,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return False
+    return row[0]
@@ -10,7 +10,9 @@ import logging
 import salt.log
 import salt.utils
 import salt.utils.master
+import salt.utils.minions
 import salt.payload
+import salt.pillar
 from salt.ext.six import string_types
 
 log = logging.getLogger(__name__)
@@ -176,6 +178,29 @@ def clear_pillar(tgt=None, expr_form='glob'):
     return _clear_cache(tgt, expr_form, clear_pillar_flag=True)
 
 
+def clear_pillar_cache(tgt=None, expr_form='glob'):
+    '''
+    Clear the compiled pillar data kept by the master when
+    :conf_master:`pillar_cache` is enabled, for the targeted minions or for
+    all minions when no target is passed. Their pillar is compiled again on
+    their next pillar refresh.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run cache.clear_pillar_cache
+        salt-run cache.clear_pillar_cache tgt='web*'
+    '''
+    if tgt is None:
+        return salt.pillar.pillar_cache_stamp(__opts__)
+    ckminions = salt.utils.minions.CkMinions(__opts__)
+    minion_ids = ckminions.check_minions(tgt, expr_form)
+    for minion_id in minion_ids:
+        salt.pillar.pillar_cache_stamp(__opts__, minion_id)
+    return minion_ids
+
+
 def clear_grains(tgt=None, expr_form='glob'):
     '''
     Clear the cached grains data of the targeted minions
@@ -17,11 +17,18 @@ from __future__ import absolute_import
 import os
 import sys
 import copy
+import json
 import site
+import errno
+import select
+import hashlib
+import tempfile
 import fnmatch
 import logging
 import datetime
 import traceback
+import multiprocessing
+import multiprocessing.connection
 import re
 
 # Import salt libs
@@ -29,9 +36,11 @@ import salt.utils
 import salt.loader
 import salt.minion
 import salt.pillar
+import salt.version
 import salt.fileclient
 import salt.utils.event
 import salt.utils.url
+import salt.utils.atomicfile
 import salt.syspaths as syspaths
 from salt.utils import immutabletypes
 from salt.template import compile_template, compile_template_str
@@ -81,6 +90,7 @@ STATE_RUNTIME_KEYWORDS = frozenset([
     'onlyif',
     'unless',
     'order',
+    'parallel',
     'prereq',
     'prereq_in',
     'prerequired',
@@ -107,6 +117,22 @@ STATE_RUNTIME_KEYWORDS = frozenset([
 
 STATE_INTERNAL_KEYWORDS = STATE_REQUISITE_KEYWORDS.union(STATE_REQUISITE_IN_KEYWORDS).union(STATE_RUNTIME_KEYWORDS)
 
+# Options which change the outcome of compiling the highstate, used to tell if
+# a compiled highstate can be reused
+COMPILE_CACHE_OPTS = frozenset([
+    'default_top',
+    'env_order',
+    'environment',
+    'failhard',
+    'file_roots',
+    'hash_type',
+    'renderer',
+    'state_auto_order',
+    'state_top',
+    'state_top_saltenv',
+    'top_file_merging_strategy',
+    ])
+
 VALID_PILLAR_ENC = ('gpg',)
 
 
@@ -196,6 +222,163 @@ def find_name(name, state, high):
     return ext_id
 
 
+def _find_name_index(high):
+    '''
+    Index the high data by (state, argument value) so that the lookups done by
+    find_name for every requisite do not scan all of the high data
+    '''
+    index = {}
+    for nid, body in six.iteritems(high):
+        if not isinstance(body, dict):
+            continue
+        for state, run in six.iteritems(body):
+            if not isinstance(run, list):
+                continue
+            for arg in run:
+                if not isinstance(arg, dict):
+                    continue
+                if len(arg) != 1:
+                    continue
+                try:
+                    # find_name returns the last matching id
+                    index[(state, arg[next(iter(arg))])] = nid
+                except TypeError:
+                    # Unhashable value, it can not be a name
+                    continue
+    return index
+
+
+def _normcase(value):
+    '''
+    Normalize a chunk value the same way fnmatch does
+    '''
+    if isinstance(value, six.string_types):
+        return os.path.normcase(value)
+    return value
+
+
+def _is_glob(value):
+    '''
+    Return True if a requisite value needs to be matched with fnmatch
+    '''
+    return isinstance(value, six.string_types) \
+        and any(char in value for char in '*?[')
+
+
+class RequisiteGraph(object):
+    '''
+    Index the chunks of a state run by ``__sls__``, ``state``, ``name`` and
+    ``__id__`` so that the chunks a requisite refers to are found without
+    scanning every chunk. Each requisite, glob or not, is resolved once and
+    remembered for the rest of the run, which makes requisite resolution
+    proportional to the number of requisites instead of the number of
+    requisites times the number of chunks.
+    '''
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sls = {}
+        self.states = {}
+        self.names = {}
+        # The chunk referenced by (state, name) or (state, __id__), as looked
+        # up by listen requisites
+        self.refs = {}
+        self.resolved = {}
+        for pos, chunk in enumerate(chunks):
+            if '__sls__' in chunk:
+                self.sls.setdefault(_normcase(chunk['__sls__']), []).append(pos)
+            self.states.setdefault(chunk['state'], []).append(pos)
+            keys = set([(chunk['state'], _normcase(chunk['name'])),
+                        (chunk['state'], _normcase(chunk['__id__']))])
+            for key in keys:
+                self.names.setdefault(key, []).append(pos)
+            self.refs[(chunk['state'], chunk['name'])] = chunk
+            self.refs[(chunk['state'], chunk['__id__'])] = chunk
+
+    def resolve(self, req):
+        '''
+        Return the chunks matched by a requisite, like ``{'file': '/etc/foo'}``
+        or ``{'sls': 'apache.*'}``, in the order they appear in the run
+        '''
+        req = trim_req(req)
+        req_key = next(iter(req))
+        req_val = req[req_key]
+        if req_val is None:
+            return []
+        try:
+            return self.resolved[(req_key, req_val)]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable requisite value, it can not match anything
+            return []
+        if req_key == 'sls':
+            # Allow requisite tracking of entire sls files
+            if _is_glob(req_val):
+                positions = []
+                for sls, sls_positions in six.iteritems(self.sls):
+                    if fnmatch.fnmatch(sls, req_val):
+                        positions.extend(sls_positions)
+                positions.sort()
+            else:
+                positions = self.sls.get(_normcase(req_val), [])
+        elif _is_glob(req_val):
+            positions = []
+            for pos in self.states.get(req_key, []):
+                chunk = self.chunks[pos]
+                if (fnmatch.fnmatch(chunk['name'], req_val) or
+                        fnmatch.fnmatch(chunk['__id__'], req_val)):
+                    positions.append(pos)
+        else:
+            positions = self.names.get((req_key, _normcase(req_val)), [])
+        matches = [self.chunks[pos] for pos in positions]
+        self.resolved[(req_key, req_val)] = matches
+        return matches
+
+
+def _salt_refs(data, ret):
+    '''
+    Add the salt:// file references found in the data to ret
+    '''
+    if isinstance(data, six.string_types):
+        if data.startswith('salt://'):
+            ret.add(data)
+    elif isinstance(data, list):
+        for comp in data:
+            _salt_refs(comp, ret)
+    elif isinstance(data, dict):
+        for key, val in six.iteritems(data):
+            _salt_refs(key, ret)
+            _salt_refs(val, ret)
+    return ret
+
+
+def lowstate_file_refs(chunks):
+    '''
+    Return the salt:// file references in the low chunks, keyed by saltenv.
+    The sources of file.recurse states are returned separately as they refer
+    to directories.
+    '''
+    refs = {}
+    dirs = {}
+    for chunk in chunks:
+        if not isinstance(chunk, dict):
+            continue
+        saltenv = chunk.get('__env__', 'base')
+        crefs = set()
+        for key, val in six.iteritems(chunk):
+            if not key.startswith('__'):
+                _salt_refs(val, crefs)
+        if chunk.get('state') == 'file' and chunk.get('fun') == 'recurse':
+            source = chunk.get('source')
+            if isinstance(source, six.string_types) and source in crefs:
+                crefs.remove(source)
+                dirs.setdefault(saltenv, set()).add(source)
+        for ref in crefs:
+            path, senv = salt.utils.url.split_env(ref)
+            refs.setdefault(senv or saltenv, set()).add(path)
+    return refs, dirs
+
+
 def format_log(ret):
     '''
     Format the state into a log message
@@ -629,6 +812,9 @@ class State(object):
         self.mod_init = set()
         self.pre = {}
         self.__run_num = 0
+        self.requisite_graph = None
+        # The states running in separate processes, by tag
+        self.parallel_procs = {}
         self.jid = jid
         self.instance_id = str(id(self))
         self.inject_globals = {}
@@ -1371,6 +1557,19 @@ class State(object):
                     ]))
         extend = {}
         errors = []
+        names = _find_name_index(high)
+
+        def _find_name(name, state):
+            '''
+            find_name, from the index of the high data
+            '''
+            if name in high:
+                return name
+            try:
+                return names.get((state, name), '')
+            except TypeError:
+                return find_name(name, state, high)
+
         for id_, body in six.iteritems(high):
             if not isinstance(body, dict):
                 continue
@@ -1467,7 +1666,7 @@ class State(object):
                                             )
                                 if key == 'prereq':
                                     # Add prerequired to prereqs
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = _find_name(name, _state)
                                     if not ext_id:
                                         continue
                                     if ext_id not in extend:
@@ -1481,7 +1680,7 @@ class State(object):
                                 if key == 'use_in':
                                     # Add the running states args to the
                                     # use_in states
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = _find_name(name, _state)
                                     if not ext_id:
                                         continue
                                     ext_args = state_args(ext_id, _state, high)
@@ -1507,7 +1706,7 @@ class State(object):
                                 if key == 'use':
                                     # Add the use state's args to the
                                     # running state
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = _find_name(name, _state)
                                     if not ext_id:
                                         continue
                                     loc_args = state_args(id_, state, high)
@@ -1706,21 +1905,165 @@ class State(object):
         log.info('Completed state [{0}] at time {1} duration_in_ms={2}'.format(low['name'], finish_time.time().isoformat(), duration))
         return ret
 
+    def _parallel(self, low):
+        '''
+        Check if the chunk should be run in a separate process
+        '''
+        if not low.get('parallel') or low.get('__prereq__'):
+            return False
+        # The State is not sent to the new process without fork
+        return not salt.utils.is_windows()
+
+    def _call_parallel_target(self, conn, low, chunks, running):
+        '''
+        Run the state in the separate process and send back the result
+        '''
+        # Connections cached by the execution modules, like the fileclient,
+        # can not be shared with the parent process
+        self.state_con.clear()
+        try:
+            ret = self.call(low, chunks, running)
+        except Exception:
+            ret = {'result': False,
+                   'name': low['name'],
+                   'changes': {},
+                   'comment': 'An exception occurred in this state: {0}'.format(
+                       traceback.format_exc())}
+        try:
+            conn.send(ret)
+        except Exception:
+            conn.send({'result': False,
+                       'name': low['name'],
+                       'changes': {},
+                       'comment': 'The state return could not be serialized',
+                       '__id__': low['__id__']})
+        conn.close()
+
+    def call_parallel(self, low, chunks, running):
+        '''
+        Start the state in a separate process and return a placeholder for its
+        result, which is replaced by reconcile_procs when it finishes. At most
+        ``state_parallelism`` states run at the same time.
+        '''
+        limit = max(1, self.opts.get('state_parallelism', 4))
+        while len(self.parallel_procs) >= limit:
+            self.reconcile_procs(running, block=True)
+        recv, send = multiprocessing.Pipe(False)
+        proc = multiprocessing.Process(
+            target=self._call_parallel_target,
+            args=(send, low, chunks, running))
+        proc.start()
+        send.close()
+        tag = _gen_tag(low)
+        self.parallel_procs[tag] = {'proc': proc,
+                                    'conn': recv,
+                                    'low': low,
+                                    'length': len(chunks),
+                                    'run_num': self.__run_num}
+        ret = {'result': None,
+               'name': low['name'],
+               'changes': {},
+               'comment': 'Started in a separate process',
+               '__run_num__': self.__run_num,
+               '__id__': low['__id__']}
+        self.__run_num += 1
+        return ret
+
+    def reconcile_procs(self, running, block=False):
+        '''
+        Put the results of the states which finished running in parallel in
+        the running dict. With ``block`` wait until at least one finished.
+        '''
+        done = 0
+        while self.parallel_procs:
+            for tag, pdata in list(self.parallel_procs.items()):
+                if not pdata['conn'].poll():
+                    continue
+                low = pdata['low']
+                try:
+                    ret = pdata['conn'].recv()
+                except EOFError:
+                    ret = {'result': False,
+                           'name': low['name'],
+                           'changes': {},
+                           'comment': 'The process running this state exited '
+                                      'without a result',
+                           '__id__': low['__id__']}
+                pdata['conn'].close()
+                pdata['proc'].join()
+                del self.parallel_procs[tag]
+                done += 1
+                ret['__run_num__'] = pdata['run_num']
+                # The module refresh happened in the other process
+                self.check_refresh(low, ret)
+                running[tag] = ret
+                self.event(ret, pdata['length'], fire_event=low.get('fire_event'))
+                if self.check_failhard(low, running):
+                    running['__FAILHARD__'] = True
+            if done or not block:
+                break
+            self._wait_conns([pdata['conn'] for pdata in
+                              six.itervalues(self.parallel_procs)])
+        return done
+
+    @staticmethod
+    def _wait_conns(conns):
+        '''
+        Block until one of the connections to the processes running states in
+        parallel can be read from
+        '''
+        if six.PY3:
+            multiprocessing.connection.wait(conns)
+            return
+        if salt.utils.is_windows():
+            # select does not work with pipes on Windows
+            conns[0].poll(0.1)
+            return
+        try:
+            select.select(conns, [], [])
+        except select.error as exc:
+            if exc.args[0] != errno.EINTR:
+                raise
+
+    def wait_procs(self, running, tags=None):
+        '''
+        Wait for the given tags, or all states running in parallel, to finish
+        '''
+        if tags is None:
+            tags = list(self.parallel_procs)
+        while any(tag in self.parallel_procs for tag in tags):
+            self.reconcile_procs(running, block=True)
+
+    def get_requisite_graph(self, chunks):
+        '''
+        Return the RequisiteGraph of the chunks being run, building it when
+        they are not the chunks it was built for
+        '''
+        if self.requisite_graph is None \
+                or self.requisite_graph.chunks is not chunks:
+            self.requisite_graph = RequisiteGraph(chunks)
+        return self.requisite_graph
+
     def call_chunks(self, chunks):
         '''
         Iterate over a list of chunks and call them, checking for requires.
         '''
+        # Index the requisites once for the whole run
+        self.requisite_graph = RequisiteGraph(chunks)
         running = {}
         for low in chunks:
+            self.reconcile_procs(running)
             if '__FAILHARD__' in running:
-                running.pop('__FAILHARD__')
-                return running
+                break
             tag = _gen_tag(low)
             if tag not in running:
                 running = self.call_chunk(low, running, chunks)
                 if self.check_failhard(low, running):
-                    return running
+                    break
             self.active = set()
+        # Collect the states still running in parallel
+        self.wait_procs(running)
+        running.pop('__FAILHARD__', None)
         return running
 
     def check_failhard(self, low, running):
@@ -1728,6 +2071,9 @@ class State(object):
         Check if the low data chunk should send a failhard signal
         '''
         tag = _gen_tag(low)
+        if tag in self.parallel_procs:
+            # Still running, checked again when it finishes
+            return False
         if (low.get('failhard', False) or self.opts['failhard']
                 and tag in running):
             return not running[tag]['result']
@@ -1768,29 +2114,14 @@ class State(object):
                 'onchanges': []}
         if pre:
             reqs['prerequired'] = []
+        graph = self.get_requisite_graph(chunks)
         for r_state in reqs:
             if r_state in low and low[r_state] is not None:
                 for req in low[r_state]:
-                    req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                found = True
-                                reqs[r_state].append(chunk)
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                found = True
-                                reqs[r_state].append(chunk)
+                    found = graph.resolve(req)
                     if not found:
                         return 'unmet', ()
+                    reqs[r_state].extend(found)
         fun_stats = set()
         for r_state, chunks in six.iteritems(reqs):
             if r_state == 'prereq':
@@ -1799,6 +2130,9 @@ class State(object):
                 run_dict = running
             for chunk in chunks:
                 tag = _gen_tag(chunk)
+                if tag in self.parallel_procs:
+                    # The requisite is running in parallel, wait for it
+                    self.wait_procs(running, [tag])
                 if tag not in run_dict:
                     fun_stats.add('unmet')
                     continue
@@ -1898,37 +2232,24 @@ class State(object):
         if status == 'unmet':
             lost = {}
             reqs = []
+            graph = self.get_requisite_graph(chunks)
             for requisite in requisites:
                 lost[requisite] = []
                 if requisite not in low:
                     continue
                 for req in low[requisite]:
                     req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                reqs.append(chunk)
-                                found = True
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                elif requisite == 'prerequired':
-                                    chunk['__prerequired__'] = True
-                                reqs.append(chunk)
-                                found = True
+                    found = graph.resolve(req)
                     if not found:
                         lost[requisite].append(req)
+                        continue
+                    sls_req = next(iter(req)) == 'sls'
+                    for chunk in found:
+                        if requisite == 'prereq':
+                            chunk['__prereq__'] = True
+                        elif requisite == 'prerequired' and not sls_req:
+                            chunk['__prerequired__'] = True
+                        reqs.append(chunk)
             if lost['require'] or lost['watch'] or lost['prereq'] or lost['onfail'] or lost['onchanges'] or lost.get('prerequired'):
                 comment = 'The following requisites were not found:\n'
                 for requisite, lreqs in six.iteritems(lost):
@@ -1992,6 +2313,8 @@ class State(object):
         elif status == 'met':
             if low.get('__prereq__'):
                 self.pre[tag] = self.call(low, chunks, running)
+            elif self._parallel(low):
+                running[tag] = self.call_parallel(low, chunks, running)
             else:
                 running[tag] = self.call(low, chunks, running)
         elif status == 'fail':
@@ -2068,9 +2391,11 @@ class State(object):
         else:
             if low.get('__prereq__'):
                 self.pre[tag] = self.call(low, chunks, running)
+            elif self._parallel(low):
+                running[tag] = self.call_parallel(low, chunks, running)
             else:
                 running[tag] = self.call(low, chunks, running)
-        if tag in running:
+        if tag in running and tag not in self.parallel_procs:
             self.event(running[tag], len(chunks), fire_event=low.get('fire_event'))
         return running
 
@@ -2079,10 +2404,8 @@ class State(object):
         Find all of the listen routines and call the associated mod_watch runs
         '''
         listeners = []
-        crefs = {}
+        crefs = self.get_requisite_graph(chunks).refs
         for chunk in chunks:
-            crefs[(chunk['state'], chunk['name'])] = chunk
-            crefs[(chunk['state'], chunk['__id__'])] = chunk
             if 'listen' in chunk:
                 listeners.append({(chunk['state'], chunk['name']): chunk['listen']})
             if 'listen_in' in chunk:
@@ -2136,9 +2459,10 @@ class State(object):
         running.update(errors)
         return running
 
-    def call_high(self, high):
+    def compile_high(self, high):
         '''
-        Process a high data call and ensure the defined states.
+        Reconcile, verify and compile high data, return the low chunks and a
+        list of errors
         '''
         errors = []
         # If there is extension data reconcile it
@@ -2146,15 +2470,62 @@ class State(object):
         errors += ext_errors
         errors += self.verify_high(high)
         if errors:
-            return errors
+            return [], errors
         high, req_in_errors = self.requisite_in(high)
         errors += req_in_errors
         high = self.apply_exclude(high)
         # Verify that the high data is structurally sound
         if errors:
-            return errors
+            return [], errors
         # Compile and verify the raw chunks
-        chunks = self.compile_high_data(high)
+        return self.compile_high_data(high), errors
+
+    def prefetch_file_hashes(self, chunks):
+        '''
+        Request the hashes of all of the files on the salt master referenced
+        by the chunks at once, instead of one request per file when the
+        states are run. Return the file client holding the hashes.
+        '''
+        if not self.opts.get('state_prefetch_hashes', True):
+            return None
+        refs, dirs = lowstate_file_refs(chunks)
+        if not refs and not dirs:
+            return None
+        # The file client used by the cp execution module, which the states
+        # fetch files through
+        context = getattr(self.functions, 'pack', {}).get('__context__')
+        if context is None:
+            return None
+        if 'cp.fileclient' not in context:
+            context['cp.fileclient'] = \
+                    salt.fileclient.get_file_client(self.opts)
+        client = context['cp.fileclient']
+        if not hasattr(client, 'prefetch_hashes'):
+            return None
+        try:
+            for saltenv, sources in six.iteritems(dirs):
+                for source in sources:
+                    prefix, senv = salt.utils.url.parse(source)
+                    senv = senv or saltenv
+                    prefix = prefix.rstrip('/') + '/'
+                    for fn_ in client.file_list(senv, prefix):
+                        refs.setdefault(senv, set()).add(
+                            salt.utils.url.create(fn_))
+            for saltenv, paths in six.iteritems(refs):
+                client.prefetch_hashes(sorted(paths), saltenv)
+        except Exception as exc:
+            log.debug('Unable to prefetch file hashes: {0}'.format(exc))
+        return client
+
+    def call_high(self, high, chunks=None):
+        '''
+        Process a high data call and ensure the defined states. Pass the
+        ``chunks`` compiled from the high data to skip compiling it again.
+        '''
+        if chunks is None:
+            chunks, errors = self.compile_high(high)
+            if errors:
+                return errors
 
         # Check for any disabled states
         disabled = {}
@@ -2181,12 +2552,13 @@ class State(object):
                         chunks.remove(low)
                         break
 
-        # If there are extensions in the highstate, process them and update
-        # the low data chunks
-        if errors:
-            return errors
-        ret = dict(list(disabled.items()) + list(self.call_chunks(chunks).items()))
-        ret = self.call_listen(chunks, ret)
+        client = self.prefetch_file_hashes(chunks)
+        try:
+            ret = dict(list(disabled.items()) + list(self.call_chunks(chunks).items()))
+            ret = self.call_listen(chunks, ret)
+        finally:
+            if client is not None:
+                client.clear_prefetched_hashes()
 
         def _cleanup_accumulator_data():
             accum_data_path = os.path.join(
@@ -3096,10 +3468,96 @@ class BaseHighState(object):
                     ret_matches[env].append(sls)
         return ret_matches
 
+    def _compile_cache_fingerprint(self, exclude, whitelist):
+        '''
+        Return a fingerprint of everything besides the fetched files that the
+        compiled highstate depends on, including the master_tops data which
+        the top file is merged with
+        '''
+        if isinstance(exclude, str):
+            exclude = exclude.split(',')
+        opts = dict((key, val) for key, val in six.iteritems(self.opts)
+                    if key in COMPILE_CACHE_OPTS or key.startswith('jinja_'))
+        data = [salt.version.__version__,
+                opts,
+                self.avail,
+                self.state.opts['grains'],
+                self.state.opts['pillar'],
+                exclude,
+                whitelist,
+                self.client.ext_nodes()]
+        return hashlib.sha256(
+            json.dumps(data, sort_keys=True, default=repr).encode('utf-8')
+        ).hexdigest()
+
+    def _read_compile_cache(self, cfn):
+        '''
+        Load the compiled highstate cache file, return None if it is missing
+        or unreadable
+        '''
+        if not os.path.isfile(cfn):
+            return None
+        try:
+            with salt.utils.fopen(cfn, 'rb') as fp_:
+                cache = self.serial.load(fp_)
+        except Exception as exc:
+            log.debug('Unable to load the compiled highstate cache {0}: '
+                      '{1}'.format(cfn, exc))
+            return None
+        if not isinstance(cache, dict) or 'fingerprint' not in cache:
+            return None
+        return cache
+
+    def _compile_cache_valid(self, cache, fingerprint):
+        '''
+        Check that the cached compiled highstate matches the fingerprint and
+        that none of the files it was compiled from have changed
+        '''
+        if cache['fingerprint'] != fingerprint:
+            log.debug('Grains, pillar, master_tops or options changed, '
+                      'recompiling the highstate')
+            return False
+        for path, saltenv, hsum in cache['files']:
+            hash_server = self.client.hash_file(path, saltenv)
+            if not isinstance(hash_server, dict):
+                hash_server = {}
+            if hash_server.get('hsum', '') != hsum:
+                log.debug('{0} in saltenv \'{1}\' changed, recompiling the '
+                          'highstate'.format(path, saltenv))
+                return False
+        return True
+
+    def _write_compile_cache(self, cfn, cache):
+        '''
+        Atomically write the compiled highstate cache file
+        '''
+        try:
+            data = self.serial.dumps(cache)
+        except TypeError:
+            # Can't serialize pydsl
+            return
+        cumask = os.umask(0o77)
+        try:
+            tmpfh, tmpfname = tempfile.mkstemp(dir=self.opts['cachedir'])
+            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+                fp_.write(data)
+            os.close(tmpfh)
+            salt.utils.atomicfile.atomic_rename(tmpfname, cfn)
+        except (IOError, OSError):
+            msg = 'Unable to write to the compiled highstate cache file {0}'
+            log.error(msg.format(cfn))
+        finally:
+            os.umask(cumask)
+
     def call_highstate(self, exclude=None, cache=None, cache_name='highstate',
-                       force=False, whitelist=None):
+                       force=False, whitelist=None, compile_cache=None):
         '''
         Run the sequence to execute the salt highstate for this minion
+
+        When ``compile_cache`` is True, or it is None and the
+        ``state_compile_cache`` option is set, the compiled lowstate is reused
+        for as long as the files, grains and pillar it was compiled from do
+        not change
         '''
         # Check that top file exists
         tag_name = 'no_|-states_|-states_|-None'
@@ -3120,39 +3578,56 @@ class BaseHighState(object):
                 with salt.utils.fopen(cfn, 'rb') as fp_:
                     high = self.serial.load(fp_)
                     return self.state.call_high(high)
+        if compile_cache is None:
+            compile_cache = self.opts.get('state_compile_cache', False)
+        ccfn = os.path.join(
+                self.opts['cachedir'],
+                '{0}.compiled.p'.format(cache_name)
+        )
+        if compile_cache:
+            cached = self._read_compile_cache(ccfn)
+            if cached:
+                # Sync the dynamic modules first, custom grains may change
+                self.load_dynamic(cached['matches'])
+                if self._check_pillar(force) and self._compile_cache_valid(
+                        cached,
+                        self._compile_cache_fingerprint(exclude, whitelist)):
+                    log.debug('Running the highstate compiled in {0}'.format(ccfn))
+                    return self.state.call_high({}, cached['chunks'])
         # File exists so continue
         err = []
-        try:
-            top = self.get_top()
-        except SaltRenderError as err:
-            ret[tag_name]['comment'] = 'Unable to render top file: '
-            ret[tag_name]['comment'] += str(err.error)
-            return ret
-        except Exception:
-            trb = traceback.format_exc()
-            err.append(trb)
-            return err
-        err += self.verify_tops(top)
-        matches = self.top_matches(top)
-        if not matches:
-            msg = 'No Top file or external nodes data matches found.'
-            ret[tag_name]['comment'] = msg
-            return ret
-        matches = self.matches_whitelist(matches, whitelist)
-        self.load_dynamic(matches)
-        if not self._check_pillar(force):
-            err += ['Pillar failed to render with the following messages:']
-            err += self.state.opts['pillar']['_errors']
-        else:
-            high, errors = self.render_highstate(matches)
-            if exclude:
-                if isinstance(exclude, str):
-                    exclude = exclude.split(',')
-                if '__exclude__' in high:
-                    high['__exclude__'].extend(exclude)
-                else:
-                    high['__exclude__'] = exclude
-            err += errors
+        with salt.fileclient.FetchRecorder(record=compile_cache) as recorder:
+            try:
+                top = self.get_top()
+            except SaltRenderError as err:
+                ret[tag_name]['comment'] = 'Unable to render top file: '
+                ret[tag_name]['comment'] += str(err.error)
+                return ret
+            except Exception:
+                trb = traceback.format_exc()
+                err.append(trb)
+                return err
+            err += self.verify_tops(top)
+            matches = self.top_matches(top)
+            if not matches:
+                msg = 'No Top file or external nodes data matches found.'
+                ret[tag_name]['comment'] = msg
+                return ret
+            matches = self.matches_whitelist(matches, whitelist)
+            self.load_dynamic(matches)
+            if not self._check_pillar(force):
+                err += ['Pillar failed to render with the following messages:']
+                err += self.state.opts['pillar']['_errors']
+            else:
+                high, errors = self.render_highstate(matches)
+                if exclude:
+                    if isinstance(exclude, str):
+                        exclude = exclude.split(',')
+                    if '__exclude__' in high:
+                        high['__exclude__'].extend(exclude)
+                    else:
+                        high['__exclude__'] = exclude
+                err += errors
         if err:
             return err
         if not high:
@@ -3173,7 +3648,19 @@ class BaseHighState(object):
             log.error(msg.format(cfn))
 
         os.umask(cumask)
-        return self.state.call_high(high)
+        if not compile_cache:
+            return self.state.call_high(high)
+        chunks, errors = self.state.compile_high(high)
+        if errors:
+            return errors
+        self._write_compile_cache(
+            ccfn,
+            {'fingerprint': self._compile_cache_fingerprint(exclude, whitelist),
+             'files': [[path, saltenv, hsum] for (path, saltenv), hsum
+                       in six.iteritems(recorder.fetched)],
+             'matches': matches,
+             'chunks': chunks})
+        return self.state.call_high(high, chunks)
 
     def compile_highstate(self):
         '''
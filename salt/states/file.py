@@ -2185,7 +2185,7 @@ def recurse(name,
     # Check source path relative to fileserver root, make sure it is a
     # directory
     source_rel = source.partition('://')[2]
-    master_dirs = __salt__['cp.list_master_dirs'](__env__)
+    master_dirs = __salt__['cp.list_master_dirs'](__env__, source_rel)
     if source_rel not in master_dirs \
             and not any((x for x in master_dirs
                          if x.startswith(source_rel + '/'))):
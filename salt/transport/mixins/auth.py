@@ -84,7 +84,7 @@ class AESReqServerMixin(object):
 
         self.master_key = salt.crypt.MasterKeys(self.opts)
 
-    def _encrypt_private(self, ret, dictkey, target):
+    def _encrypt_private(self, ret, dictkey, target, compression=None):
         '''
         The server equivalent of ReqChannel.crypted_transfer_decode_dictentry
         '''
@@ -95,7 +95,8 @@ class AESReqServerMixin(object):
         key = salt.crypt.Crypticle.generate_key_string()
         pcrypt = salt.crypt.Crypticle(
             self.opts,
-            key)
+            key,
+            compression=compression)
         try:
             with salt.utils.fopen(pubfn) as f:
                 pub = RSA.importKey(f.read())
@@ -120,6 +121,16 @@ class AESReqServerMixin(object):
             return True
         return False
 
+    def _reply_compression(self, payload):
+        '''
+        Return the compression to use for the reply to a payload. Minions
+        which negotiated compression when signing in flag their requests.
+        '''
+        if payload.get('enc') != 'aes':
+            return None
+        return salt.crypt.negotiate_compression(self.opts,
+                                                payload.get('compression'))
+
     def _decode_payload(self, payload):
         # we need to decrypt it
         if payload['enc'] == 'aes':
@@ -403,6 +414,14 @@ class AESReqServerMixin(object):
         ret = {'enc': 'pub',
                'pub_key': self.master_key.get_pub_str(),
                'publish_port': self.opts['publish_port']}
+        compression = salt.crypt.negotiate_compression(
+            self.opts, load.get('compression'))
+        if compression:
+            ret['compression'] = compression
+        if self.opts.get('zmq_filtering'):
+            # Publications are prefixed with topics, minions which filter
+            # on topics only need to subscribe to their own
+            ret['zmq_filtering'] = True
 
         # sign the masters pubkey (if enabled) before it is
         # send to the minion that was just authenticated
@@ -23,6 +23,7 @@ import salt.utils
 import salt.utils.verify
 import salt.utils.event
 import salt.utils.async
+import salt.utils.minions
 import salt.payload
 import salt.exceptions
 import salt.transport.frame
@@ -120,10 +121,14 @@ class AsyncTCPReqChannel(salt.transport.client.ReqChannel):
         self.message_client.destroy()
 
     def _package_load(self, load):
-        return {
+        ret = {
             'enc': self.crypt,
             'load': load,
         }
+        if self.crypt != 'clear' and self.auth.crypticle.compression:
+            # Let the master know that the reply can be compressed
+            ret['compression'] = self.auth.crypticle.compression
+        return ret
 
     @tornado.gen.coroutine
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
@@ -205,9 +210,12 @@ class AsyncTCPPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.tran
             self.auth = salt.crypt.AsyncAuth(self.opts)
             if not self.auth.authenticated:
                 yield self.auth.authenticate()
+            # Identify ourselves so that the master can deliver publications
+            # only to the minions they target
             self.message_client = SaltMessageClient(self.opts['master_ip'],
                                                     int(self.auth.creds['publish_port']),
-                                                    io_loop=self.io_loop)
+                                                    io_loop=self.io_loop,
+                                                    connect_message={'id': self.opts['id']})
             yield self.message_client.connect()  # wait for the client to be connected
             self.connected = True
         # TODO: better exception handling...
@@ -312,14 +320,17 @@ class TCPReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.tra
             raise tornado.gen.Return()
 
         req_fun = req_opts.get('fun', 'send')
+        compression = self._reply_compression(payload)
         if req_fun == 'send_clear':
             stream.write(salt.transport.frame.frame_msg(ret, header=header))
         elif req_fun == 'send':
-            stream.write(salt.transport.frame.frame_msg(self.crypticle.dumps(ret), header=header))
+            stream.write(salt.transport.frame.frame_msg(
+                self.crypticle.dumps(ret, compression=compression), header=header))
         elif req_fun == 'send_private':
             stream.write(salt.transport.frame.frame_msg(self._encrypt_private(ret,
                                                          req_opts['key'],
                                                          req_opts['tgt'],
+                                                         compression=compression,
                                                          ), header=header))
         else:
             log.error('Unknown req_fun {0}'.format(req_fun))
@@ -381,9 +392,11 @@ class SaltMessageClient(object):
     '''
     Low-level message sending client
     '''
-    def __init__(self, host, port, io_loop=None, resolver=None):
+    def __init__(self, host, port, io_loop=None, resolver=None, connect_message=None):
         self.host = host
         self.port = port
+        # sent to the server every time the connection is (re)established
+        self.connect_message = connect_message
 
         self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
 
@@ -451,6 +464,9 @@ class SaltMessageClient(object):
                 break
             try:
                 self._stream = yield self._tcp_client.connect(self.host, self.port)
+                if self.connect_message is not None:
+                    yield self._stream.write(
+                        salt.transport.frame.frame_msg(self.connect_message))
                 self._connecting_future.set_result(True)
                 break
             except Exception as e:
@@ -577,38 +593,98 @@ class SaltMessageClient(object):
         return future
 
 
+class Subscriber(object):
+    '''
+    Client object for use with the TCP publisher server
+    '''
+    def __init__(self, stream, address):
+        self.stream = stream
+        self.address = address
+        # the minion id, once the minion has identified itself
+        self.id_ = None
+
+
 class PubServer(tornado.tcpserver.TCPServer, object):
     '''
     TCP publisher
     '''
     def __init__(self, *args, **kwargs):
         super(PubServer, self).__init__(*args, **kwargs)
-        self.clients = []
+        self.clients = set()
+        # minion id -> set of Subscribers, for targeted publications
+        self.present = {}
 
     def handle_stream(self, stream, address):
         log.trace('Subscriber at {0} connected'.format(address))
-        self.clients.append((stream, address))
+        client = Subscriber(stream, address)
+        self.clients.add(client)
+        self.io_loop.spawn_callback(self._stream_read, client)
+
+    @tornado.gen.coroutine
+    def _stream_read(self, client):
+        '''
+        Read the identification messages sent by a subscriber
+        '''
+        while True:
+            try:
+                framed_msg_len = yield client.stream.read_until(' ')
+                framed_msg_raw = yield client.stream.read_bytes(int(framed_msg_len.strip()))
+                body = msgpack.loads(msgpack.loads(framed_msg_raw)['body'])
+                if isinstance(body, dict) and body.get('id'):
+                    self._identify(client, body['id'])
+            except tornado.iostream.StreamClosedError:
+                self._remove_client(client)
+                break
+            except Exception:
+                log.error('Bad message from subscriber at {0}'.format(client.address),
+                          exc_info=True)
+                self._remove_client(client)
+                client.stream.close()
+                break
+
+    def _identify(self, client, id_):
+        if client.id_ is not None:
+            self.present.get(client.id_, set()).discard(client)
+        client.id_ = id_
+        self.present.setdefault(id_, set()).add(client)
+
+    def _remove_client(self, client):
+        if client not in self.clients:
+            return
+        log.debug('Subscriber at {0} has disconnected from publisher'.format(client.address))
+        self.clients.discard(client)
+        if client.id_ is not None:
+            clients = self.present.get(client.id_, set())
+            clients.discard(client)
+            if not clients:
+                self.present.pop(client.id_, None)
 
     # TODO: ACK the publish through IPC
     @tornado.gen.coroutine
-    def publish_payload(self, payload, _):
-        log.debug('TCP PubServer sending payload: {0}'.format(payload))
-        payload = salt.transport.frame.frame_msg(payload['payload'], raw_body=True)
+    def publish_payload(self, package, _):
+        log.debug('TCP PubServer sending payload: {0}'.format(package))
+        payload = salt.transport.frame.frame_msg(package['payload'], raw_body=True)
+
+        if 'topic_lst' in package:
+            # Deliver to the targeted minions, and to any subscriber which
+            # has not identified itself
+            clients = set(client for client in self.clients if client.id_ is None)
+            for topic in package['topic_lst']:
+                clients.update(self.present.get(topic, ()))
+        else:
+            clients = list(self.clients)
 
         to_remove = []
-        for item in self.clients:
-            client, address = item
+        for client in clients:
             try:
                 # Write the packed str
-                f = client.write(payload)
+                f = client.stream.write(payload)
                 self.io_loop.add_future(f, lambda f: True)
             except tornado.iostream.StreamClosedError:
-                to_remove.append(item)
-        for item in to_remove:
-            client, address = item
-            log.debug('Subscriber at {0} has disconnected from publisher'.format(address))
-            client.close()
-            self.clients.remove(item)
+                to_remove.append(client)
+        for client in to_remove:
+            self._remove_client(client)
+            client.stream.close()
         log.trace('TCP PubServer finished publishing payload')
 
 
@@ -671,7 +747,14 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         payload = {'enc': 'aes'}
 
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
+        # Every minion receives the publication, so it is only compressed if
+        # all minions are known to support compression
+        compression = None
+        if self.opts.get('transport_compression_publish'):
+            compression = self.opts.get('transport_compression')
+        crypticle = salt.crypt.Crypticle(self.opts,
+                                         salt.master.SMaster.secrets['aes']['secret'].value,
+                                         compression=compression)
         payload['load'] = crypticle.dumps(load)
         if self.opts['sign_pub_messages']:
             master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
@@ -692,8 +775,12 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
 
         int_payload = {'payload': self.serial.dumps(payload)}
 
-        # add some targeting stuff for lists only (for now)
-        if load['tgt_type'] == 'list':
-            int_payload['topic_lst'] = load['tgt']
+        # Only deliver the publication to the targeted minions if the target
+        # can be resolved on the master
+        if self.opts['tcp_filtering']:
+            ckminions = salt.utils.minions.CkMinions(self.opts)
+            topic_lst = ckminions.publish_targets(load)
+            if topic_lst is not None:
+                int_payload['topic_lst'] = topic_lst
         # Send it over IPC!
         pub_sock.send(int_payload)
@@ -18,6 +18,7 @@ import salt.crypt
 import salt.utils
 import salt.utils.verify
 import salt.utils.event
+import salt.utils.minions
 import salt.payload
 import salt.transport.client
 import salt.transport.server
@@ -145,10 +146,14 @@ class AsyncZeroMQReqChannel(salt.transport.client.ReqChannel):
         return self.opts['master_uri']
 
     def _package_load(self, load):
-        return {
+        ret = {
             'enc': self.crypt,
             'load': load,
         }
+        if self.crypt != 'clear' and self.auth.crypticle.compression:
+            # Let the master know that the reply can be compressed
+            ret['compression'] = self.auth.crypticle.compression
+        return ret
 
     @tornado.gen.coroutine
     def crypted_transfer_decode_dictentry(self, load, dictkey=None, tries=3, timeout=60):
@@ -259,7 +264,6 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
         else:
             self._socket.setsockopt(zmq.SUBSCRIBE, '')
 
-        self._socket.setsockopt(zmq.SUBSCRIBE, '')
         self._socket.setsockopt(zmq.IDENTITY, self.opts['id'])
 
         # TODO: cleanup all the socket opts stuff
@@ -330,6 +334,10 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
         if not self.auth.authenticated:
             yield self.auth.authenticate()
         self.publish_port = self.auth.creds['publish_port']
+        if self.opts['zmq_filtering'] and not self.auth.creds.get('zmq_filtering'):
+            # The master does not prefix publications with topics, so
+            # subscribe to everything
+            self._socket.setsockopt(zmq.SUBSCRIBE, '')
         self._socket.connect(self.master_pub)
 
     @property
@@ -353,6 +361,11 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
             payload = self.serial.loads(messages[0])
         # 2 includes a header which says who should do it
         elif messages_len == 2:
+            if messages[0] not in ('broadcast', self.hexid):
+                # A master using zmq_filtering sends a copy of targeted
+                # publications for each minion, a minion subscribed to every
+                # topic only decodes its own copy
+                raise tornado.gen.Return(None)
             payload = self.serial.loads(messages[1])
         else:
             raise Exception(('Invalid number of messages ({0}) in zeromq pub'
@@ -383,7 +396,8 @@ class AsyncZeroMQPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.t
         @tornado.gen.coroutine
         def wrap_callback(messages):
             payload = yield self._decode_messages(messages)
-            callback(payload)
+            if payload is not None:
+                callback(payload)
         return self.stream.on_recv(wrap_callback)
 
 
@@ -464,7 +478,13 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.
         self.io_loop = io_loop
 
         self.context = zmq.Context(1)
-        self._socket = self.context.socket(zmq.REP)
+        # Requests may be answered out of order while offloaded commands run,
+        # which a REP socket does not allow
+        self._dealer = bool(self.opts.get('worker_offload_cmds'))
+        if self._dealer:
+            self._socket = self.context.socket(zmq.DEALER)
+        else:
+            self._socket = self.context.socket(zmq.REP)
         if self.opts.get('ipc_mode', '') == 'tcp':
             self.w_uri = 'tcp://127.0.0.1:{0}'.format(
                 self.opts.get('tcp_master_workers', 4515)
@@ -491,24 +511,30 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.
 
         :param dict payload: A payload to process
         '''
+        # Requests handed out by the router on a DEALER socket carry the
+        # envelope to route the reply with, REP sockets strip it for us
+        envelope = []
+        if self._dealer:
+            delim = payload.index('')
+            envelope, payload = payload[:delim + 1], payload[delim + 1:]
         try:
             payload = self.serial.loads(payload[0])
             payload = self._decode_payload(payload)
         except Exception as e:
             log.error('Bad load from minion')
-            stream.send(self.serial.dumps('bad load'))
+            stream.send_multipart(envelope + [self.serial.dumps('bad load')])
             raise tornado.gen.Return()
 
         # TODO helper functions to normalize payload?
         if not isinstance(payload, dict) or not isinstance(payload.get('load'), dict):
             log.error('payload and load must be a dict. Payload was: {0} and load was {1}'.format(payload, payload.get('load')))
-            stream.send(self.serial.dumps('payload and load must be a dict'))
+            stream.send_multipart(envelope + [self.serial.dumps('payload and load must be a dict')])
             raise tornado.gen.Return()
 
         # intercept the "_auth" commands, since the main daemon shouldn't know
         # anything about our key auth
         if payload['enc'] == 'clear' and payload.get('load', {}).get('cmd') == '_auth':
-            stream.send(self.serial.dumps(self._auth(payload['load'])))
+            stream.send_multipart(envelope + [self.serial.dumps(self._auth(payload['load']))])
             raise tornado.gen.Return()
 
         # TODO: test
@@ -518,24 +544,26 @@ class ZeroMQReqServerChannel(salt.transport.mixins.auth.AESReqServerMixin, salt.
             ret, req_opts = yield self.payload_handler(payload)
         except Exception as e:
             # always attempt to return an error to the minion
-            stream.send('Some exception handling minion payload')
+            stream.send_multipart(envelope + ['Some exception handling minion payload'])
             log.error('Some exception handling a payload from minion', exc_info=True)
             raise tornado.gen.Return()
 
         req_fun = req_opts.get('fun', 'send')
+        compression = self._reply_compression(payload)
         if req_fun == 'send_clear':
-            stream.send(self.serial.dumps(ret))
+            stream.send_multipart(envelope + [self.serial.dumps(ret)])
         elif req_fun == 'send':
-            stream.send(self.serial.dumps(self.crypticle.dumps(ret)))
+            stream.send_multipart(envelope + [self.serial.dumps(self.crypticle.dumps(ret, compression=compression))])
         elif req_fun == 'send_private':
-            stream.send(self.serial.dumps(self._encrypt_private(ret,
-                                                                req_opts['key'],
-                                                                req_opts['tgt'],
-                                                                )))
+            stream.send_multipart(envelope + [self.serial.dumps(self._encrypt_private(ret,
+                                                                                    req_opts['key'],
+                                                                                    req_opts['tgt'],
+                                                                                    compression=compression,
+                                                                                    ))])
         else:
             log.error('Unknown req_fun {0}'.format(req_fun))
             # always attempt to return an error to the minion
-            stream.send('Server-side exception handling payload')
+            stream.send_multipart(envelope + ['Server-side exception handling payload'])
         raise tornado.gen.Return()
 
 
@@ -655,7 +683,14 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         payload = {'enc': 'aes'}
 
-        crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
+        # Every minion receives the publication, so it is only compressed if
+        # all minions are known to support compression
+        compression = None
+        if self.opts.get('transport_compression_publish'):
+            compression = self.opts.get('transport_compression')
+        crypticle = salt.crypt.Crypticle(self.opts,
+                                         salt.master.SMaster.secrets['aes']['secret'].value,
+                                         compression=compression)
         payload['load'] = crypticle.dumps(load)
         if self.opts['sign_pub_messages']:
             master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
@@ -675,9 +710,13 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
         pub_sock.connect(pull_uri)
         int_payload = {'payload': self.serial.dumps(payload)}
 
-        # add some targeting stuff for lists only (for now)
-        if load['tgt_type'] == 'list':
-            int_payload['topic_lst'] = load['tgt']
+        # Only deliver the publication to the targeted minions if the target
+        # can be resolved on the master
+        if self.opts['zmq_filtering']:
+            ckminions = salt.utils.minions.CkMinions(self.opts)
+            topic_lst = ckminions.publish_targets(load)
+            if topic_lst is not None:
+                int_payload['topic_lst'] = topic_lst
 
         pub_sock.send(self.serial.dumps(int_payload))
 
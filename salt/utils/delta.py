@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+'''
+    salt.utils.delta
+    ~~~~~~~~~~~~~~~~
+
+    Block signatures and deltas used to only transfer the changed parts of a
+    file which the receiving side already has an older copy of.
+
+    Files are split into content defined blocks: a block ends at the first
+    newline found once it holds at least ``block_size`` bytes, or after
+    ``2 * block_size`` bytes if there is no newline. Lines inserted into or
+    removed from a file therefore only change the blocks around the edit
+    instead of shifting every block after it, while the splitting itself
+    stays in C (``str.find``) rather than needing a rolling checksum.
+
+    The receiver sends the digests of its blocks, the sender walks its copy
+    of the file and answers with a list of operations, either the index of a
+    block the receiver already has or a string of literal data.
+'''
+from __future__ import absolute_import
+
+# Import python libs
+import hashlib
+
+# Import 3rd-party libs
+import salt.ext.six as six
+
+# Files smaller than this are sent whole, a delta would not save anything
+MIN_SIZE = 65536
+MIN_BLOCK_SIZE = 2048
+MAX_BLOCK_SIZE = 1048576
+
+
+def block_size(size):
+    '''
+    Return the target block size for a file of ``size`` bytes, aiming for
+    about 2048 blocks
+    '''
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, size // 2048))
+
+
+def iter_blocks(fp_, bsize):
+    '''
+    Yield the blocks of an open file, starting at its current position
+    '''
+    limit = bsize * 2
+    buf = b''
+    while True:
+        if len(buf) < limit:
+            data = fp_.read(limit)
+            buf += data
+            if not buf:
+                return
+        end = buf.find(b'\n', bsize - 1, limit)
+        if end == -1:
+            end = min(len(buf), limit)
+        else:
+            end += 1
+        yield buf[:end]
+        buf = buf[end:]
+
+
+def digest(block, hash_type):
+    '''
+    Return the hex digest of a block
+    '''
+    return hashlib.new(hash_type, block).hexdigest()
+
+
+def signatures(fp_, bsize, hash_type):
+    '''
+    Return a list of ``(offset, length, digest)`` tuples for the blocks of an
+    open file
+    '''
+    ret = []
+    offset = 0
+    for block in iter_blocks(fp_, bsize):
+        ret.append((offset, len(block), digest(block, hash_type)))
+        offset += len(block)
+    return ret
+
+
+def diff(fp_, digests, bsize, hash_type, max_literal, max_scan):
+    '''
+    Walk an open file from its current position and return the list of
+    operations which rebuild it from the blocks matching ``digests``.
+
+    Integers in the returned list are indexes into ``digests``, strings are
+    literal data. Stops once ``max_literal`` bytes of literal data have been
+    collected or ``max_scan`` bytes of the file have been read, the position
+    reached is always a block boundary so the next call can resume from it.
+    '''
+    index = {}
+    for idx, block_digest in enumerate(digests):
+        index.setdefault(block_digest, idx)
+    ops = []
+    literal = []
+    literal_len = 0
+    scanned = 0
+    for block in iter_blocks(fp_, bsize):
+        scanned += len(block)
+        idx = index.get(digest(block, hash_type))
+        if idx is None:
+            literal.append(block)
+            literal_len += len(block)
+        else:
+            if literal:
+                ops.append(b''.join(literal))
+                literal = []
+            ops.append(idx)
+        if literal_len >= max_literal or scanned >= max_scan:
+            break
+    if literal:
+        ops.append(b''.join(literal))
+    return ops
+
+
+def patch(fp_, blocks, ops):
+    '''
+    Yield the data described by a list of operations returned by ``diff``,
+    ``fp_`` is the receiver's open copy of the file and ``blocks`` the list
+    returned by ``signatures`` for it
+    '''
+    for op in ops:
+        if isinstance(op, six.integer_types):
+            offset, length = blocks[op][:2]
+            fp_.seek(offset)
+            yield fp_.read(length)
+        else:
+            yield op
@@ -62,7 +62,7 @@ import hashlib
 import logging
 import datetime
 import multiprocessing
-from collections import MutableMapping
+from collections import MutableMapping, OrderedDict, deque
 
 # Import third party libs
 import salt.ext.six as six
@@ -167,6 +167,124 @@ def tagify(suffix='', prefix='', base=SALT):
     return TAGPARTER.join([part for part in parts if part])
 
 
+class SubscriptionIndex(object):
+    '''
+    The tags subscribed to, indexed so that the subscriptions matching an
+    event tag are found without trying each of them
+
+    The subscriptions with the ``startswith`` match type are kept in a trie
+    of their tags, and the ``fnmatch`` ones in the trie of the literal part
+    of their tags in front of the first wildcard. Walking the event tag down
+    the trie finds them. The subscriptions with other match types are tried
+    one by one.
+    '''
+    def __init__(self):
+        # nested dicts keyed by the characters of the tags, the subscriptions
+        # ending at a node are the list under the '' key
+        self.trie = {}
+        self.others = []
+        self.count = 0
+
+    @staticmethod
+    def _prefix(tag, match_type):
+        '''
+        Return the part of the tag every matching event tag starts with, or
+        None if the match type does not allow for one
+        '''
+        if match_type == 'startswith':
+            return tag
+        if match_type == 'fnmatch' and os.path.normcase('A') == 'A':
+            # where fnmatch ignores case the tags have no literal prefix
+            for pos, char in enumerate(tag):
+                if char in '*?[':
+                    return tag[:pos]
+            return tag
+        return None
+
+    def add(self, tag, match_type, match_func):
+        '''
+        Add a subscription. A subscription which is added twice has to be
+        removed twice.
+        '''
+        sub = (tag, match_type, match_func)
+        prefix = self._prefix(tag, match_type)
+        if prefix is None:
+            self.others.append(sub)
+        else:
+            node = self.trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node.setdefault('', []).append(sub)
+        self.count += 1
+
+    def remove(self, tag, match_type, match_func):
+        '''
+        Remove a subscription, raise ValueError if there is none
+        '''
+        sub = (tag, match_type, match_func)
+        prefix = self._prefix(tag, match_type)
+        if prefix is None:
+            self.others.remove(sub)
+        else:
+            path = [self.trie]
+            for char in prefix:
+                if char not in path[-1]:
+                    raise ValueError('{0} is not subscribed to'.format(tag))
+                path.append(path[-1][char])
+            if sub not in path[-1].get('', ()):
+                raise ValueError('{0} is not subscribed to'.format(tag))
+            path[-1][''].remove(sub)
+            if not path[-1]['']:
+                del path[-1]['']
+            # prune the branch which is left empty
+            for pos in range(len(prefix), 0, -1):
+                if path[pos]:
+                    break
+                del path[pos - 1][prefix[pos - 1]]
+        self.count -= 1
+
+    def __contains__(self, key):
+        '''
+        Whether there is a subscription to the (tag, match_type) key
+        '''
+        tag, match_type = key
+        prefix = self._prefix(tag, match_type)
+        if prefix is None:
+            subs = self.others
+        else:
+            node = self.trie
+            for char in prefix:
+                if char not in node:
+                    return False
+                node = node[char]
+            subs = node.get('', ())
+        return any(sub[:2] == key for sub in subs)
+
+    def __len__(self):
+        return self.count
+
+    def match(self, event_tag):
+        '''
+        Return the (tag, match_type) keys of the subscriptions matching the
+        event tag
+        '''
+        ret = []
+        node = self.trie
+        pos = 0
+        while True:
+            for tag, match_type, match_func in node.get('', ()):
+                if match_type == 'startswith' or match_func(event_tag, tag):
+                    ret.append((tag, match_type))
+            if pos == len(event_tag) or event_tag[pos] not in node:
+                break
+            node = node[event_tag[pos]]
+            pos += 1
+        for tag, match_type, match_func in self.others:
+            if match_func(event_tag, tag):
+                ret.append((tag, match_type))
+        return ret
+
+
 class SaltEvent(object):
     '''
     Warning! Use the get_event function or the code will not be
@@ -187,8 +305,12 @@ class SaltEvent(object):
         if salt.utils.is_windows() and not hasattr(opts, 'ipc_mode'):
             opts['ipc_mode'] = 'tcp'
         self.puburi, self.pulluri = self.__load_uri(sock_dir, node)
-        self.pending_tags = []
-        self.pending_events = []
+        self.subscriptions = SubscriptionIndex()
+        # The events received for the subscriptions, by the order they came
+        # in, and the numbers of the events matching each subscription
+        self.pending_events = OrderedDict()
+        self.pending_index = {}
+        self.pending_count = 0
         if not self.cpub:
             self.connect_pub()
         self.__load_cache_regex()
@@ -272,8 +394,9 @@ class SaltEvent(object):
         '''
         if tag is None:
             return
+        match_type = self._get_match_type(match_type)
         match_func = self._get_match_func(match_type)
-        self.pending_tags.append([tag, match_func])
+        self.subscriptions.add(tag, match_type, match_func)
 
     def unsubscribe(self, tag, match_type=None):
         '''
@@ -281,15 +404,18 @@ class SaltEvent(object):
         '''
         if tag is None:
             return
+        match_type = self._get_match_type(match_type)
         match_func = self._get_match_func(match_type)
 
-        self.pending_tags.remove([tag, match_func])
+        self.subscriptions.remove(tag, match_type, match_func)
+        if (tag, match_type) in self.subscriptions:
+            return
 
-        old_events = self.pending_events
-        self.pending_events = []
-        for evt in old_events:
-            if any(pmatch_func(evt['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
-                self.pending_events.append(evt)
+        # Drop the events nobody else subscribed to
+        for num in self.pending_index.pop((tag, match_type), ()):
+            evt = self.pending_events.get(num)
+            if evt is not None and not self.subscriptions.match(evt['tag']):
+                del self.pending_events[num]
 
     def connect_pub(self):
         '''
@@ -323,37 +449,58 @@ class SaltEvent(object):
         data = serial.loads(mdata)
         return mtag, data
 
-    def _get_match_func(self, match_type=None):
+    def _get_match_type(self, match_type=None):
         if match_type is None:
             match_type = self.opts.get('event_match_type', 'startswith')
+        return match_type
+
+    def _get_match_func(self, match_type=None):
+        match_type = self._get_match_type(match_type)
         return getattr(self, '_match_tag_{0}'.format(match_type), None)
 
-    def _check_pending(self, tag, match_func=None):
-        """Check the pending_events list for events that match the tag
+    def _add_pending(self, evt, subs):
+        '''
+        Keep an event for the subscriptions it matches
+        '''
+        num = self.pending_count
+        self.pending_count += 1
+        self.pending_events[num] = evt
+        for sub in subs:
+            nums = self.pending_index.setdefault(sub, deque())
+            # forget the events which were returned for other subscriptions
+            while nums and nums[0] not in self.pending_events:
+                nums.popleft()
+            nums.append(num)
+
+    def _check_pending(self, tag, match_type=None):
+        """Check the pending_events for an event that matches the tag
+
+        The events kept for a subscription to the tag are found through the
+        index of the subscriptions, other tags are matched against all of
+        the pending events.
 
         :param tag: The tag to search for
         :type tag: str
-        :param tags_regex: List of re expressions to search for also
-        :type tags_regex: list[re.compile()]
+        :param match_type: The match type to match the tag with
+        :type match_type: str
         :return:
         """
-        if match_func is None:
-            match_func = self._get_match_func()
-        old_events = self.pending_events
-        self.pending_events = []
-        ret = None
-        for evt in old_events:
+        match_type = self._get_match_type(match_type)
+        if (tag, match_type) in self.subscriptions:
+            nums = self.pending_index.get((tag, match_type), ())
+            while nums:
+                evt = self.pending_events.pop(nums.popleft(), None)
+                if evt is not None:
+                    log.trace('get_event() returning cached event = {0}'.format(evt))
+                    return evt
+            return None
+        match_func = self._get_match_func(match_type)
+        for num, evt in six.iteritems(self.pending_events):
             if match_func(evt['tag'], tag):
-                if ret is None:
-                    ret = evt
-                    log.trace('get_event() returning cached event = {0}'.format(ret))
-                else:
-                    self.pending_events.append(evt)
-            elif any(pmatch_func(evt['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
-                self.pending_events.append(evt)
-            else:
-                log.trace('get_event() discarding cached event that no longer has any subscriptions = {0}'.format(evt))
-        return ret
+                del self.pending_events[num]
+                log.trace('get_event() returning cached event = {0}'.format(evt))
+                return evt
+        return None
 
     @staticmethod
     def _match_tag_startswith(event_tag, search_tag):
@@ -418,7 +565,7 @@ class SaltEvent(object):
                 if socks.get(self.sub) != zmq.POLLIN:
                     continue
 
-                ret = self.get_event_block()
+                raw = self.sub.recv()
             except KeyboardInterrupt:
                 return {'tag': 'salt/event/exit', 'data': {}}
             except zmq.ZMQError as ex:
@@ -427,15 +574,20 @@ class SaltEvent(object):
                 else:
                     raise
 
-            if not match_func(ret['tag'], tag):
+            # Only decode the data of the events somebody waits for
+            mtag, sep, mdata = raw.partition(TAGEND)
+            if not match_func(mtag, tag):
                 # tag not match
-                if any(pmatch_func(ret['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
+                subs = self.subscriptions.match(mtag)
+                if subs:
+                    ret = {'data': self.serial.loads(mdata), 'tag': mtag}
                     log.trace('get_event() caching unwanted event = {0}'.format(ret))
-                    self.pending_events.append(ret)
+                    self._add_pending(ret, subs)
                 if wait:  # only update the wait timeout if we had one
                     wait = timeout_at - time.time()
                 continue
 
+            ret = {'data': self.serial.loads(mdata), 'tag': mtag}
             log.trace('get_event() received = {0}'.format(ret))
             return ret
         log.trace('_get_event() waited {0} seconds and received nothing'.format(wait * 1000))
@@ -505,9 +657,10 @@ class SaltEvent(object):
                 'The \'pending_tags\' keyword argument is deprecated and is simply ignored. '
                 'Please stop using it since it\'s support will be removed in {version}.'
             )
+        match_type = self._get_match_type(match_type)
         match_func = self._get_match_func(match_type)
 
-        ret = self._check_pending(tag, match_func)
+        ret = self._check_pending(tag, match_type)
         if ret is None:
             ret = self._get_event(wait, tag, match_func, no_block)
 
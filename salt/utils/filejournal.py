@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+Keep track of the directories and files below a set of roots without walking
+all of them every time the caller needs to know what changed.
+
+The journal takes a snapshot of the trees when it is created. Each call to
+:py:meth:`FileJournal.refresh` brings the snapshot up to date and returns the
+paths which were added, changed or removed since the previous refresh. When
+pyinotify is available only the directories inotify reported activity in are
+examined, otherwise the journal falls back to polling: every directory is
+stat'ed but only the ones whose mtime changed are listed again, and the files
+in the remaining directories are checked for a new mtime.
+'''
+from __future__ import absolute_import
+
+# Import python libs
+import os
+import stat
+import logging
+
+# Import third party libs
+try:
+    import pyinotify
+    HAS_PYINOTIFY = True
+    WATCH_MASK = (pyinotify.IN_CREATE | pyinotify.IN_DELETE |
+                  pyinotify.IN_MODIFY | pyinotify.IN_ATTRIB |
+                  pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO |
+                  pyinotify.IN_DELETE_SELF | pyinotify.IN_MOVE_SELF)
+except ImportError:
+    HAS_PYINOTIFY = False
+    WATCH_MASK = None
+
+log = logging.getLogger(__name__)
+
+
+class FileJournal(object):
+    '''
+    Snapshot of the directories and files below ``roots``
+
+    followlinks
+        Descend into symlinked directories, the same as the ``followlinks``
+        argument to ``os.walk``
+
+    use_inotify
+        Use inotify to find the directories which changed when pyinotify is
+        available. Directories reached through a symlink are always polled.
+    '''
+    def __init__(self, roots, followlinks=False, use_inotify=True):
+        self.roots = sorted(set(os.path.normpath(root) for root in roots))
+        self.followlinks = followlinks
+        # Maps each directory to a dict with its mtime, the names of its
+        # subdirectories, the mtimes of its files (None for a dangling
+        # symlink), the names of the files which are symlinks and whether the
+        # directory was reached through a symlink
+        self.tree = {}
+        self._wm = None
+        self._notifier = None
+        self._dirty = set()
+        self._overflow = False
+        if use_inotify and HAS_PYINOTIFY:
+            self._wm = pyinotify.WatchManager()
+            self._notifier = pyinotify.Notifier(self._wm, self._enqueue)
+        for root in self.roots:
+            self._scan(root)
+
+    @property
+    def inotify(self):
+        '''
+        True while changes are picked up with inotify
+        '''
+        return self._notifier is not None
+
+    def refresh(self):
+        '''
+        Bring the snapshot up to date and return the set of files and
+        directories which were added, changed or removed
+        '''
+        changed = set()
+        for root in self.roots:
+            if root not in self.tree and os.path.isdir(root):
+                changed.update(self._scan(root))
+        if self._notifier is None:
+            for dirpath in list(self.tree):
+                changed.update(self._refresh_dir(dirpath))
+            return changed
+        while self._notifier.check_events(0):
+            self._notifier.read_events()
+            self._notifier.process_events()
+        if self._overflow:
+            log.debug('The inotify queue overflowed, polling all directories')
+            self._overflow = False
+            self._dirty.clear()
+            for dirpath in list(self.tree):
+                changed.update(self._refresh_dir(dirpath, force=True))
+            return changed
+        dirty, self._dirty = self._dirty, set()
+        for dirpath in dirty:
+            changed.update(self._refresh_dir(dirpath, force=True))
+        for dirpath in [path for path, entry in self.tree.items()
+                        if entry['linked']]:
+            changed.update(self._refresh_dir(dirpath))
+        return changed
+
+    def walk(self, top):
+        '''
+        Walk the snapshot below ``top`` the way ``os.walk`` walks the disk,
+        yielding ``(dirpath, dirnames, filenames)`` tuples
+        '''
+        stack = [os.path.normpath(top)]
+        while stack:
+            dirpath = stack.pop()
+            entry = self.tree.get(dirpath)
+            if entry is None:
+                continue
+            yield dirpath, list(entry['dirs']), sorted(entry['files'])
+            for name in reversed(entry['dirs']):
+                stack.append(os.path.join(dirpath, name))
+
+    def islink(self, path):
+        '''
+        Return True if the file at ``path`` is a symlink
+        '''
+        dirpath, name = os.path.split(path)
+        entry = self.tree.get(dirpath)
+        return entry is not None and name in entry['links']
+
+    def mtime_map(self):
+        '''
+        Return a dict mapping the path of each file to its mtime
+        '''
+        ret = {}
+        for dirpath, entry in self.tree.items():
+            for name, mtime in entry['files'].items():
+                if mtime is not None:
+                    ret[os.path.join(dirpath, name)] = mtime
+        return ret
+
+    def close(self):
+        '''
+        Stop watching the trees, later refreshes fall back to polling
+        '''
+        if self._notifier is not None:
+            try:
+                self._notifier.stop()
+            except (OSError, IOError):
+                pass
+        self._notifier = None
+        self._wm = None
+
+    def _enqueue(self, event):
+        '''
+        Record the directory an inotify event happened in
+        '''
+        if event.mask & pyinotify.IN_Q_OVERFLOW:
+            self._overflow = True
+        elif event.path:
+            self._dirty.add(os.path.normpath(event.path))
+
+    def _watch(self, dirpath):
+        '''
+        Add an inotify watch for a directory, if the watch cannot be added
+        inotify is turned off and the journal polls from then on
+        '''
+        if self._wm is None:
+            return
+        wdd = self._wm.add_watch(dirpath, WATCH_MASK, quiet=True)
+        if wdd.get(dirpath, -1) < 0:
+            log.warning(
+                'Unable to watch {0} with inotify, falling back to polling '
+                'for changes. The fs.inotify.max_user_watches sysctl may need '
+                'to be raised.'.format(dirpath)
+            )
+            self.close()
+
+    def _list(self, dirpath):
+        '''
+        List a directory, return the sorted names of its subdirectories, a
+        dict of the mtimes of its files and the set of files which are
+        symlinks
+        '''
+        dirs = []
+        files = {}
+        links = set()
+        for name in os.listdir(dirpath):
+            path = os.path.join(dirpath, name)
+            try:
+                pstat = os.lstat(path)
+            except OSError:
+                continue
+            if stat.S_ISLNK(pstat.st_mode):
+                try:
+                    pstat = os.stat(path)
+                except OSError:
+                    # dangling symlink
+                    files[name] = None
+                    links.add(name)
+                    continue
+                if not stat.S_ISDIR(pstat.st_mode):
+                    links.add(name)
+            if stat.S_ISDIR(pstat.st_mode):
+                dirs.append(name)
+            else:
+                files[name] = pstat.st_mtime
+        return sorted(dirs), files, links
+
+    def _scan(self, top, linked=False):
+        '''
+        Add the tree below ``top`` to the snapshot, return the paths of the
+        directories and files which were found
+        '''
+        found = set()
+        stack = [(top, linked)]
+        while stack:
+            dirpath, linked = stack.pop()
+            if not linked:
+                self._watch(dirpath)
+            try:
+                mtime = os.stat(dirpath).st_mtime
+                dirs, files, links = self._list(dirpath)
+            except OSError:
+                continue
+            self.tree[dirpath] = {'mtime': mtime,
+                                  'dirs': dirs,
+                                  'files': files,
+                                  'links': links,
+                                  'linked': linked}
+            found.add(dirpath)
+            found.update(os.path.join(dirpath, name) for name in files)
+            for name in dirs:
+                path = os.path.join(dirpath, name)
+                is_link = os.path.islink(path)
+                if is_link and not self.followlinks:
+                    continue
+                stack.append((path, linked or is_link))
+        return found
+
+    def _drop(self, top):
+        '''
+        Remove the tree below ``top`` from the snapshot, return the paths of
+        the directories and files which were removed. The kernel drops the
+        inotify watches of deleted directories by itself, and events for a
+        directory which is no longer in the snapshot are ignored.
+        '''
+        removed = set()
+        prefix = os.path.join(top, '')
+        for dirpath in [path for path in self.tree
+                        if path == top or path.startswith(prefix)]:
+            entry = self.tree.pop(dirpath)
+            removed.add(dirpath)
+            removed.update(os.path.join(dirpath, name)
+                           for name in entry['files'])
+        return removed
+
+    def _refresh_dir(self, dirpath, force=False):
+        '''
+        Bring the snapshot of one directory up to date. The directory is only
+        listed again if its mtime changed or ``force`` is set, otherwise just
+        its files are checked for a new mtime.
+        '''
+        entry = self.tree.get(dirpath)
+        if entry is None:
+            return set()
+        try:
+            mtime = os.stat(dirpath).st_mtime
+        except OSError:
+            return self._drop(dirpath)
+        changed = set()
+        if not force and mtime == entry['mtime']:
+            for name, old_mtime in entry['files'].items():
+                path = os.path.join(dirpath, name)
+                try:
+                    new_mtime = os.path.getmtime(path)
+                except OSError:
+                    new_mtime = None
+                if new_mtime != old_mtime:
+                    entry['files'][name] = new_mtime
+                    changed.add(path)
+            return changed
+        try:
+            dirs, files, links = self._list(dirpath)
+        except OSError:
+            return self._drop(dirpath)
+        for name in set(entry['dirs']).difference(dirs):
+            path = os.path.join(dirpath, name)
+            changed.add(path)
+            changed.update(self._drop(path))
+        for name in set(dirs).difference(entry['dirs']):
+            path = os.path.join(dirpath, name)
+            changed.add(path)
+            is_link = os.path.islink(path)
+            if is_link and not self.followlinks:
+                continue
+            changed.update(self._scan(path, entry['linked'] or is_link))
+        for name in set(entry['files']).difference(files):
+            changed.add(os.path.join(dirpath, name))
+        for name, new_mtime in files.items():
+            if name not in entry['files'] \
+                    or entry['files'][name] != new_mtime:
+                changed.add(os.path.join(dirpath, name))
+        entry.update({'mtime': mtime,
+                      'dirs': dirs,
+                      'files': files,
+                      'links': links})
+        return changed
@@ -14,6 +14,7 @@ import re
 import shutil
 import stat
 import subprocess
+import tempfile
 from datetime import datetime
 
 VALID_PROVIDERS = ('gitpython', 'pygit2', 'dulwich')
@@ -52,7 +53,9 @@ _INVALID_REPO = (
 )
 
 # Import salt libs
+import salt.payload
 import salt.utils
+import salt.utils.atomicfile
 import salt.utils.url
 import salt.fileserver
 from salt.exceptions import FileserverConfigError
@@ -99,6 +102,10 @@ LIBGIT2_MINVER = '0.20.0'
 # instead of using distutils.version.LooseVersion
 DULWICH_MINVER = (0, 9, 4)
 
+# The tree indexes loaded by this process, keyed by the index directory of
+# the remote and the environment, see GitProvider.tree_index()
+_TREE_INDEXES = {}
+
 
 def failhard(role):
     '''
@@ -256,6 +263,8 @@ class GitProvider(object):
         self.cachedir = os.path.join(cache_root, self.cachedir_basename)
         if not os.path.isdir(self.cachedir):
             os.makedirs(self.cachedir)
+        self.tree_index_dir = os.path.join(
+            cache_root, 'tree_index', self.cachedir_basename)
 
         try:
             self.new = self.init_remote()
@@ -401,6 +410,163 @@ class GitProvider(object):
         '''
         raise NotImplementedError()
 
+    def get_tree_id(self, tree):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
+    def tree_entries(self, tree):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
+    def tree_index(self, tgt_env):
+        '''
+        Return the index of the tree for the target environment, or None if
+        the environment is not found in this remote.
+
+        The index maps the path of each file to the SHA1 of its blob (the blob
+        of the target for symlinks, None if the target cannot be resolved),
+        and holds the symlinks and the directories of the tree. It is built
+        the first time a tree is looked at and written to the cachedir, so
+        that the other processes and later requests load it instead of
+        traversing the tree again. Since the tree's SHA1 changes with any of
+        its contents the index is kept until the ref moves, and each process
+        keeps the last index of each environment in memory.
+        '''
+        tree = self.get_tree(tgt_env)
+        if not tree:
+            return None
+        tree_id = self.get_tree_id(tree)
+        key = (self.tree_index_dir, tgt_env)
+        index = _TREE_INDEXES.get(key)
+        if index is not None and index['tree'] == tree_id \
+                and index['root'] == self.root \
+                and index['mountpoint'] == self.mountpoint:
+            return index
+        index = self._read_tree_index(tree_id)
+        if index is None:
+            index = self._build_tree_index(tree, tree_id)
+            self._write_tree_index(index)
+        _TREE_INDEXES[key] = index
+        return index
+
+    def _tree_index_path(self, tree_id):
+        '''
+        Return the path to the cached index of a tree
+        '''
+        return os.path.join(self.tree_index_dir, '{0}.p'.format(tree_id))
+
+    def _read_tree_index(self, tree_id):
+        '''
+        Load the cached index of a tree, if there is one for the current root
+        and mountpoint
+        '''
+        serial = salt.payload.Serial(self.opts)
+        try:
+            with salt.utils.fopen(self._tree_index_path(tree_id), 'rb') as fp_:
+                index = serial.load(fp_)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(index, dict) \
+                or index.get('tree') != tree_id \
+                or index.get('root') != self.root \
+                or index.get('mountpoint') != self.mountpoint:
+            return None
+        return index
+
+    def _write_tree_index(self, index):
+        '''
+        Write the index of a tree to the cachedir
+        '''
+        try:
+            if not os.path.isdir(self.tree_index_dir):
+                os.makedirs(self.tree_index_dir)
+            serial = salt.payload.Serial(self.opts)
+            tmpfh, tmpfname = tempfile.mkstemp(dir=self.tree_index_dir)
+            os.close(tmpfh)
+            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+                serial.dump(index, fp_)
+            salt.utils.atomicfile.atomic_rename(
+                tmpfname, self._tree_index_path(index['tree']))
+        except (IOError, OSError) as exc:
+            log.error(
+                'Unable to write {0} tree index for remote \'{1}\': {2}'
+                .format(self.role, self.id, exc)
+            )
+
+    def _build_tree_index(self, tree, tree_id):
+        '''
+        Traverse the tree once and index its files, symlinks and directories
+        '''
+        blobs = {}
+        dirs = set()
+        for repo_path, blob_id, is_tree, link_tgt in self.tree_entries(tree):
+            if is_tree:
+                dirs.add(repo_path)
+            else:
+                blobs[repo_path] = (blob_id, link_tgt)
+
+        def _resolve(repo_path):
+            '''
+            Follow a symlink to the blob it points to, the same way
+            find_file() does
+            '''
+            for _ in range(SYMLINK_RECURSE_DEPTH):
+                blob_id, link_tgt = blobs.get(repo_path, (None, None))
+                if link_tgt is None:
+                    return blob_id
+                repo_path = os.path.normpath(
+                    os.path.join(os.path.dirname(repo_path), link_tgt)
+                )
+            return None
+
+        if self.root:
+            relpath = lambda path: os.path.relpath(path, self.root)
+        else:
+            relpath = lambda path: path
+        add_mountpoint = lambda path: os.path.join(self.mountpoint, path)
+        files = {}
+        symlinks = {}
+        for repo_path, (blob_id, link_tgt) in six.iteritems(blobs):
+            file_path = add_mountpoint(relpath(repo_path))
+            if link_tgt is not None:
+                symlinks[file_path] = link_tgt
+                blob_id = _resolve(repo_path)
+            files[file_path] = blob_id
+        dirs = set(add_mountpoint(relpath(x)) for x in dirs)
+        if self.mountpoint:
+            dirs.add(self.mountpoint)
+        log.debug(
+            'Indexed tree {0} of {1} remote \'{2}\' ({3} files)'
+            .format(tree_id, self.role, self.id, len(files))
+        )
+        return {'tree': tree_id,
+                'root': self.root,
+                'mountpoint': self.mountpoint,
+                'files': files,
+                'symlinks': symlinks,
+                'dirs': sorted(dirs)}
+
+    def prune_tree_indexes(self, keep):
+        '''
+        Remove the cached indexes of the trees which are not in keep
+        '''
+        try:
+            cached = os.listdir(self.tree_index_dir)
+        except OSError:
+            return
+        for fname in cached:
+            tree_id, ext = os.path.splitext(fname)
+            if ext != '.p' or tree_id in keep:
+                continue
+            try:
+                os.remove(os.path.join(self.tree_index_dir, fname))
+            except OSError:
+                pass
+
     def get_url(self):
         '''
         Examine self.id and assign self.url (and self.branch, for git_pillar)
@@ -660,6 +826,35 @@ class GitPython(GitProvider):
         except gitdb.exc.ODBError:
             return None
 
+    def get_tree_id(self, tree):
+        '''
+        Return the SHA1 of a git.Tree object
+        '''
+        return tree.hexsha
+
+    def tree_entries(self, tree):
+        '''
+        Traverse the tree below the root and yield a tuple of the path, the
+        SHA1, whether or not it is a tree and the symlink target (None if it is
+        not a symlink) for each entry
+        '''
+        if self.root:
+            try:
+                tree = tree / self.root
+            except KeyError:
+                return
+        for obj in tree.traverse():
+            if isinstance(obj, git.Tree):
+                yield obj.path, obj.hexsha, True, None
+            elif isinstance(obj, git.Blob):
+                link_tgt = None
+                if stat.S_ISLNK(obj.mode):
+                    stream = six.StringIO()
+                    obj.stream_data(stream)
+                    link_tgt = stream.getvalue()
+                    stream.close()
+                yield obj.path, obj.hexsha, False, link_tgt
+
     def write_file(self, blob, dest):
         '''
         Using the blob object, write the file to the destination path
@@ -1021,6 +1216,41 @@ class Pygit2(GitProvider):
             return commit.tree
         return None
 
+    def get_tree_id(self, tree):
+        '''
+        Return the SHA1 of a pygit2.Tree object
+        '''
+        return tree.hex
+
+    def tree_entries(self, tree):
+        '''
+        Traverse the tree below the root and yield a tuple of the path, the
+        SHA1, whether or not it is a tree and the symlink target (None if it is
+        not a symlink) for each entry
+        '''
+        def _traverse(tree, prefix):
+            for entry in iter(tree):
+                obj = self.repo[entry.oid]
+                repo_path = os.path.join(prefix, entry.name)
+                if isinstance(obj, pygit2.Blob):
+                    link_tgt = None
+                    if stat.S_ISLNK(entry.filemode):
+                        link_tgt = obj.data
+                    yield repo_path, obj.hex, False, link_tgt
+                elif isinstance(obj, pygit2.Tree):
+                    yield repo_path, obj.hex, True, None
+                    for item in _traverse(obj, repo_path):
+                        yield item
+
+        if self.root:
+            try:
+                tree = self.repo[tree[self.root].oid]
+            except KeyError:
+                return iter(())
+            if not isinstance(tree, pygit2.Tree):
+                return iter(())
+        return _traverse(tree, self.root)
+
     def verify_auth(self):
         '''
         Check the username and password/keypair info for validity. If valid,
@@ -1424,6 +1654,37 @@ class Dulwich(GitProvider):  # pylint: disable=abstract-method
             pass
         return None
 
+    def get_tree_id(self, tree):
+        '''
+        Return the SHA1 of a dulwich.objects.Tree object
+        '''
+        return tree.id
+
+    def tree_entries(self, tree):
+        '''
+        Traverse the tree below the root and yield a tuple of the path, the
+        SHA1, whether or not it is a tree and the symlink target (None if it is
+        not a symlink) for each entry
+        '''
+        def _traverse(tree, prefix):
+            for item in six.iteritems(tree):
+                obj = self.repo.get_object(item.sha)
+                repo_path = os.path.join(prefix, item.path)
+                if isinstance(obj, dulwich.objects.Blob):
+                    link_tgt = None
+                    if stat.S_ISLNK(item.mode):
+                        link_tgt = obj.as_raw_string()
+                    yield repo_path, obj.id, False, link_tgt
+                elif isinstance(obj, dulwich.objects.Tree):
+                    yield repo_path, obj.id, True, None
+                    for entry in _traverse(obj, repo_path):
+                        yield entry
+
+        tree = self.walk_tree(tree, self.root)
+        if not isinstance(tree, dulwich.objects.Tree):
+            return iter(())
+        return _traverse(tree, self.root)
+
     def init_remote(self):
         '''
         Initialize/attach to a remote using dulwich. Return a boolean which
@@ -1609,7 +1870,7 @@ class GitBase(object):
                 pass
         to_remove = []
         for item in cachedir_ls:
-            if item in ('hash', 'refs'):
+            if item in ('hash', 'refs', 'tree_index'):
                 continue
             path = os.path.join(self.cache_root, item)
             if os.path.isdir(path):
@@ -2017,6 +2278,48 @@ class GitFS(GitBase):
     def __init__(self, opts):
         self.role = 'gitfs'
         GitBase.__init__(self, opts)
+        self.use_tree_index = self.opts.get('gitfs_tree_index', True)
+
+    def update(self):
+        '''
+        Fetch the remotes and index the trees of their environments, so that
+        the worker processes find the indexes in the cachedir
+        '''
+        GitBase.update(self)
+        if self.use_tree_index:
+            self.index_trees()
+
+    def index_trees(self):
+        '''
+        Build (or load) the tree index of each environment of each remote and
+        remove the indexes of trees which are no longer referenced
+        '''
+        index_root = os.path.join(self.cache_root, 'tree_index')
+        for repo in self.remotes:
+            keep = set()
+            for tgt_env in repo.envs():
+                try:
+                    index = repo.tree_index(tgt_env)
+                except Exception as exc:
+                    log.error(
+                        'Exception \'{0}\' caught while indexing {1} remote '
+                        '\'{2}\''.format(exc, self.role, repo.id),
+                        exc_info_on_loglevel=logging.DEBUG
+                    )
+                    continue
+                if index is not None:
+                    keep.add(index['tree'])
+            repo.prune_tree_indexes(keep)
+        # Remove the indexes of remotes which are no longer configured
+        try:
+            indexed = os.listdir(index_root)
+        except OSError:
+            indexed = []
+        active = set(repo.cachedir_basename for repo in self.remotes)
+        for item in indexed:
+            if item not in active:
+                shutil.rmtree(os.path.join(index_root, item),
+                              ignore_errors=True)
 
     def dir_list(self, load):
         '''
@@ -2081,6 +2384,22 @@ class GitFS(GitBase):
             if repo.mountpoint \
                     and not path.startswith(repo.mountpoint + os.path.sep):
                 continue
+            if self.use_tree_index:
+                index = repo.tree_index(tgt_env)
+                if index is None or path not in index['files']:
+                    continue
+                blob_hexsha = index['files'][path]
+                if blob_hexsha is not None:
+                    # Serve the cached copy if it holds the indexed blob,
+                    # without looking the blob up in the repo
+                    salt.fileserver.wait_lock(lk_fn, dest)
+                    if os.path.isfile(blobshadest) and os.path.isfile(dest):
+                        with salt.utils.fopen(blobshadest, 'r') as fp_:
+                            if fp_.read() == blob_hexsha:
+                                fnd['rel'] = path
+                                fnd['path'] = dest
+                                return fnd
+
             repo_path = path[len(repo.mountpoint):].lstrip(os.path.sep)
             if repo.root:
                 repo_path = os.path.join(repo.root, repo_path)
@@ -2149,7 +2468,7 @@ class GitFS(GitBase):
         gzip = load.get('gzip', None)
         with salt.utils.fopen(fnd['path'], 'rb') as fp_:
             fp_.seek(load['loc'])
-            data = fp_.read(self.opts['file_buffer_size'])
+            data = fp_.read(salt.fileserver.serve_chunk_size(self.opts, load))
             if gzip and data:
                 data = salt.utils.gzip_util.compress(data, gzip)
                 ret['gzip'] = gzip
@@ -2221,7 +2540,8 @@ class GitFS(GitBase):
         )
         cache_match, refresh_cache, save_cache = \
             salt.fileserver.check_file_list_cache(
-                self.opts, form, list_cache, w_lock
+                self.opts, form, list_cache, w_lock,
+                prefix=load.get('prefix', '').strip('/')
             )
         if cache_match is not None:
             return cache_match
@@ -2229,6 +2549,14 @@ class GitFS(GitBase):
             ret = {'files': set(), 'symlinks': {}, 'dirs': set()}
             if load['saltenv'] in self.envs():
                 for repo in self.remotes:
+                    if self.use_tree_index:
+                        index = repo.tree_index(load['saltenv'])
+                        if index is None:
+                            continue
+                        ret['files'].update(index['files'])
+                        ret['symlinks'].update(index['symlinks'])
+                        ret['dirs'].update(index['dirs'])
+                        continue
                     repo_files, repo_symlinks = repo.file_list(load['saltenv'])
                     ret['files'].update(repo_files)
                     ret['symlinks'].update(repo_symlinks)
@@ -5,15 +5,19 @@ Jinja loading utils to enable a more powerful backend for jinja templates
 
 # Import python libs
 from __future__ import absolute_import
+import os
 import json
 import pprint
 import logging
+import tempfile
+import threading
 from os import path
 from functools import wraps
 
 # Import third party libs
 import salt.ext.six as six
 from jinja2 import BaseLoader, Markup, TemplateNotFound, nodes
+from jinja2.bccache import Bucket, BytecodeCache
 from jinja2.environment import TemplateModule
 from jinja2.ext import Extension
 from jinja2.exceptions import TemplateRuntimeError
@@ -24,16 +28,21 @@ import yaml
 import salt
 import salt.utils
 import salt.utils.url
+import salt.utils.atomicfile
 import salt.fileclient
 from salt.utils.odict import OrderedDict
 
 log = logging.getLogger(__name__)
 
 __all__ = [
+    'SaltBytecodeCache',
     'SaltCacheLoader',
     'SerializerExtension'
 ]
 
+# The number of compiled templates kept in memory by SaltBytecodeCache
+BYTECODE_MEMORY_SIZE = 1000
+
 
 # To dump OrderedDict objects as regular dicts. Used by the yaml
 # template filter.
@@ -144,6 +153,116 @@ class SaltCacheLoader(BaseLoader):
         raise TemplateNotFound(template)
 
 
+class SaltBytecodeCache(BytecodeCache):
+    '''
+    A jinja bytecode cache which keeps compiled templates in memory for the
+    lifetime of the process and, if ``jinja_bytecode_cache`` is set, on disk
+    under the cachedir, so that templates whose source did not change are
+    not compiled again.
+    '''
+    # Shared by all of the caches in the process, bucket key to the checksum
+    # of the source and the compiled code
+    memory = OrderedDict()
+    # The OrderedDict of python 2 is not safe to update from several threads
+    memory_lock = threading.Lock()
+
+    def __init__(self, opts):
+        # The options which change the compiled code are part of the key
+        self.prefix = '{0}|{1}|{2}|'.format(
+            jinja2.__version__,
+            opts.get('jinja_trim_blocks', False),
+            opts.get('jinja_lstrip_blocks', False))
+        self.directory = None
+        if opts.get('jinja_bytecode_cache', False) and 'cachedir' in opts:
+            self.directory = path.join(opts['cachedir'], 'jinja')
+
+    def get_cache_key(self, name, filename=None):
+        name = self.prefix + name
+        if not isinstance(name, six.text_type):
+            name = name.decode('utf-8', 'replace')
+        return super(SaltBytecodeCache, self).get_cache_key(name, filename)
+
+    def _remember(self, bucket):
+        '''
+        Keep the compiled code of the bucket in memory
+        '''
+        with self.memory_lock:
+            self.memory.pop(bucket.key, None)
+            self.memory[bucket.key] = (bucket.checksum, bucket.code)
+            while len(self.memory) > BYTECODE_MEMORY_SIZE:
+                self.memory.popitem(last=False)
+
+    def _load(self, bucket, persist):
+        with self.memory_lock:
+            cached = self.memory.get(bucket.key)
+        if cached is not None and cached[0] == bucket.checksum:
+            bucket.code = cached[1]
+            return
+        if not persist or self.directory is None:
+            return
+        try:
+            with salt.utils.fopen(
+                    path.join(self.directory, bucket.key), 'rb') as fp_:
+                bucket.load_bytecode(fp_)
+        except (IOError, OSError):
+            return
+        if bucket.code is not None:
+            self._remember(bucket)
+
+    def _dump(self, bucket, persist):
+        self._remember(bucket)
+        if not persist or self.directory is None:
+            return
+        cumask = os.umask(0o77)
+        try:
+            if not path.isdir(self.directory):
+                os.makedirs(self.directory)
+            tmpfh, tmpfname = tempfile.mkstemp(dir=self.directory)
+            with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+                bucket.write_bytecode(fp_)
+            os.close(tmpfh)
+            salt.utils.atomicfile.atomic_rename(
+                tmpfname, path.join(self.directory, bucket.key))
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the jinja bytecode cache: {0}'.format(exc))
+        finally:
+            os.umask(cumask)
+
+    def load_bytecode(self, bucket):
+        self._load(bucket, True)
+
+    def dump_bytecode(self, bucket):
+        self._dump(bucket, True)
+
+    def clear(self):
+        with self.memory_lock:
+            self.memory.clear()
+        if self.directory is None or not path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def from_string(self, environment, source, tmplpath=None):
+        '''
+        Load a template from a string like ``environment.from_string``,
+        reusing the code compiled for the same source. Templates which are
+        not read from a file are only cached in memory.
+        '''
+        checksum = self.get_source_checksum(source)
+        bucket = Bucket(environment,
+                        self.get_cache_key(tmplpath or checksum),
+                        checksum)
+        self._load(bucket, tmplpath is not None)
+        if bucket.code is None:
+            bucket.code = environment.compile(source)
+            self._dump(bucket, tmplpath is not None)
+        return environment.template_class.from_code(
+            environment, bucket.code, environment.make_globals(None))
+
+
 class PrintableDict(OrderedDict):
     '''
     Ensures that dict str() and repr() are YAML friendly.
@@ -3,6 +3,10 @@
 # Import Python libs
 from __future__ import absolute_import
 import logging
+import time
+
+# Import third party libs
+import salt.ext.six as six
 
 # Import Salt libs
 import salt.minion
@@ -14,9 +18,13 @@ from salt.utils.event import tagify
 log = logging.getLogger(__name__)
 
 
-def store_job(opts, load, event=None, mminion=None):
+def store_job(opts, load, event=None, mminion=None, batch=None):
     '''
     Store job information using the configured master_job_cache
+
+    If a ``ReturnBatch`` is passed, the return is queued on it and written to
+    the job cache when the batch is flushed, rather than written right away.
+    The event for the return is always fired immediately.
     '''
     # Generate EndTime
     endtime = salt.utils.jid.jid_to_time(salt.utils.jid.gen_jid())
@@ -73,24 +81,56 @@ def store_job(opts, load, event=None, mminion=None):
         return
 
     # otherwise, write to the master cache
-    savefstr = '{0}.save_load'.format(job_cache)
-    getfstr = '{0}.get_load'.format(job_cache)
-    fstr = '{0}.returner'.format(job_cache)
     if 'fun' not in load and load.get('return', {}):
         ret_ = load.get('return', {})
         if 'fun' in ret_:
             load.update({'fun': ret_['fun']})
         if 'user' in ret_:
             load.update({'user': ret_['user']})
+    if batch is not None:
+        batch.add(load, endtime)
+        return
+    store_returns(opts, [(load, endtime)], mminion)
+
+
+def store_returns(opts, returns, mminion):
+    '''
+    Write a list of ``(load, endtime)`` returns to the configured
+    master_job_cache.
+
+    The job load is saved once per jid if the job cache does not have it yet.
+    If the returner provides a ``returner_batch`` function all of the returns
+    are handed to it in a single call, otherwise ``returner`` is called for
+    each of them.
+    '''
+    job_cache = opts['master_job_cache']
+    savefstr = '{0}.save_load'.format(job_cache)
+    getfstr = '{0}.get_load'.format(job_cache)
+    fstr = '{0}.returner'.format(job_cache)
+    batchfstr = '{0}.returner_batch'.format(job_cache)
+    updateetfstr = '{0}.update_endtime'.format(job_cache)
     try:
-        if 'jid' in load and 'get_load' in mminion.returners and not mminion.returners[getfstr](load.get('jid', '')):
-            mminion.returners[savefstr](load['jid'], load)
-        mminion.returners[fstr](load)
+        checked = set()
+        for load, _ in returns:
+            if load['jid'] in checked:
+                continue
+            checked.add(load['jid'])
+            if 'get_load' in mminion.returners and not mminion.returners[getfstr](load['jid']):
+                mminion.returners[savefstr](load['jid'], load)
+
+        if batchfstr in mminion.returners:
+            mminion.returners[batchfstr]([load for load, _ in returns])
+        else:
+            for load, _ in returns:
+                mminion.returners[fstr](load)
 
-        updateetfstr = '{0}.update_endtime'.format(job_cache)
         if (opts.get('job_cache_store_endtime')
                 and updateetfstr in mminion.returners):
-            mminion.returners[updateetfstr](load['jid'], endtime)
+            endtimes = {}
+            for load, endtime in returns:
+                endtimes[load['jid']] = endtime
+            for jid, endtime in six.iteritems(endtimes):
+                mminion.returners[updateetfstr](jid, endtime)
 
     except KeyError:
         emsg = "Returner '{0}' does not support function returner".format(job_cache)
@@ -98,6 +138,98 @@ def store_job(opts, load, event=None, mminion=None):
         raise KeyError(emsg)
 
 
+class ReturnBatch(object):
+    '''
+    Queue minion returns and write them to the master job cache in batches.
+
+    The queue is flushed when it holds ``return_batch_size`` returns, or once
+    the oldest return has waited ``return_batch_latency`` seconds. The age is
+    checked each time a return is queued and by ``flush_expired``, which a
+    worker without an IOLoop calls each time it polls for requests. When
+    ``io_loop`` is set a timeout on it flushes the queue as well. Queue depth
+    and flush timings are kept in ``stats``.
+    '''
+    def __init__(self, opts, mminion, io_loop=None):
+        self.opts = opts
+        self.mminion = mminion
+        self.io_loop = io_loop
+        self.size = opts['return_batch_size']
+        self.latency = opts['return_batch_latency']
+        self.queue = []
+        self._oldest = None
+        self.stats = {'queued': 0,
+                      'flushed': 0,
+                      'batches': 0,
+                      'failed': 0,
+                      'max_depth': 0,
+                      'flush_time': 0.0}
+        self._timeout = None
+        self._timeout_loop = None
+
+    def add(self, load, endtime):
+        '''
+        Queue a return, flushing the queue if it is full or its oldest return
+        has waited long enough
+        '''
+        now = time.time()
+        if not self.queue:
+            self._oldest = now
+        self.queue.append((load, endtime))
+        self.stats['queued'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], len(self.queue))
+        if len(self.queue) >= self.size or now - self._oldest >= self.latency:
+            self.flush()
+        elif self._timeout is None and self.io_loop is not None:
+            self._timeout_loop = self.io_loop
+            self._timeout = self.io_loop.call_later(self.latency, self.flush)
+
+    def flush_expired(self):
+        '''
+        Flush the queue if its oldest return has waited return_batch_latency
+        seconds
+        '''
+        if self.queue and time.time() - self._oldest >= self.latency:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write all of the queued returns to the job cache
+        '''
+        if self._timeout is not None:
+            self._timeout_loop.remove_timeout(self._timeout)
+            self._timeout = None
+        if not self.queue:
+            return
+        returns, self.queue = self.queue, []
+        start = time.time()
+        try:
+            store_returns(self.opts, returns, self.mminion)
+            self.stats['flushed'] += len(returns)
+        except Exception as exc:
+            self.stats['failed'] += len(returns)
+            log.error(
+                'Could not store {0} returns in the job cache: {1}'.format(
+                    len(returns), exc
+                ),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+        duration = time.time() - start
+        self.stats['batches'] += 1
+        self.stats['flush_time'] += duration
+        log.debug(
+            'Flushed {0} returns to the job cache in {1:.3f}s '
+            '(queued: {queued}, flushed: {flushed}, failed: {failed}, '
+            'max queue depth: {max_depth})'.format(
+                len(returns), duration, **self.stats
+            )
+        )
+        if duration > self.latency and self.latency:
+            log.warning(
+                'Writing {0} returns to the job cache took {1:.3f}s, longer '
+                'than return_batch_latency'.format(len(returns), duration)
+            )
+
+
 def get_retcode(ret):
     '''
     Determine a retcode for a given return
@@ -391,6 +391,9 @@ class MasterPillarUtil(object):
                     with salt.utils.fopen(tmpfname, 'w+b') as fp_:
                         fp_.write(self.serial.dumps({'pillar': minion_pillar}))
                     salt.utils.atomicfile.atomic_rename(tmpfname, data_file)
+                if clear_pillar or clear_grains:
+                    salt.utils.minions.note_minion_data_change(self.opts,
+                                                               minion_id)
                 if clear_mine:
                     # Delete the whole mine file
                     os.remove(os.path.join(mine_file))
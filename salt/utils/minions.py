@@ -9,11 +9,14 @@ from __future__ import absolute_import
 import os
 import fnmatch
 import re
+import time
 import logging
+import tempfile
 
 # Import salt libs
 import salt.payload
 import salt.utils
+import salt.utils.atomicfile
 from salt.defaults import DEFAULT_TARGET_DELIM
 from salt.exceptions import CommandExecutionError
 
@@ -100,6 +103,249 @@ def get_minion_data(minion, opts):
     return minion if minion else None, None, None
 
 
+# The minion data journal is rotated once it grows past this many bytes, which
+# forces every process holding a MinionDataIndex to rebuild it from disk
+JOURNAL_MAX_SIZE = 1048576
+
+# Per-process minion data indexes, keyed by master cachedir
+_DATA_INDEXES = {}
+
+
+def _journal_path(opts):
+    '''
+    Return the path to the minion data journal
+    '''
+    return os.path.join(opts['cachedir'], 'minion_data.journal')
+
+
+def note_minion_data_change(opts, minion_id):
+    '''
+    Record that the cached grains/pillar data for ``minion_id`` has been
+    written or removed, so that the minion data indexes held by the other
+    master processes reload the data for this minion
+    '''
+    if not opts.get('minion_data_cache', False):
+        return
+    journal = _journal_path(opts)
+    try:
+        with salt.utils.fopen(journal, 'ab') as fp_:
+            fp_.write(salt.utils.to_bytes('{0}\n'.format(minion_id)))
+            size = fp_.tell()
+        if size > JOURNAL_MAX_SIZE:
+            tmpfh, tmpfname = tempfile.mkstemp(dir=opts['cachedir'])
+            os.close(tmpfh)
+            salt.utils.atomicfile.atomic_rename(tmpfname, journal)
+    except (IOError, OSError) as exc:
+        log.error(
+            'Unable to update the minion data journal {0}: {1}'.format(
+                journal, exc
+            )
+        )
+
+
+def minion_data_index(opts):
+    '''
+    Return the MinionDataIndex for this process, creating it if needed.
+    Returns None if the minion data cache or its index are disabled.
+    '''
+    if not opts.get('minion_data_cache', False) \
+            or not opts.get('minion_data_index', True):
+        return None
+    cachedir = opts['cachedir']
+    if cachedir not in _DATA_INDEXES:
+        _DATA_INDEXES[cachedir] = MinionDataIndex(opts)
+    index = _DATA_INDEXES[cachedir]
+    index.refresh()
+    return index
+
+
+class MinionDataIndex(object):
+    '''
+    An in-memory copy of the grains and pillar data held in the master's
+    minion data cache, with inverted indexes on the top level grain and
+    pillar keys.
+
+    The index is loaded from disk once per process and is then kept current
+    by replaying the minion data journal, which lists the minions whose cache
+    has been written since the journal was created. A full reload happens
+    when the journal is rotated or after ``minion_data_index_ttl`` seconds.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.cdir = os.path.join(opts['cachedir'], 'minions')
+        self.journal = _journal_path(opts)
+        self.ttl = opts.get('minion_data_index_ttl', 3600)
+        self.data = {}
+        self._values = {'grains': {}, 'pillar': {}}
+        self._containers = {'grains': {}, 'pillar': {}}
+        self._journal_ino = None
+        self._journal_pos = 0
+        self._loaded = 0
+
+    def ids(self):
+        '''
+        Return the set of minion ids which have cached data
+        '''
+        return set(self.data)
+
+    def get(self, minion_id, search_type):
+        '''
+        Return the cached grains or pillar for a minion
+        '''
+        return self.data.get(minion_id, {}).get(search_type)
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the minion data journal
+        '''
+        try:
+            stat = os.stat(self.journal)
+            ino, size = stat.st_ino, stat.st_size
+        except OSError:
+            ino, size = None, 0
+        if not self._loaded \
+                or ino != self._journal_ino \
+                or size < self._journal_pos \
+                or time.time() - self._loaded > self.ttl:
+            self._journal_ino = ino
+            self._journal_pos = size
+            self.reload()
+            return
+        if size == self._journal_pos:
+            return
+        try:
+            with salt.utils.fopen(self.journal, 'rb') as fp_:
+                fp_.seek(self._journal_pos)
+                chunk = fp_.read(size - self._journal_pos)
+        except (IOError, OSError):
+            return
+        # Only consume complete lines, a writer may be mid-append
+        chunk = chunk[:chunk.rfind(b'\n') + 1]
+        self._journal_pos += len(chunk)
+        for minion_id in set(salt.utils.to_str(chunk).split()):
+            self._update(minion_id)
+
+    def reload(self):
+        '''
+        Rebuild the whole index from the minion data cache on disk
+        '''
+        self.data = {}
+        self._values = {'grains': {}, 'pillar': {}}
+        self._containers = {'grains': {}, 'pillar': {}}
+        self._loaded = time.time()
+        if not os.path.isdir(self.cdir):
+            return
+        for minion_id in os.listdir(self.cdir):
+            self._update(minion_id)
+
+    def _update(self, minion_id):
+        '''
+        Reload the cached data for a single minion
+        '''
+        self._discard(minion_id)
+        datap = os.path.join(self.cdir, minion_id, 'data.p')
+        try:
+            with salt.utils.fopen(datap, 'rb') as fp_:
+                data = self.serial.load(fp_)
+        except (IOError, OSError):
+            return
+        if not isinstance(data, dict):
+            return
+        self.data[minion_id] = data
+        for search_type in self._values:
+            if not isinstance(data.get(search_type), dict):
+                continue
+            for key, val in six.iteritems(data[search_type]):
+                value = self._scalar_key(val)
+                if value is None:
+                    self._containers[search_type].setdefault(
+                        key, set()).add(minion_id)
+                else:
+                    self._values[search_type].setdefault(
+                        key, {}).setdefault(value, set()).add(minion_id)
+
+    def _discard(self, minion_id):
+        '''
+        Remove a minion from the indexes
+        '''
+        data = self.data.pop(minion_id, None)
+        if not data:
+            return
+        for search_type in self._values:
+            if not isinstance(data.get(search_type), dict):
+                continue
+            for key, val in six.iteritems(data[search_type]):
+                value = self._scalar_key(val)
+                if value is None:
+                    self._containers[search_type].get(
+                        key, set()).discard(minion_id)
+                    continue
+                values = self._values[search_type].get(key, {})
+                values.get(value, set()).discard(minion_id)
+                if not values.get(value, True):
+                    values.pop(value)
+
+    @staticmethod
+    def _scalar_key(val):
+        '''
+        Return the string that subdict_match compares a scalar value against,
+        or None if the value is a container and needs a full match
+        '''
+        if isinstance(val, (dict, list)):
+            return None
+        try:
+            return str(val).lower()
+        except Exception:
+            return None
+
+    def match(self,
+              search_type,
+              expr,
+              delimiter=DEFAULT_TARGET_DELIM,
+              regex_match=False,
+              exact_match=False):
+        '''
+        Return the set of minion ids whose cached ``search_type`` data matches
+        ``expr``, with the same semantics as ``salt.utils.subdict_match``.
+
+        Only minions holding the top level key named in the expression are
+        considered. Where that key holds a scalar value each distinct value is
+        matched once for all of the minions sharing it, the minions where it
+        holds a dict or list fall back to a full subdict_match on their cached
+        data.
+        '''
+        if delimiter not in expr:
+            return set()
+        key, pattern = expr.split(delimiter, 1)
+        pattern = pattern.lower()
+        values = self._values[search_type].get(key, {})
+        ret = set()
+        if exact_match:
+            ret.update(values.get(pattern, ()))
+        elif regex_match:
+            try:
+                regex = re.compile(pattern)
+            except Exception:
+                log.error('Invalid regex \'{0}\' in match'.format(pattern))
+                return set()
+            for value, ids in six.iteritems(values):
+                if regex.match(value):
+                    ret.update(ids)
+        else:
+            for value, ids in six.iteritems(values):
+                if fnmatch.fnmatch(value, pattern):
+                    ret.update(ids)
+        for minion_id in self._containers[search_type].get(key, ()):
+            if salt.utils.subdict_match(self.data[minion_id][search_type],
+                                        expr,
+                                        delimiter=delimiter,
+                                        regex_match=regex_match,
+                                        exact_match=exact_match):
+                ret.add(minion_id)
+        return ret
+
+
 def nodegroup_comp(nodegroup, nodegroups, skip=None):
     '''
     Recursively expand ``nodegroup`` from ``nodegroups``; ignore nodegroups in ``skip``
@@ -166,6 +412,25 @@ class CkMinions(object):
         else:
             self.acc = 'accepted'
 
+    def publish_targets(self, load):
+        '''
+        Return the list of minions a publication has to be delivered to, or
+        None if it has to be broadcast to every minion.
+
+        Only targets which depend on nothing but the minion id are resolved.
+        The grains and pillar data cached on the master can be stale, and
+        syndics relay publications to minions this master has no keys for.
+        '''
+        if self.opts.get('order_masters'):
+            return None
+        tgt_type = load.get('tgt_type', 'glob')
+        if tgt_type not in ('glob', 'pcre', 'list'):
+            return None
+        if tgt_type == 'glob' and load['tgt'] == '*':
+            return None
+        # a minion listed twice would get the publication twice
+        return sorted(set(self.check_minions(load['tgt'], tgt_type)))
+
     def _check_glob_minions(self, expr, greedy):  # pylint: disable=unused-argument
         '''
         Return the minions found by looking via globs
@@ -218,6 +483,19 @@ class CkMinions(object):
         '''
         cache_enabled = self.opts.get('minion_data_cache', False)
 
+        index = minion_data_index(self.opts)
+        if index is not None:
+            matched = index.match(search_type,
+                                  expr,
+                                  delimiter=delimiter,
+                                  regex_match=regex_match,
+                                  exact_match=exact_match)
+            if not greedy:
+                return list(matched)
+            # Minions without cached data are expected to reply when greedy
+            minions = set(self._all_minions())
+            return list((minions - index.ids()) | (minions & matched))
+
         if greedy:
             mlist = []
             for fn_ in salt.utils.isorted(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
@@ -312,6 +590,15 @@ class CkMinions(object):
             return list()
 
         if cache_enabled:
+            index = minion_data_index(self.opts)
+            if index is not None:
+                if not greedy:
+                    minions = index.ids()
+                for id_ in index.ids():
+                    if not self._ipcidr_match(expr, index.get(id_, 'grains')) \
+                            and id_ in minions:
+                        minions.remove(id_)
+                return list(minions)
             cdir = os.path.join(self.opts['cachedir'], 'minions')
             if not os.path.isdir(cdir):
                 return list(minions)
@@ -329,32 +616,38 @@ class CkMinions(object):
                 except (IOError, OSError):
                     continue
 
-                match = True
-                tgt = expr
-                try:
-                    tgt = ipaddress.ip_network(tgt)
-                    # Target is a network
-                    proto = 'ipv{0}'.format(tgt.version)
-                    if proto not in self.opts['grains']:
-                        match = False
-                    else:
-                        match = salt.utils.network.in_subnet(tgt, self.opts['grains'][proto])
-                except:  # pylint: disable=bare-except
-                    try:
-                       # Target should be an address
-                        proto = 'ipv{0}'.format(ipaddress.ip_address(tgt).version)
-                        if proto not in self.opts['grains']:
-                            match = False
-                        else:
-                            match = tgt in self.opts['grains'][proto]
-                    except:  # pylint: disable=bare-except
-                        log.error('Invalid IP/CIDR target {0}"'.format(tgt))
-
-                if not match and id_ in minions:
+                if not self._ipcidr_match(expr, grains) and id_ in minions:
                     minions.remove(id_)
 
         return list(minions)
 
+    def _ipcidr_match(self, tgt, grains):
+        '''
+        Return whether the addresses in a minion's grains match an IP/CIDR
+        target
+        '''
+        grains = grains or {}
+        match = True
+        try:
+            tgt = ipaddress.ip_network(tgt)
+            # Target is a network
+            proto = 'ipv{0}'.format(tgt.version)
+            if proto not in grains:
+                match = False
+            else:
+                match = salt.utils.network.in_subnet(tgt, grains[proto])
+        except:  # pylint: disable=bare-except
+            try:
+                # Target should be an address
+                proto = 'ipv{0}'.format(ipaddress.ip_address(tgt).version)
+                if proto not in grains:
+                    match = False
+                else:
+                    match = tgt in grains[proto]
+            except:  # pylint: disable=bare-except
+                log.error('Invalid IP/CIDR target {0}"'.format(tgt))
+        return match
+
     def _check_range_minions(self, expr, greedy):
         '''
         Return the minions found by looking via range expression
@@ -555,17 +848,23 @@ class CkMinions(object):
                 addrs.discard('127.0.0.1')
                 addrs.discard('0.0.0.0')
                 addrs.update(set(salt.utils.network.ip_addrs()))
+            index = minion_data_index(self.opts)
             if subset:
                 search = subset
+            elif index is not None:
+                search = index.ids()
             else:
                 search = os.listdir(cdir)
             for id_ in search:
-                datap = os.path.join(cdir, id_, 'data.p')
-                try:
-                    with salt.utils.fopen(datap, 'rb') as fp_:
-                        grains = self.serial.load(fp_).get('grains', {})
-                except (AttributeError, IOError, OSError):
-                    continue
+                if index is not None:
+                    grains = index.get(id_, 'grains') or {}
+                else:
+                    datap = os.path.join(cdir, id_, 'data.p')
+                    try:
+                        with salt.utils.fopen(datap, 'rb') as fp_:
+                            grains = self.serial.load(fp_).get('grains', {})
+                    except (AttributeError, IOError, OSError):
+                        continue
                 for ipv4 in grains.get('ipv4', []):
                     if ipv4 == '127.0.0.1' or ipv4 == '0.0.0.0':
                         continue
@@ -2331,6 +2331,13 @@ class SaltCallOptionParser(six.with_metaclass(OptionParserMeta,
             action='store_true',
             help=('Force a refresh of the grains cache')
         )
+        self.add_option(
+            '--lazy-startup',
+            default=False,
+            action='store_true',
+            help=('Only compute the grains and compile the pillar which the '
+                  'function being run reads.')
+        )
         self.add_option(
             '-t', '--timeout',
             default=60,
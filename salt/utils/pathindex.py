@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+'''
+Sorted path lists which are read through a memory map
+
+The fileserver backends cache the lists of files, directories and symlinks of
+each environment on disk, and every master worker process answers file list
+requests from them. A path index stores each list sorted, with a table of
+offsets in front of the entries, so that a reader maps the file into memory
+and only decodes the entries it returns. Lookups by prefix bisect the table.
+The pages of the file are shared by all of the processes which map it.
+
+An index is written to a temporary file and renamed into place, so readers
+never see a partial index and never need to take a lock.
+
+.. code-block:: python
+
+    import salt.utils.pathindex
+
+    salt.utils.pathindex.write(path, {'files': files, 'symlinks': links})
+    index = salt.utils.pathindex.load(path)
+    index.get('files', prefix='apache/')
+'''
+from __future__ import absolute_import
+
+# Import python libs
+import os
+import mmap
+import struct
+import logging
+import tempfile
+
+# Import salt libs
+import salt.utils
+import salt.utils.atomicfile
+
+# Import 3rd-party libs
+import salt.ext.six as six
+
+log = logging.getLogger(__name__)
+
+MAGIC = b'SPIX'
+VERSION = 1
+
+# magic, version, number of lists
+_HEADER = struct.Struct('<4sII')
+# kind, length of the name
+_LIST = struct.Struct('<BH')
+# number of entries, offset of the table of entry offsets
+_TABLE = struct.Struct('<IQ')
+_OFFSET = struct.Struct('<Q')
+
+# A list of paths, or a dict mapping paths to a value such as a symlink target
+KIND_LIST = 0
+KIND_DICT = 1
+
+# The open indexes of this process, see load()
+_INDEXES = {}
+
+
+def _encode(value):
+    '''
+    Return the utf-8 bytes of a path
+    '''
+    if isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return salt.utils.to_bytes(value, 'utf-8')
+
+
+def _decode(value):
+    '''
+    Return the native string for the bytes of an entry
+    '''
+    if six.PY3:
+        return value.decode('utf-8', 'surrogateescape')
+    return value
+
+
+def write(path, data):
+    '''
+    Write the lists in ``data`` to a path index at ``path``. The values of
+    ``data`` are lists (or sets) of paths, or dicts whose keys are paths and
+    whose values are strings.
+    '''
+    lists = []
+    for name, value in sorted(six.iteritems(data)):
+        if isinstance(value, dict):
+            entries = sorted(
+                _encode(key) + b'\0' + _encode(val)
+                for key, val in six.iteritems(value)
+            )
+            lists.append((_encode(name), KIND_DICT, entries))
+        else:
+            lists.append((_encode(name), KIND_LIST,
+                          sorted(_encode(item) for item in value)))
+
+    # Lay out the header, then each table followed by its entries
+    offset = _HEADER.size + sum(_LIST.size + len(name) + _TABLE.size
+                                for name, _, _ in lists)
+    header = [_HEADER.pack(MAGIC, VERSION, len(lists))]
+    body = []
+    for name, kind, entries in lists:
+        header.append(_LIST.pack(kind, len(name)))
+        header.append(name)
+        header.append(_TABLE.pack(len(entries), offset))
+        entry_offset = offset + _OFFSET.size * (len(entries) + 1)
+        table = []
+        for entry in entries:
+            table.append(_OFFSET.pack(entry_offset))
+            entry_offset += len(entry)
+        table.append(_OFFSET.pack(entry_offset))
+        body.extend(table)
+        body.extend(entries)
+        offset = entry_offset
+
+    cachedir = os.path.dirname(path)
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir)
+    tmpfh, tmpfname = tempfile.mkstemp(dir=cachedir)
+    os.close(tmpfh)
+    with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+        fp_.write(b''.join(header))
+        fp_.write(b''.join(body))
+    salt.utils.atomicfile.atomic_rename(tmpfname, path)
+
+
+def load(path):
+    '''
+    Return the path index at ``path``, or None if there is no valid index
+    there. The index stays mapped for later calls until the file is replaced.
+    '''
+    try:
+        pstat = os.stat(path)
+    except OSError:
+        _INDEXES.pop(path, None)
+        return None
+    key = (pstat.st_ino, pstat.st_mtime, pstat.st_size)
+    index = _INDEXES.get(path)
+    if index is not None and index.key == key:
+        return index
+    try:
+        index = PathIndex(path)
+    except (IOError, OSError, ValueError, struct.error) as exc:
+        log.debug('Unable to load path index {0}: {1}'.format(path, exc))
+        _INDEXES.pop(path, None)
+        return None
+    _INDEXES[path] = index
+    return index
+
+
+class PathIndex(object):
+    '''
+    A path index mapped into memory
+    '''
+    def __init__(self, path):
+        self.path = path
+        with salt.utils.fopen(path, 'rb') as fp_:
+            pstat = os.fstat(fp_.fileno())
+            if pstat.st_size < _HEADER.size:
+                raise ValueError('{0} is not a path index'.format(path))
+            self._map = mmap.mmap(fp_.fileno(), 0, access=mmap.ACCESS_READ)
+        self.key = (pstat.st_ino, pstat.st_mtime, pstat.st_size)
+        self.mtime = pstat.st_mtime
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{0} is not a path index'.format(path))
+        self._lists = {}
+        pos = _HEADER.size
+        for _ in range(count):
+            kind, name_len = _LIST.unpack_from(self._map, pos)
+            pos += _LIST.size
+            name = _decode(self._map[pos:pos + name_len])
+            pos += name_len
+            entries, table = _TABLE.unpack_from(self._map, pos)
+            pos += _TABLE.size
+            self._lists[name] = (kind, entries, table)
+
+    def __contains__(self, name):
+        return name in self._lists
+
+    def count(self, name):
+        '''
+        Return the number of entries in a list
+        '''
+        return self._lists.get(name, (None, 0, None))[1]
+
+    def _entry(self, table, num):
+        start = _OFFSET.unpack_from(self._map, table + _OFFSET.size * num)[0]
+        end = _OFFSET.unpack_from(self._map, table + _OFFSET.size * (num + 1))[0]
+        return self._map[start:end]
+
+    def _bisect(self, table, entries, prefix):
+        '''
+        Return the number of the first entry which is not less than prefix
+        '''
+        low, high = 0, entries
+        while low < high:
+            mid = (low + high) // 2
+            if self._entry(table, mid) < prefix:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def get(self, name, prefix=''):
+        '''
+        Return the list (or dict) called ``name``, limited to the paths which
+        start with ``prefix``. A missing list is returned as an empty list.
+        '''
+        if name not in self._lists:
+            return []
+        kind, entries, table = self._lists[name]
+        prefix = _encode(prefix or '')
+        num = self._bisect(table, entries, prefix) if prefix else 0
+        ret = {} if kind == KIND_DICT else []
+        while num < entries:
+            entry = self._entry(table, num)
+            if not entry.startswith(prefix):
+                break
+            if kind == KIND_DICT:
+                key, val = entry.split(b'\0', 1)
+                ret[_decode(key)] = _decode(val)
+            else:
+                ret.append(_decode(entry))
+            num += 1
+        return ret
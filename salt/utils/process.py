@@ -235,6 +235,140 @@ class ThreadPool(object):
                 log.debug(err, exc_info=True)
 
 
+class ProcessPool(object):
+    '''
+    A pool of forked worker processes which run ``target`` on each item put
+    on the queue with :py:meth:`fire_async`.
+
+    The workers are forked from the process which creates the pool, so they
+    start out with everything it already loaded, and ``target`` does not need
+    to be picklable; only the items on the queue are. ``initializer`` is run
+    once in each new worker before it takes its first item.
+
+    A worker exits after ``max_tasks`` items (0 means never) and after
+    :py:meth:`recycle` was called, and :py:meth:`check_workers` forks
+    replacements. Since the pool cannot notice the exits by itself the owner
+    is expected to call :py:meth:`check_workers` periodically.
+    '''
+    def __init__(self,
+                 target,
+                 num_procs=None,
+                 max_tasks=0,
+                 queue_size=0,
+                 initializer=None,
+                 name=None):
+        if num_procs is None:
+            num_procs = multiprocessing.cpu_count()
+        self.target = target
+        self.num_procs = num_procs
+        self.max_tasks = max_tasks
+        self.initializer = initializer
+        self.name = name or self.__class__.__name__
+
+        self._job_queue = multiprocessing.Queue(queue_size)
+        # bumped by recycle(), workers of an older generation exit
+        self._generation = multiprocessing.Value('i', 0)
+        self._pid = os.getpid()
+        self._workers = []
+        # recycled workers which may still be finishing an item
+        self._retired = []
+        # The workers are not daemonic so that they can fork processes of
+        # their own, terminate them before multiprocessing joins its children
+        # at exit
+        multiprocessing.util.Finalize(None, self.stop, exitpriority=10)
+        self.check_workers()
+
+    def fire_async(self, item):
+        '''
+        Queue an item for the workers, return False if the queue is full
+        '''
+        self.check_workers()
+        try:
+            self._job_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def check_workers(self):
+        '''
+        Reap the workers which exited and fork new ones in their place
+        '''
+        for workers in (self._workers, self._retired):
+            for process in workers[:]:
+                if not process.is_alive():
+                    process.join(0)
+                    workers.remove(process)
+        while len(self._workers) < self.num_procs:
+            process = multiprocessing.Process(target=self._worker,
+                                              args=(self._generation.value,))
+            process.start()
+            log.debug('{0} started worker with pid {1}'.format(self.name,
+                                                             process.pid))
+            self._workers.append(process)
+
+    def recycle(self):
+        '''
+        Replace all of the workers, for instance after the state they were
+        forked with changed. Busy workers finish their current item first.
+        '''
+        with self._generation.get_lock():
+            self._generation.value += 1
+        # The old workers exit by themselves, do not wait for them to fork
+        # the new ones
+        self._retired.extend(self._workers)
+        self._workers = []
+        self.check_workers()
+
+    def stop(self):
+        '''
+        Terminate the workers
+        '''
+        if os.getpid() != self._pid:
+            return
+        with self._generation.get_lock():
+            self._generation.value += 1
+        workers = self._workers + self._retired
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join(1)
+        self._workers = []
+        self._retired = []
+
+    def _worker(self, generation):
+        '''
+        The main loop of a worker process
+        '''
+        salt.utils.appendproctitle(self.name)
+        if self.initializer is not None:
+            self.initializer()
+        tasks = 0
+        while not self.max_tasks or tasks < self.max_tasks:
+            if self._generation.value != generation:
+                break
+            # exit when the process which owns the pool is gone
+            if os.getppid() != self._pid:
+                break
+            try:
+                item = self._job_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, IOError):
+                break
+            if self._generation.value != generation:
+                # recycle() was called while this worker waited for the item,
+                # leave it to the new workers
+                self._job_queue.put(item)
+                break
+            try:
+                self.target(item)
+            except Exception as err:
+                log.error('{0} worker failed to run {1}: {2}'.format(
+                    self.name, item, err), exc_info_on_loglevel=logging.DEBUG)
+            tasks += 1
+
+
 class ProcessManager(object):
     '''
     A class which will manage processes that should be running
@@ -27,6 +27,7 @@ from salt.exceptions import (
 )
 from salt.utils.jinja import ensure_sequence_filter, show_full_context
 from salt.utils.jinja import SaltCacheLoader as JinjaSaltCacheLoader
+from salt.utils.jinja import SaltBytecodeCache as JinjaBytecodeCache
 from salt.utils.jinja import SerializerExtension as JinjaSerializerExtension
 from salt.utils.odict import OrderedDict
 from salt import __path__ as saltpath
@@ -316,7 +317,9 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
     else:
         loader = JinjaSaltCacheLoader(opts, saltenv, pillar_rend=context.get('_pillar_rend', False))
 
-    env_args = {'extensions': [], 'loader': loader}
+    bytecode_cache = JinjaBytecodeCache(opts)
+    env_args = {'extensions': [], 'loader': loader,
+                'bytecode_cache': bytecode_cache}
 
     if hasattr(jinja2.ext, 'with_'):
         env_args['extensions'].append('jinja2.ext.with_')
@@ -363,7 +366,7 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
         decoded_context[key] = salt.utils.locales.sdecode(value)
 
     try:
-        template = jinja_env.from_string(tmplstr)
+        template = bytecode_cache.from_string(jinja_env, tmplstr, tmplpath)
         template.globals.update(decoded_context)
         output = template.render(**decoded_context)
     except jinja2.exceptions.TemplateSyntaxError as exc:
@@ -13,6 +13,8 @@ try:
 except Exception:
     pass
 
+HAS_LIBYAML = hasattr(yaml, 'CSafeLoader')
+
 # This function is safe and needs to stay as yaml.load. The load function
 # accepts a custom loader, and every time this function is used in Salt
 # the custom loader defined below is used. This should be altered though to
@@ -29,14 +31,13 @@ warnings.simplefilter('always', category=DuplicateKeyWarning)
 
 
 # with code integrated from https://gist.github.com/844388
-class SaltYamlSafeLoader(yaml.SafeLoader, object):
+class SaltYamlConstructor(object):
     '''
-    Create a custom YAML loader that uses the custom constructor. This allows
-    for the YAML loading defaults to be manipulated based on needs within salt
+    The custom constructor shared by the Salt YAML loaders. This allows for
+    the YAML loading defaults to be manipulated based on needs within salt
     to make things like sls file more intuitive.
     '''
-    def __init__(self, stream, dictclass=dict):
-        yaml.SafeLoader.__init__(self, stream)
+    def _set_dictclass(self, dictclass):
         if dictclass is not dict:
             # then assume ordered dict and use it for both !map and !omap
             self.add_constructor(
@@ -95,4 +96,30 @@ class SaltYamlSafeLoader(yaml.SafeLoader, object):
                 # an empty string. Change it to '0'.
                 if node.value == '':
                     node.value = '0'
-        return super(SaltYamlSafeLoader, self).construct_scalar(node)
+        return super(SaltYamlConstructor, self).construct_scalar(node)
+
+
+class SaltYamlSafeLoader(SaltYamlConstructor, yaml.SafeLoader):
+    '''
+    Create a custom YAML loader that uses the custom constructor, parsing the
+    YAML in pure Python
+    '''
+    def __init__(self, stream, dictclass=dict):
+        yaml.SafeLoader.__init__(self, stream)
+        self._set_dictclass(dictclass)
+
+
+if HAS_LIBYAML:
+    class SaltYamlCSafeLoader(SaltYamlConstructor, yaml.CSafeLoader):
+        '''
+        Create a custom YAML loader that uses the custom constructor, parsing
+        the YAML with libyaml
+        '''
+        def __init__(self, stream, dictclass=dict):
+            yaml.CSafeLoader.__init__(self, stream)
+            self._set_dictclass(dictclass)
+
+    # The fastest loader available
+    SaltYamlFastLoader = SaltYamlCSafeLoader
+else:
+    SaltYamlFastLoader = SaltYamlSafeLoader
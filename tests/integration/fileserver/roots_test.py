@@ -6,9 +6,11 @@
 # Import Python libs
 from __future__ import absolute_import
 import os
+import shutil
+import tempfile
 
 # Import Salt Testing libs
-from salttesting import skipIf
+from salttesting import skipIf, TestCase
 from salttesting.helpers import ensure_in_syspath
 from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
 ensure_in_syspath('../..')
@@ -17,6 +19,7 @@ ensure_in_syspath('../..')
 import integration
 from salt.fileserver import roots
 from salt import fileclient
+import salt.utils
 
 roots.__opts__ = {}
 
@@ -83,6 +86,28 @@ class RootsTest(integration.ModuleCase):
                          'OLD MAN:  Hee hee ha ha!\n\n',
                  'dest': 'testfile'})
 
+    def test_serve_file_window(self):
+        with patch.dict(roots.__opts__, {'file_roots': self.master_opts['file_roots'],
+                                        'fileserver_ignoresymlinks': False,
+                                        'fileserver_followsymlinks': False,
+                                        'file_ignore_regex': False,
+                                        'file_ignore_glob': False,
+                                        'file_buffer_size': 16,
+                                        'file_transfer_window': 2}):
+            path = os.path.join(integration.FILES, 'file', 'base', 'testfile')
+            fnd = {'path': path, 'rel': 'testfile'}
+            with salt.utils.fopen(path, 'rb') as fp_:
+                contents = fp_.read()
+            # No window requested, a single buffer is sent
+            load = {'saltenv': 'base', 'path': path, 'loc': 0}
+            self.assertEqual(roots.serve_file(load, fnd)['data'], contents[:16])
+            # The requested window is capped by the master
+            load['window'] = 4
+            self.assertEqual(roots.serve_file(load, fnd)['data'], contents[:32])
+            load['loc'] = 32
+            load['window'] = 2
+            self.assertEqual(roots.serve_file(load, fnd)['data'], contents[32:64])
+
     @skipIf(True, "Update test not yet implemented")
     def test_update(self):
         pass
@@ -106,6 +131,28 @@ class RootsTest(integration.ModuleCase):
             ret = roots.file_hash(load, fnd)
             self.assertDictEqual(ret, {'hsum': '98aa509006628302ce38ce521a7f805f', 'hash_type': 'md5'})
 
+    def test_file_hash_index(self):
+        with patch.dict(roots.__opts__, {'file_roots': self.master_opts['file_roots'],
+                                 'fileserver_ignoresymlinks': False,
+                                 'fileserver_followsymlinks': False,
+                                 'file_ignore_regex': False,
+                                 'file_ignore_glob': False,
+                                 'hash_type': self.master_opts['hash_type'],
+                                 'cachedir': self.master_opts['cachedir']}):
+            path = os.path.join(integration.FILES, 'file', 'base', 'testfile')
+            load = {'saltenv': 'base', 'path': path}
+            fnd = {'path': path, 'rel': 'testfile'}
+            roots.file_hash(load, fnd)
+            roots._update_hash_index({path: os.path.getmtime(path)})
+            roots._HASH_INDEX.clear()
+            self.assertEqual(roots._hash_index()[path][0],
+                             '98aa509006628302ce38ce521a7f805f')
+
+            with patch('salt.utils.get_hash') as get_hash:
+                ret = roots.file_hash(load, fnd)
+                self.assertFalse(get_hash.called)
+            self.assertDictEqual(ret, {'hsum': '98aa509006628302ce38ce521a7f805f', 'hash_type': 'md5'})
+
     def test_file_list_emptydirs(self):
         if integration.TMP_STATE_TREE not in self.master_opts['file_roots']['base']:
             self.skipTest('This test fails when using tests/runtests.py. salt-runtests will be available soon.')
@@ -176,6 +223,55 @@ class RootsLimitTraversalTest(integration.ModuleCase):
         self.assertNotIn('test_deep.b.2.test', ret)
 
 
+class RootsPrefixTest(TestCase):
+    '''
+    Test the file lists limited to a prefix
+    '''
+    def setUp(self):
+        self.root = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.cachedir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        for path in ('top.sls', 'webapp.sls', 'web/init.sls',
+                     'web/files/index.html'):
+            path = os.path.join(self.root, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with salt.utils.fopen(path, 'w'):
+                pass
+        self.opts = roots.__opts__
+        roots.__opts__ = {'cachedir': self.cachedir,
+                          'file_roots': {'base': [self.root]},
+                          'fileserver_journal': True,
+                          'fileserver_followsymlinks': True,
+                          'fileserver_ignoresymlinks': False,
+                          'file_ignore_regex': None,
+                          'file_ignore_glob': None,
+                          'fileserver_list_cache_time': 30,
+                          'hash_type': 'md5',
+                          'loop_interval': 60}
+        roots._JOURNAL.clear()
+        roots._HASH_INDEX.clear()
+
+    def tearDown(self):
+        roots.__opts__ = self.opts
+        roots._JOURNAL.clear()
+        roots._HASH_INDEX.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def test_file_list_prefix(self):
+        roots.update()
+        self.assertEqual(
+            roots.file_list({'saltenv': 'base', 'prefix': '/web/'}),
+            ['web/files/index.html', 'web/init.sls', 'webapp.sls'])
+        self.assertEqual(
+            roots.file_list({'saltenv': 'base', 'prefix': 'web/files'}),
+            ['web/files/index.html'])
+        self.assertEqual(
+            roots.dir_list({'saltenv': 'base', 'prefix': 'web'}),
+            ['web', 'web/files'])
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(RootsTest, RootsLimitTraversalTest)
+    run_tests(RootsPrefixTest, needs_daemon=False)
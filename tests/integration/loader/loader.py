@@ -12,10 +12,12 @@ import inspect
 import tempfile
 import shutil
 import os
+import time
 import collections
 
 # Import Salt Testing libs
 from salttesting import TestCase
+from salttesting.mock import patch
 from salttesting.helpers import ensure_in_syspath
 
 ensure_in_syspath('../../')
@@ -24,12 +26,15 @@ import tests.integration
 
 # Import Salt libs
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
+import salt.payload
+import salt.utils
 import salt.ext.six as six
 from salt.ext.six.moves import range
 from salt.config import minion_config
 # pylint: enable=no-name-in-module,redefined-builtin
 
-from salt.loader import LazyLoader, _module_dirs, grains
+from salt.loader import LazyLoader, LazyGrains, _module_dirs, grains, \
+    clear_virtual_cache
 
 
 class LazyLoaderVirtualEnabledTest(TestCase):
@@ -155,6 +160,303 @@ class LazyLoaderWhitelistTest(TestCase):
         self.assertNotIn('grains.get', self.loader)
 
 
+virtual_cache_template = '''
+with open({log!r}, 'a') as fh_:
+    fh_.write(__name__.rsplit('.', 1)[-1] + '\\n')
+
+{virtualname}
+
+def __virtual__():
+    return {virtual}
+
+def test():
+    return True
+'''
+
+
+class LazyLoaderVirtualCacheTest(TestCase):
+    '''
+    Test the loader of salt with the virtual cache
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = {}
+        self.tmp_dir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.opts['cachedir'] = os.path.join(self.tmp_dir, 'cache')
+        self.opts['virtual_cache'] = True
+        self.module_dir = os.path.join(self.tmp_dir, 'modules')
+        os.makedirs(self.module_dir)
+        self.log = os.path.join(self.tmp_dir, 'imports')
+        self.write_module('vcdisabled', "(False, 'missing a dependency')")
+        self.write_module('vcrenamed', "__virtualname__",
+                          "__virtualname__ = 'vcname'")
+        self.write_module('vcplain', 'True')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_module(self, name, virtual, virtualname=''):
+        path = os.path.join(self.module_dir, '{0}.py'.format(name))
+        with open(path, 'w') as fh_:
+            fh_.write(virtual_cache_template.format(log=self.log,
+                                                    virtual=virtual,
+                                                    virtualname=virtualname))
+        try:
+            os.unlink(path + 'c')
+        except OSError:
+            pass
+
+    def imports(self):
+        try:
+            with open(self.log) as fh_:
+                return fh_.read().split()
+        except IOError:
+            return []
+
+    def new_loader(self):
+        return LazyLoader([self.module_dir], self.opts, tag='module')
+
+    def test_renamed_module(self):
+        self.assertTrue(inspect.isfunction(self.new_loader()['vcname.test']))
+        os.unlink(self.log)
+        # the next loader knows which file provides the module
+        self.assertTrue(inspect.isfunction(self.new_loader()['vcname.test']))
+        self.assertEqual(self.imports(), ['vcrenamed'])
+
+    def test_known_failure(self):
+        loader = self.new_loader()
+        self.assertNotIn('vcdisabled.test', loader)
+        self.assertIn('missing a dependency',
+                      loader.missing_fun_string('vcdisabled.test'))
+        self.assertEqual(len(loader), 2)
+        os.unlink(self.log)
+        # the failing module is not imported again
+        loader = self.new_loader()
+        self.assertNotIn('vcdisabled.test', loader)
+        self.assertIn('missing a dependency',
+                      loader.missing_fun_string('vcdisabled.test'))
+        self.assertEqual(len(loader), 2)
+        self.assertNotIn('vcdisabled', self.imports())
+
+    def test_changed_module(self):
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.write_module('vcdisabled', "'vcdisabled'  # fixed")
+        self.assertTrue(inspect.isfunction(self.new_loader()['vcdisabled.test']))
+
+    def test_changed_opts(self):
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.opts['grains'] = {'os': 'Other'}
+        os.unlink(self.log)
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.assertIn('vcdisabled', self.imports())
+
+    def test_expired_entry(self):
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.opts['virtual_cache_ttl'] = 0
+        os.unlink(self.log)
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.assertIn('vcdisabled', self.imports())
+
+    def test_raising_virtual(self):
+        self.write_module('vcraising', "{}['missing']")
+        self.assertNotIn('vcraising.test', self.new_loader())
+        os.unlink(self.log)
+        # only a clean False is remembered
+        self.assertNotIn('vcraising.test', self.new_loader())
+        self.assertIn('vcraising', self.imports())
+
+    def test_import_error(self):
+        with open(os.path.join(self.module_dir, 'vcbroken.py'), 'w') as fh_:
+            fh_.write('import salt.not_a_module\n')
+        self.assertNotIn('vcbroken.test', self.new_loader())
+        loader = self.new_loader()
+        self.assertNotIn('vcbroken', loader._virtual_cache)
+
+    def test_clear(self):
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        clear_virtual_cache(self.opts)
+        os.unlink(self.log)
+        self.assertNotIn('vcdisabled.test', self.new_loader())
+        self.assertIn('vcdisabled', self.imports())
+
+
+class LazyGrainsTest(TestCase):
+    '''
+    Test the grains which are computed as they are read
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.opts = {'cachedir': self.tmp_dir,
+                     'grains': {'roles': ['web']}}
+        self.calls = []
+        self.funcs = {'core.os': self.grain_func('core.os', os='Linux'),
+                      'core.cpu': self.grain_func('core.cpu', num_cpus=4),
+                      'custom.web': self.grain_func('custom.web', web=True)}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def grain_func(self, name, **grains):
+        def func():
+            self.calls.append(name)
+            return grains
+        return func
+
+    def new_grains(self):
+        self.calls = []
+        return LazyGrains(self.opts, self.funcs)
+
+    def test_first_run(self):
+        lazy = self.new_grains()
+        self.assertEqual(lazy['os'], 'Linux')
+        self.assertEqual(sorted(self.calls),
+                         ['core.cpu', 'core.os', 'custom.web'])
+        self.assertEqual(dict(lazy), {'os': 'Linux', 'num_cpus': 4,
+                                      'web': True, 'roles': ['web']})
+
+    def test_known_grains(self):
+        self.assertEqual(len(self.new_grains()), 4)
+        lazy = self.new_grains()
+        self.assertEqual(lazy['os'], 'Linux')
+        self.assertEqual(lazy['roles'], ['web'])
+        self.assertNotIn('kernel', lazy)
+        self.assertEqual(self.calls, ['core.os'])
+        self.assertEqual(len(lazy), 4)
+        self.assertEqual(sorted(self.calls),
+                         ['core.cpu', 'core.os', 'custom.web'])
+
+    def test_override(self):
+        self.funcs['custom.web'] = self.grain_func('custom.web', os='Custom')
+        self.assertEqual(self.new_grains()['os'], 'Custom')
+        lazy = self.new_grains()
+        self.assertEqual(lazy['os'], 'Custom')
+        self.assertNotIn('core.cpu', self.calls)
+
+    def test_moved_grain(self):
+        dict(self.new_grains())
+        self.funcs['core.os'] = self.grain_func('core.os')
+        self.funcs['core.cpu'] = self.grain_func('core.cpu', os='Linux')
+        lazy = self.new_grains()
+        self.assertEqual(lazy['os'], 'Linux')
+        self.assertIn('core.cpu', self.calls)
+        # the record follows the grain
+        lazy = self.new_grains()
+        self.assertEqual(lazy['os'], 'Linux')
+        self.assertEqual(self.calls, ['core.cpu'])
+
+    def test_fingerprint(self):
+        dict(self.new_grains())
+        fingerprint = self.new_grains().fingerprint()
+        self.assertEqual(self.new_grains().fingerprint(), fingerprint)
+        self.assertEqual(self.calls, [])
+        self.funcs['core.cpu'] = self.grain_func('core.cpu', num_cpus=8)
+        lazy = self.new_grains()
+        dict(lazy)
+        self.assertNotEqual(lazy.fingerprint(), fingerprint)
+
+    def test_fingerprint_module_set(self):
+        dict(self.new_grains())
+        fingerprint = self.new_grains().fingerprint()
+        # the recorded grains do not stand for a new set of grain functions
+        self.funcs['custom.db'] = self.grain_func('custom.db', db=True)
+        self.assertNotEqual(self.new_grains().fingerprint(), fingerprint)
+        self.opts['grains'] = {'roles': ['db']}
+        fingerprint = self.new_grains().fingerprint()
+        self.opts['grains'] = {'roles': ['web']}
+        self.assertNotEqual(self.new_grains().fingerprint(), fingerprint)
+        self.assertEqual(self.calls, [])
+
+
+class GrainFuncs(dict):
+    '''
+    Grain functions which are not reloaded by a forced refresh
+    '''
+    def clear(self):
+        pass
+
+
+class GrainsCollectionTest(TestCase):
+    '''
+    Test running and caching the grain functions
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.opts = {'cachedir': self.tmp_dir,
+                     'grains_cache': True,
+                     'grains_cache_expiration': 300}
+        self.calls = []
+        self.funcs = GrainFuncs({
+            'core.os': self.grain_func('core.os', os='Linux'),
+            'core.cpu': self.grain_func('core.cpu', num_cpus=4),
+            'custom.slow': self.grain_func('custom.slow', 0.5, slow=True)})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def grain_func(self, name, delay=0, **grains_data):
+        def func():
+            self.calls.append(name)
+            time.sleep(delay)
+            return grains_data
+        return func
+
+    def grains(self, force_refresh=False):
+        self.calls = []
+        with patch('salt.loader.grain_funcs', return_value=self.funcs):
+            return grains(self.opts, force_refresh)
+
+    def test_cache(self):
+        expected = {'os': 'Linux', 'num_cpus': 4, 'slow': True}
+        self.assertEqual(self.grains(), expected)
+        self.assertEqual(self.grains(), expected)
+        self.assertEqual(self.calls, [])
+
+    def test_ttl(self):
+        self.grains()
+        self.opts['grains_cache_expiration'] = -1
+        self.opts['grains_cache_ttl'] = {'core.c*': 86400}
+        self.assertEqual(self.grains()['num_cpus'], 4)
+        self.assertEqual(sorted(self.calls), ['core.os', 'custom.slow'])
+        self.grains(force_refresh=True)
+        self.assertNotIn('core.cpu', self.calls)
+        self.opts['refresh_grains_cache'] = True
+        self.grains()
+        self.assertIn('core.cpu', self.calls)
+
+    def test_old_cache(self):
+        with salt.utils.fopen(os.path.join(self.tmp_dir, 'grains.cache.p'),
+                              'wb') as fp_:
+            fp_.write(salt.payload.Serial('msgpack').dumps({'os': 'Old'}))
+        self.assertEqual(self.grains()['os'], 'Linux')
+
+    def test_threads(self):
+        self.opts['grains_cache'] = False
+        self.opts['grains_threads'] = 3
+        self.funcs['custom.slower'] = self.grain_func('custom.slower', 0.5,
+                                                      os='Custom')
+        start = time.time()
+        self.assertEqual(self.grains()['os'], 'Custom')
+        self.assertLess(time.time() - start, 0.9)
+
+    def test_timeout(self):
+        self.grains()
+        self.opts['grains_cache_expiration'] = -1
+        self.opts['grains_timeout'] = 0.1
+        self.funcs['custom.slow'] = self.grain_func('custom.slow', 0.5,
+                                                    slow=False)
+        # the grains of the last run are used
+        self.assertTrue(self.grains()['slow'])
+        self.opts['grains_cache'] = False
+        self.assertNotIn('slow', self.grains())
+
+    def test_core_error(self):
+        def fail():
+            raise OSError('failed')
+        self.funcs['core.os'] = fail
+        self.opts['grains_threads'] = 2
+        self.assertRaises(OSError, self.grains)
+
+
 module_template = '''
 __load__ = ['test', 'test_alias']
 __func_alias__ = dict(test_alias='working_alias')
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the time it takes salt-call to start up and run a function with and
+without lazy_startup
+
+    python tests/perf/salt_call_startup.py [-c /etc/salt] [function]
+
+The function defaults to test.ping. The minion is run with a local file
+client, so the pillar is compiled from the pillar_roots instead of being
+fetched from the master, in a temporary cachedir.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function
+import os
+import sys
+import time
+import shutil
+import optparse
+import tempfile
+
+# Import salt libs
+import salt.config
+import salt.minion
+import salt.syspaths
+import salt.utils.lazy
+
+
+def run(config_dir, fun, cachedir, lazy):
+    '''
+    Return the time taken to start a minion and to run the function
+    '''
+    opts = salt.config.minion_config(os.path.join(config_dir, 'minion'))
+    opts['file_client'] = 'local'
+    opts['cachedir'] = cachedir
+    opts['lazy_startup'] = lazy
+    start = time.time()
+    minion = salt.minion.SMinion(opts)
+    started = time.time()
+    ret = minion.functions[fun]()
+    if isinstance(ret, salt.utils.lazy.LazyDict):
+        dict(ret)
+    return started - start, time.time() - started
+
+
+def bench(config_dir, fun, lazy, number):
+    '''
+    Return the best startup and run times, after a run which fills the
+    caches
+    '''
+    cachedir = tempfile.mkdtemp()
+    try:
+        run(config_dir, fun, cachedir, lazy)
+        times = [run(config_dir, fun, cachedir, lazy) for _ in range(number)]
+    finally:
+        shutil.rmtree(cachedir, ignore_errors=True)
+    return min(times, key=sum)
+
+
+def main(argv):
+    parser = optparse.OptionParser()
+    parser.add_option('-c', '--config-dir', default=salt.syspaths.CONFIG_DIR)
+    parser.add_option('-n', '--number', type=int, default=3)
+    options, args = parser.parse_args(argv)
+    fun = args[0] if args else 'test.ping'
+    print('{0}, best of {1} runs'.format(fun, options.number))
+    times = []
+    for name, lazy in (('eager', False), ('lazy_startup', True)):
+        times.append((name, bench(options.config_dir, fun, lazy,
+                                  options.number)))
+    for name, (startup, call) in times:
+        print('  {0:<13} startup {1:8.2f} ms  call {2:8.2f} ms ({3:.1f}x)'.format(
+            name, startup * 1000, call * 1000,
+            sum(times[0][1]) / (startup + call)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
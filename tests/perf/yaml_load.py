@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+Compare the time it takes the Salt YAML loaders to load SLS data
+
+    python tests/perf/yaml_load.py [path/to/file.sls ...]
+
+Without any paths a generated SLS file is loaded.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function
+import sys
+import timeit
+
+# Import salt libs
+import salt.utils
+import salt.utils.yamlloader as yamlloader
+from salt.utils.odict import OrderedDict
+
+
+def generate_sls(count=500):
+    '''
+    Return SLS data managing count files
+    '''
+    lines = []
+    for num in range(count):
+        lines.extend([
+            '/etc/app/file{0}.conf:'.format(num),
+            '  file.managed:',
+            '    - source: salt://app/files/file{0}.conf'.format(num),
+            '    - user: root',
+            '    - mode: 0644',
+            '    - template: jinja',
+            '    - context:',
+            '        port: {0}'.format(8000 + num),
+            '        hosts: [web1, web2, web3]',
+            '    - require:',
+            '      - pkg: app',
+        ])
+    return '\n'.join(lines) + '\n'
+
+
+def bench(loader, data, number):
+    '''
+    Return the best time taken by the loader to load the data
+    '''
+    def load():
+        yamlloader.load(
+            data,
+            Loader=lambda stream: loader(stream, dictclass=OrderedDict))
+    return min(timeit.repeat(load, number=number, repeat=3)) / number
+
+
+def main(paths):
+    sources = []
+    for path in paths:
+        with salt.utils.fopen(path) as fp_:
+            sources.append((path, fp_.read()))
+    if not sources:
+        sources.append(('generated', generate_sls()))
+    loaders = [('pure python', yamlloader.SaltYamlSafeLoader)]
+    if yamlloader.HAS_LIBYAML:
+        loaders.append(('libyaml', yamlloader.SaltYamlCSafeLoader))
+    else:
+        print('libyaml is not available, only the pure python loader is used')
+    for name, data in sources:
+        print('{0} ({1} bytes)'.format(name, len(data)))
+        times = [(lname, bench(loader, data, 5)) for lname, loader in loaders]
+        for lname, secs in times:
+            print('  {0:<12} {1:8.2f} ms ({2:.1f}x)'.format(
+                lname, secs * 1000, times[0][1] / secs))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
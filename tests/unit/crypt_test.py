@@ -107,7 +107,40 @@ class CryptTestCase(TestCase):
         with patch('salt.utils.fopen', mock_open(read_data=PUBKEY_DATA)):
             self.assertTrue(crypt.verify_signature('/keydir/keyname.pub', MSG, SIG))
 
+    def test_negotiate_compression(self):
+        opts = {'transport_compression': 'zlib'}
+        self.assertEqual(crypt.negotiate_compression(opts, ['zlib']), 'zlib')
+        self.assertEqual(crypt.negotiate_compression(opts, 'zlib'), 'zlib')
+        self.assertIsNone(crypt.negotiate_compression(opts, None))
+        self.assertIsNone(crypt.negotiate_compression(opts, ['lz4']))
+        opts['transport_compression'] = False
+        self.assertIsNone(crypt.negotiate_compression(opts, ['zlib']))
+
+
+@skipIf(not HAS_PYCRYPTO_RSA, 'pycrypto >= 2.6 is not available')
+class CrypticleTestCase(TestCase):
+
+    def setUp(self):
+        self.opts = {'transport_compression_threshold': 1024}
+        self.key = crypt.Crypticle.generate_key_string()
+
+    def test_compression(self):
+        small = {'foo': 'bar'}
+        large = {'pkgs': dict(('pkg{0}'.format(idx), '1.0') for idx in range(500))}
+        pcrypt = crypt.Crypticle(self.opts, self.key, compression='zlib')
+        plain = crypt.Crypticle(self.opts, self.key)
+        self.assertEqual(pcrypt.loads(pcrypt.dumps(small)), small)
+        self.assertEqual(pcrypt.stats['compressed'], 0)
+        data = pcrypt.dumps(large)
+        self.assertEqual(pcrypt.stats['compressed'], 1)
+        self.assertTrue(len(data) < len(plain.dumps(large)))
+        # Compressed payloads can be read without negotiating compression
+        self.assertEqual(plain.loads(data), large)
+        # The compression can be chosen per message
+        self.assertEqual(pcrypt.loads(plain.dumps(large, compression='zlib')),
+                         large)
+
 
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(CryptTestCase, needs_daemon=False)
+    run_tests(CryptTestCase, CrypticleTestCase, needs_daemon=False)
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.master_test
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the pre flight checks of the master
+'''
+
+# Import python libs
+from __future__ import absolute_import
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+
+ensure_in_syspath('../')
+
+# Import salt libs
+import salt.master
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+@patch('os.chdir', MagicMock())
+@patch('salt.fileserver.Fileserver', MagicMock())
+class MasterPreFlightTestCase(TestCase):
+
+    def pre_flight(self, offload_cmds):
+        master = salt.master.Master.__new__(salt.master.Master)
+        master.opts = {'fileserver_backend': ['roots'],
+                       'ext_pillar': [],
+                       'worker_offload_cmds': offload_cmds}
+        master._pre_flight()
+
+    def test_offload_cmds(self):
+        self.pre_flight({'_file_recv': 2})
+
+    def test_unsafe_offload_cmds(self):
+        self.assertRaises(SystemExit, self.pre_flight, {'_file_recv': 2, '_return': 2})
+        # compiling a pillar loads the shared fileserver modules again
+        self.assertRaises(SystemExit, self.pre_flight, {'_pillar': 4})
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MasterPreFlightTestCase, needs_daemon=False)
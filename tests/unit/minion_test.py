@@ -6,17 +6,21 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import shutil
+import tempfile
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
-from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
 
 # Import salt libs
 from salt import minion
 from salt.utils import event
 from salt.exceptions import SaltSystemExit
+import salt.payload
 import salt.syspaths
+import salt.utils
 
 ensure_in_syspath('../')
 
@@ -52,6 +56,26 @@ class MinionTestCase(TestCase):
                 result = False
         self.assertTrue(result)
 
+    def test_queued_job_proc_file(self):
+        '''
+        Make sure a job queued to the job workers is recorded in the proc dir
+        '''
+        proc_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, proc_dir)
+        instance = minion.Minion.__new__(minion.Minion)
+        instance.opts = {'multiprocessing': True}
+        instance.proc_dir = proc_dir
+        instance.serial = salt.payload.Serial('msgpack')
+        instance.job_pool = MagicMock()
+        instance.job_pool.fire_async.return_value = True
+        data = {'fun': 'test.sleep', 'jid': '20161017000000000000', 'arg': [60]}
+        instance._handle_decoded_payload(data)
+        instance.job_pool.fire_async.assert_called_once_with(data)
+        with salt.utils.fopen(os.path.join(proc_dir, data['jid']), 'rb') as fp_:
+            sdata = instance.serial.loads(fp_.read())
+        self.assertEqual(sdata['pid'], os.getpid())
+        self.assertEqual(sdata['fun'], 'test.sleep')
+
 
 if __name__ == '__main__':
     from integration import run_tests
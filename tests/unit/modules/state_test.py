@@ -217,7 +217,7 @@ class MockState(object):
 
         @staticmethod
         def call_highstate(exclude, cache, cache_name, force=None,
-                           whitelist=None):
+                           whitelist=None, compile_cache=None):
             '''
                 Mock call_highstate method
             '''
@@ -226,6 +226,7 @@ class MockState(object):
             cache_name = cache_name
             force = force
             whitelist = whitelist
+            compile_cache = compile_cache
             return True
 
 
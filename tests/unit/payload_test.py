@@ -21,6 +21,7 @@ ensure_in_syspath('../')
 
 # Import salt libs
 import salt.payload
+import salt.utils.lazy
 from salt.utils.odict import OrderedDict
 import salt.exceptions
 
@@ -60,6 +61,24 @@ class PayloadTestCase(TestCase):
             self.assertNoOrderedDict(odata)
             self.assertEqual(idata, odata)
 
+    def test_lazy_mappings(self):
+        class Lazy(salt.utils.lazy.LazyDict):
+            def _load(self, key):
+                self._load_all()
+                return key in self._dict
+
+            def _load_all(self):
+                self._dict = {'os': 'Linux', 'roles': ['web']}
+                self.loaded = True
+
+        payload = salt.payload.Serial('msgpack')
+        idata = {'opts': {'grains': Lazy(), 'id': 'minion'},
+                 'loads': [Lazy()]}
+        self.assertEqual(payload.loads(payload.dumps(idata)),
+                         {'opts': {'grains': {'os': 'Linux', 'roles': ['web']},
+                                   'id': 'minion'},
+                          'loads': [{'os': 'Linux', 'roles': ['web']}]})
+
 
 class SREQTestCase(TestCase):
     port = 8845  # TODO: dynamically assign a port?
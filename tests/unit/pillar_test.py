@@ -9,7 +9,11 @@
 
 # Import python libs
 from __future__ import absolute_import
+import copy
+import os
+import shutil
 import tempfile
+import time
 
 # Import Salt Testing libs
 from salttesting import skipIf, TestCase
@@ -18,7 +22,10 @@ from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
 ensure_in_syspath('../')
 
 # Import salt libs
+import salt.loader
+import salt.payload
 import salt.pillar
+import salt.utils
 
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
@@ -176,6 +183,131 @@ ssh:
         client.get_state.side_effect = get_state
 
 
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class PillarCacheTestCase(TestCase):
+    '''
+    Test the master side cache of compiled pillar data
+    '''
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.opts = {
+            'cachedir': self.tmpdir,
+            'pki_dir': self.tmpdir,
+            'pillar_cache_ttl': 3600,
+            'pillar_cache_backend': 'disk',
+        }
+        self.grains = {'id': 'minion', 'os': 'Ubuntu'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _compile(self, cache, pillar, grains=None):
+        with patch('salt.pillar.Pillar') as Pillar:
+            Pillar.return_value.compile_pillar.return_value = pillar
+            ret = cache.compile_pillar(grains or self.grains, 'minion', 'base')
+            return ret, Pillar.called
+
+    def test_cached(self):
+        for backend in ('disk', 'memory'):
+            self.opts['pillar_cache_backend'] = backend
+            cache = salt.pillar.PillarCache(self.opts)
+            self.assertEqual(self._compile(cache, {'foo': backend}), ({'foo': backend}, True))
+            self.assertEqual(self._compile(cache, {'foo': 'new'}), ({'foo': backend}, False))
+            # Other grains compile a new pillar
+            grains = dict(self.grains, os='CentOS')
+            self.assertEqual(self._compile(cache, {'foo': 'new'}, grains), ({'foo': 'new'}, True))
+
+    def test_disk_shared(self):
+        self._compile(salt.pillar.PillarCache(self.opts), {'foo': 'bar'})
+        self.assertEqual(self._compile(salt.pillar.PillarCache(self.opts), {}),
+                         ({'foo': 'bar'}, False))
+
+    def test_encrypted(self):
+        self.opts['pillar_cache_encrypt'] = True
+        cache = salt.pillar.PillarCache(self.opts)
+        self._compile(cache, {'secret': 'hunter2'})
+        with salt.utils.fopen(os.path.join(cache.cachedir, 'minion.p'), 'rb') as fp_:
+            self.assertNotIn('hunter2', fp_.read())
+        self.assertEqual(self._compile(cache, {}), ({'secret': 'hunter2'}, False))
+
+    def test_invalidate(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        self._compile(cache, {'foo': 'bar'})
+        salt.pillar.pillar_cache_stamp(self.opts, 'minion')
+        self.assertEqual(self._compile(cache, {'foo': 'baz'}), ({'foo': 'baz'}, True))
+        self.assertEqual(self._compile(cache, {}), ({'foo': 'baz'}, False))
+        salt.pillar.pillar_cache_stamp(self.opts)
+        self.assertEqual(self._compile(cache, {'foo': 'qux'}), ({'foo': 'qux'}, True))
+
+    def test_ttl(self):
+        self.opts['pillar_cache_ttl'] = 0
+        cache = salt.pillar.PillarCache(self.opts)
+        self._compile(cache, {'foo': 'bar'})
+        time.sleep(0.01)
+        self.assertEqual(self._compile(cache, {'foo': 'baz'}), ({'foo': 'baz'}, True))
+
+    def test_errors_not_cached(self):
+        cache = salt.pillar.PillarCache(self.opts)
+        self._compile(cache, {'_errors': ['failed']})
+        self.assertEqual(self._compile(cache, {'foo': 'bar'}), ({'foo': 'bar'}, True))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class LazyPillarTestCase(TestCase):
+    '''
+    Test the pillar which is compiled when it is read
+    '''
+    def setUp(self):
+        self.opts = {'pillar': {}, 'file_client': 'local'}
+        self.pillar = salt.pillar.LazyPillar(self.opts, {'os': 'Linux'},
+                                             'minion', 'base')
+
+    @patch('salt.pillar.get_pillar')
+    def test_compiled_when_read(self, get_pillar):
+        get_pillar.return_value.compile_pillar.return_value = {'role': 'web'}
+        self.assertFalse(get_pillar.called)
+        self.assertEqual(self.pillar['role'], 'web')
+        self.assertEqual(self.pillar.get('db'), None)
+        get_pillar.assert_called_once_with(
+            {'pillar': {}, 'file_client': 'local'}, {'os': 'Linux'},
+            'minion', 'base', pillarenv=None)
+
+    @patch('salt.pillar.get_pillar')
+    def test_copy(self, get_pillar):
+        get_pillar.return_value.compile_pillar.return_value = {'role': 'web'}
+        uncompiled = copy.deepcopy(self.pillar)
+        self.assertFalse(get_pillar.called)
+        self.assertEqual(dict(uncompiled), {'role': 'web'})
+        self.assertEqual(self.pillar.copy(), {'role': 'web'})
+        self.assertIs(type(copy.deepcopy(self.pillar)), dict)
+
+    @patch('salt.transport.Channel.factory')
+    def test_remote_lazy_grains(self, factory):
+        # the grains of lazy_startup are sent to the master as they are
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        grains = salt.loader.LazyGrains(
+            {'cachedir': tmp_dir, 'grains': {}},
+            {'core.os': lambda: {'os': 'Linux'}})
+        serial = salt.payload.Serial('msgpack')
+        sent = []
+
+        def transfer(load, dictkey=None):
+            sent.append(serial.loads(serial.dumps(load)))
+            return {'role': 'web'}
+        factory.return_value.crypted_transfer_decode_dictentry.side_effect = transfer
+        opts = {'pillar': {}, 'file_client': 'remote'}
+        pillar = salt.pillar.LazyPillar(opts, grains, 'minion', 'base')
+        self.assertEqual(pillar['role'], 'web')
+        self.assertEqual(sent[0]['grains'], {'os': 'Linux'})
+        # the state system passes the grains on without copying them
+        remote = salt.pillar.RemotePillar(dict(opts), grains, 'minion', 'base')
+        self.assertEqual(remote.compile_pillar(), {'role': 'web'})
+        self.assertEqual(sent[1]['grains'], {'os': 'Linux'})
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(PillarTestCase, needs_daemon=False)
+    run_tests(PillarCacheTestCase, needs_daemon=False)
+    run_tests(LazyPillarTestCase, needs_daemon=False)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.returners.sqlite3_local_cache_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import shutil
+import tempfile
+import time
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+from salt.returners import sqlite3_local_cache
+
+sqlite3_local_cache.__opts__ = {}
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+@skipIf(not sqlite3_local_cache.HAS_SQLITE3, 'sqlite3 is not available')
+class SQLite3LocalCacheTestCase(TestCase):
+    '''
+    Test the sqlite3 master job cache
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        sqlite3_local_cache.__opts__ = {'cachedir': self.cachedir,
+                                        'keep_jobs': 24}
+        sqlite3_local_cache._CONN.clear()
+
+    def tearDown(self):
+        if 'conn' in sqlite3_local_cache._CONN:
+            sqlite3_local_cache._CONN['conn'].close()
+        sqlite3_local_cache._CONN.clear()
+        shutil.rmtree(self.cachedir)
+
+    def _save_job(self, fun='test.ping'):
+        jid = sqlite3_local_cache.prep_jid()
+        load = {'jid': jid, 'fun': fun, 'arg': [], 'tgt': '*',
+                'tgt_type': 'glob', 'user': 'root'}
+        with patch('salt.utils.minions.CkMinions.check_minions',
+                   MagicMock(return_value=['minion1', 'minion2'])):
+            sqlite3_local_cache.save_load(jid, load)
+        return jid
+
+    def test_job_roundtrip(self):
+        jid = self._save_job()
+        load = sqlite3_local_cache.get_load(jid)
+        self.assertEqual(load['fun'], 'test.ping')
+        self.assertEqual(load['Minions'], ['minion1', 'minion2'])
+
+        sqlite3_local_cache.returner({'jid': jid, 'id': 'minion1',
+                                      'return': True, 'out': 'highstate'})
+        sqlite3_local_cache.returner({'jid': jid, 'id': 'minion2',
+                                      'return': {'foo': 'bar'}})
+        # A second return from the same minion is dropped
+        self.assertFalse(
+            sqlite3_local_cache.returner({'jid': jid, 'id': 'minion2',
+                                          'return': False}))
+        self.assertEqual(sqlite3_local_cache.get_jid(jid),
+                         {'minion1': {'return': True, 'out': 'highstate'},
+                          'minion2': {'return': {'foo': 'bar'}}})
+
+        self.assertFalse(sqlite3_local_cache.get_endtime(jid))
+        sqlite3_local_cache.update_endtime(jid, 'now')
+        self.assertEqual(sqlite3_local_cache.get_endtime(jid), 'now')
+
+    def test_returner_batch(self):
+        jid = self._save_job()
+        sqlite3_local_cache.returner_batch(
+            [{'jid': jid, 'id': 'minion1', 'return': True},
+             {'jid': jid, 'id': 'minion2', 'return': False},
+             {'jid': jid, 'id': 'minion2', 'return': True}]
+        )
+        self.assertEqual(sqlite3_local_cache.get_jid(jid),
+                         {'minion1': {'return': True},
+                          'minion2': {'return': False}})
+
+    def test_unknown_jid(self):
+        self.assertEqual(sqlite3_local_cache.get_load('20150101000000000000'), {})
+        self.assertEqual(sqlite3_local_cache.get_jid('20150101000000000000'), {})
+        self.assertFalse(
+            sqlite3_local_cache.returner({'jid': '20150101000000000000',
+                                          'id': 'minion1',
+                                          'return': True}))
+
+    def test_get_jids_filter(self):
+        jids = [self._save_job() for _ in range(3)]
+        self._save_job(fun='saltutil.find_job')
+        self.assertEqual(len(sqlite3_local_cache.get_jids()), 4)
+        ret = sqlite3_local_cache.get_jids_filter(2)
+        self.assertEqual([job['JID'] for job in ret], jids[1:])
+        ret = sqlite3_local_cache.get_jids_filter(10, filter_find_job=False)
+        self.assertEqual(len(ret), 4)
+
+    def test_clean_old_jobs(self):
+        old = self._save_job()
+        sqlite3_local_cache.returner({'jid': old, 'id': 'minion1',
+                                      'return': True})
+        with patch('time.time', MagicMock(return_value=time.time() + 3600)):
+            new = self._save_job()
+        sqlite3_local_cache.__opts__['keep_jobs'] = 0.5
+        with patch('time.time', MagicMock(return_value=time.time() + 3600)):
+            sqlite3_local_cache.clean_old_jobs()
+        self.assertEqual(sqlite3_local_cache.get_load(old), {})
+        self.assertEqual(sqlite3_local_cache.get_jid(old), {})
+        self.assertNotEqual(sqlite3_local_cache.get_load(new), {})
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(SQLite3LocalCacheTestCase, needs_daemon=False)
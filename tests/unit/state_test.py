@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.state_test
+    ~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import fnmatch
+import os
+import shutil
+import tempfile
+import time
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import MagicMock, patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import salt libs
+import integration
+import salt.config
+import salt.fileclient
+import salt.loader
+import salt.state
+import salt.utils
+
+
+def _chunk(state, id_, name, sls):
+    return {'state': state, '__id__': id_, 'name': name, '__sls__': sls, 'fun': 'run'}
+
+
+CHUNKS = [
+    _chunk('pkg', 'apache', 'apache2', 'apache'),
+    _chunk('file', 'apache-conf', '/etc/apache2/apache2.conf', 'apache.config'),
+    _chunk('file', 'vhosts', '/etc/apache2/sites-enabled/default', 'apache.config'),
+    _chunk('service', 'apache', 'apache2', 'apache'),
+    _chunk('cmd', 'reload', 'reload', 'apache.reload'),
+    _chunk('pkg', 'nginx', 'nginx', 'nginx'),
+]
+
+
+class RequisiteGraphTestCase(TestCase):
+    '''
+    Test the index used to resolve requisites
+    '''
+    def _scan(self, req):
+        '''
+        Resolve a requisite by scanning every chunk
+        '''
+        req = salt.state.trim_req(req)
+        req_key = next(iter(req))
+        req_val = req[req_key]
+        ret = []
+        for chunk in CHUNKS:
+            if req_key == 'sls':
+                if fnmatch.fnmatch(chunk['__sls__'], req_val):
+                    ret.append(chunk)
+            elif (fnmatch.fnmatch(chunk['name'], req_val) or
+                  fnmatch.fnmatch(chunk['__id__'], req_val)):
+                if chunk['state'] == req_key:
+                    ret.append(chunk)
+        return ret
+
+    def test_resolve(self):
+        graph = salt.state.RequisiteGraph(CHUNKS)
+        for req in ({'pkg': 'apache'},
+                    {'pkg': 'apache2'},
+                    {'pkg.installed': 'nginx'},
+                    {'file': '/etc/apache2/*'},
+                    {'file': 'vhosts'},
+                    {'file': 'apache*'},
+                    {'service': 'apache2'},
+                    {'sls': 'apache'},
+                    {'sls': 'apache.*'},
+                    {'sls': 'apache*'},
+                    {'cmd': 'missing'},
+                    {'sls': 'missing'}):
+            self.assertEqual(graph.resolve(req), self._scan(req), req)
+            # Resolved requisites are remembered
+            self.assertEqual(graph.resolve(req), self._scan(req), req)
+        self.assertEqual(graph.resolve({'pkg': None}), [])
+
+    def test_refs(self):
+        graph = salt.state.RequisiteGraph(CHUNKS)
+        self.assertIs(graph.refs[('service', 'apache')], CHUNKS[3])
+        self.assertIs(graph.refs[('service', 'apache2')], CHUNKS[3])
+        self.assertNotIn(('service', 'nginx'), graph.refs)
+
+    def test_find_name_index(self):
+        high = {
+            'apache': {'pkg': [{'name': 'apache2'}, 'installed'],
+                       '__sls__': 'apache',
+                       '__env__': 'base'},
+            'nginx': {'pkg': [{'name': 'nginx'}, {'pkgs': ['nginx', 'nginx-extras']}]},
+        }
+        index = salt.state._find_name_index(high)
+        for name, state in (('apache2', 'pkg'), ('nginx', 'pkg'), ('apache2', 'file')):
+            self.assertEqual(index.get((state, name), ''),
+                             salt.state.find_name(name, state, high))
+
+
+class StateParallelTestCase(TestCase):
+    '''
+    Test running states in parallel
+    '''
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp(dir=integration.TMP)
+        self.opts = salt.config.minion_config(None)
+        self.opts['root_dir'] = self.root_dir
+        self.opts['cachedir'] = os.path.join(self.root_dir, 'cachedir')
+        self.opts['state_events'] = False
+        self.opts['file_client'] = 'local'
+        self.opts['test'] = False
+        self.opts['grains'] = salt.loader.grains(self.opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def _high(self, states):
+        high = {}
+        for id_, fun, args in states:
+            state, fun = fun.split('.')
+            high[id_] = {state: [fun, {'name': id_}] + args,
+                         '__sls__': 'parallel',
+                         '__env__': 'base'}
+        return high
+
+    def test_parallel(self):
+        state = salt.state.State(self.opts)
+        flag = os.path.join(self.root_dir, 'flag')
+        high = self._high([
+            ('sleep 1 && touch {0}'.format(flag), 'cmd.run',
+             [{'parallel': True}, {'order': 1}]),
+            ('sleep 1', 'cmd.run', [{'parallel': True}, {'order': 2}]),
+            ('sleep 1 ', 'cmd.run', [{'parallel': True}, {'order': 3}]),
+            ('test -f {0}'.format(flag), 'cmd.run',
+             [{'order': 4},
+              {'require': [{'cmd': 'sleep 1 && touch {0}'.format(flag)}]}]),
+        ])
+        start = time.time()
+        ret = state.call_high(high)
+        self.assertLess(time.time() - start, 2.5)
+        self.assertEqual(len(ret), 4)
+        for tag, result in ret.items():
+            self.assertTrue(result['result'], tag)
+        run_nums = sorted(result['__run_num__'] for result in ret.values())
+        self.assertEqual(run_nums, list(range(4)))
+        self.assertEqual(state.parallel_procs, {})
+
+    def test_parallel_limit(self):
+        self.opts['state_parallelism'] = 1
+        state = salt.state.State(self.opts)
+        high = self._high([
+            ('sleep 1', 'cmd.run', [{'parallel': True}]),
+            ('sleep 1 ', 'cmd.run', [{'parallel': True}]),
+        ])
+        start = time.time()
+        ret = state.call_high(high)
+        self.assertGreaterEqual(time.time() - start, 2)
+        self.assertTrue(all(result['result'] for result in ret.values()))
+
+    def test_parallel_failhard(self):
+        state = salt.state.State(self.opts)
+        high = self._high([
+            ('fail', 'test.fail_without_changes',
+             [{'parallel': True}, {'failhard': True}, {'order': 1}]),
+            ('sleep 1', 'cmd.run', [{'order': 2}]),
+            ('skipped', 'test.succeed_without_changes', [{'order': 3}]),
+        ])
+        ret = state.call_high(high)
+        self.assertIn('test_|-fail_|-fail_|-fail_without_changes', ret)
+        self.assertFalse(ret['test_|-fail_|-fail_|-fail_without_changes']['result'])
+        self.assertNotIn('test_|-skipped_|-skipped_|-succeed_without_changes', ret)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class HighStateCompileCacheTestCase(TestCase):
+    '''
+    Test reusing the compiled highstate
+    '''
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp(dir=integration.TMP)
+        self.state_tree = os.path.join(self.root_dir, 'state_tree')
+        os.makedirs(self.state_tree)
+        self.opts = salt.config.minion_config(None)
+        self.opts['root_dir'] = self.root_dir
+        self.opts['cachedir'] = os.path.join(self.root_dir, 'cachedir')
+        self.opts['state_events'] = False
+        self.opts['file_client'] = 'local'
+        self.opts['file_roots'] = {'base': [self.state_tree]}
+        self.opts['test'] = False
+        self.opts['state_compile_cache'] = True
+        self.opts['pillar_opts'] = False
+        self.opts['grains'] = salt.loader.grains(self.opts)
+        self._write('top.sls', 'base:\n  \'*\':\n    - one\n')
+        self._write('one.sls', 'include:\n  - two\none:\n  test.succeed_without_changes\n')
+        self._write('two.sls', 'two:\n  test.succeed_without_changes\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def _write(self, name, contents):
+        with salt.utils.fopen(os.path.join(self.state_tree, name), 'w') as fp_:
+            fp_.write(contents)
+
+    def _highstate(self, **kwargs):
+        '''
+        Run a highstate, return the result and whether it was rendered
+        '''
+        highstate = salt.state.HighState(self.opts)
+        highstate.push_active()
+        try:
+            with patch.object(highstate, 'render_highstate',
+                              side_effect=highstate.render_highstate) as render:
+                ret = highstate.call_highstate(**kwargs)
+        finally:
+            highstate.pop_active()
+        return sorted(result['name'] for result in ret.values()), render.called
+
+    def test_compile_cache(self):
+        self.assertEqual(self._highstate(), (['one', 'two'], True))
+        self.assertEqual(self._highstate(), (['one', 'two'], False))
+        # Bypass the cache
+        self.assertEqual(self._highstate(compile_cache=False), (['one', 'two'], True))
+        # An included file changed
+        self._write('two.sls', 'three:\n  test.succeed_without_changes\n')
+        self.assertEqual(self._highstate(), (['one', 'three'], True))
+        self.assertEqual(self._highstate(), (['one', 'three'], False))
+        # The grains changed
+        self.opts['grains']['compile_cache_test'] = True
+        self.assertEqual(self._highstate(), (['one', 'three'], True))
+
+    def test_compile_cache_master_tops(self):
+        self._write('extra.sls', 'extra:\n  test.succeed_without_changes\n')
+        with patch('salt.fileclient.FSClient.ext_nodes', return_value={}):
+            self.assertEqual(self._highstate(), (['one', 'two'], True))
+            self.assertEqual(self._highstate(), (['one', 'two'], False))
+        # Only the master_tops data changed
+        with patch('salt.fileclient.FSClient.ext_nodes',
+                   return_value={'base': ['extra']}):
+            self.assertEqual(self._highstate(), (['extra', 'one', 'two'], True))
+            self.assertEqual(self._highstate(), (['extra', 'one', 'two'], False))
+
+    def test_compile_cache_disabled(self):
+        self.opts['state_compile_cache'] = False
+        self.assertEqual(self._highstate(), (['one', 'two'], True))
+        self.assertEqual(self._highstate(), (['one', 'two'], True))
+        self.assertFalse(os.path.isfile(
+            os.path.join(self.opts['cachedir'], 'highstate.compiled.p')))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class PrefetchFileHashesTestCase(TestCase):
+    '''
+    Test requesting the hashes of the files referenced by the states at once
+    '''
+    def test_lowstate_file_refs(self):
+        chunks = [
+            {'state': 'file', 'fun': 'managed', '__env__': 'base',
+             'name': '/etc/motd', 'source': ['salt://motd', 'salt://motd.dist'],
+             'defaults': {'banner': 'salt://not/a/file'}},
+            {'state': 'file', 'fun': 'managed', '__env__': 'dev',
+             'name': '/etc/hosts', 'source': u'salt://hosts?saltenv=base'},
+            {'state': 'file', 'fun': 'recurse', '__env__': 'base',
+             'name': '/srv/www', 'source': 'salt://www'},
+            {'state': 'cmd', 'fun': 'run', '__env__': 'base', 'name': 'true',
+             '__sls__': 'salt://ignored'},
+        ]
+        refs, dirs = salt.state.lowstate_file_refs(chunks)
+        self.assertEqual(refs, {'base': set(['salt://motd', 'salt://motd.dist',
+                                             'salt://not/a/file', 'salt://hosts'])})
+        self.assertEqual(dirs, {'base': set(['salt://www'])})
+
+    def test_prefetch_hashes(self):
+        opts = salt.config.minion_config(None)
+        channel = MagicMock()
+        channel.send.return_value = {'motd': {'hsum': 'abc', 'hash_type': 'md5'},
+                                     'missing': ''}
+        with patch('salt.transport.Channel.factory', MagicMock(return_value=channel)):
+            client = salt.fileclient.RemoteClient(opts)
+        client.prefetch_hashes(['salt://motd', 'salt://missing'], 'base')
+        channel.send.assert_called_once_with({'paths': ['motd', 'missing'],
+                                              'saltenv': 'base',
+                                              'cmd': '_file_hash_list'})
+        self.assertEqual(client.hash_file('salt://motd', 'base'),
+                         {'hsum': 'abc', 'hash_type': 'md5'})
+        self.assertEqual(client.hash_file('salt://missing', 'base'), '')
+        self.assertEqual(channel.send.call_count, 1)
+        # Other environments are not prefetched
+        client.hash_file('salt://motd', 'dev')
+        self.assertEqual(channel.send.call_count, 2)
+        client.clear_prefetched_hashes()
+        client.hash_file('salt://motd', 'base')
+        self.assertEqual(channel.send.call_count, 3)
+
+    def test_hash_file_list_fallback(self):
+        opts = salt.config.minion_config(None)
+        channel = MagicMock()
+        # A master which does not support _file_hash_list
+        channel.send.side_effect = [False, {'hsum': 'abc', 'hash_type': 'md5'}]
+        with patch('salt.transport.Channel.factory', MagicMock(return_value=channel)):
+            client = salt.fileclient.RemoteClient(opts)
+        self.assertEqual(client.hash_file_list(['salt://motd'], 'base'),
+                         {'salt://motd': {'hsum': 'abc', 'hash_type': 'md5'}})
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(RequisiteGraphTestCase, needs_daemon=False)
+    run_tests(StateParallelTestCase, needs_daemon=False)
+    run_tests(HighStateCompileCacheTestCase, needs_daemon=False)
+    run_tests(PrefetchFileHashesTestCase, needs_daemon=False)
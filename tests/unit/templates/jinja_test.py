@@ -8,11 +8,14 @@ import tempfile
 import json
 import datetime
 import pprint
+import shutil
+import threading
 
 # Import Salt Testing libs
 from salttesting.unit import skipIf, TestCase
 from salttesting.case import ModuleCase
 from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
 ensure_in_syspath('../../')
 
 # Import salt libs
@@ -22,13 +25,14 @@ from salt.exceptions import SaltRenderError
 from salt.ext.six.moves import builtins
 from salt.utils import get_context
 from salt.utils.jinja import (
+    SaltBytecodeCache,
     SaltCacheLoader,
     SerializerExtension,
     ensure_sequence_filter
 )
 from salt.utils.templates import JINJA, render_jinja_tmpl
 from salt.utils.odict import OrderedDict
-from integration import TMP_CONF_DIR
+from integration import TMP, TMP_CONF_DIR
 
 # Import 3rd party libs
 import yaml
@@ -162,6 +166,13 @@ class TestGetTemplate(TestCase):
                 'extmods'),
         }
 
+    def setUp(self):
+        # the local file client writes the fileserver caches to the cachedir
+        self.local_opts['cachedir'] = tempfile.mkdtemp(dir=TMP)
+
+    def tearDown(self):
+        shutil.rmtree(self.local_opts['cachedir'], ignore_errors=True)
+
     def test_fallback(self):
         '''
         A Template with a filesystem loader is returned as fallback
@@ -229,7 +240,8 @@ class TestGetTemplate(TestCase):
             expected,
             render_jinja_tmpl,
             salt.utils.fopen(filename).read(),
-            dict(opts=self.local_opts, saltenv='test'))
+            dict(opts=dict(self.local_opts, cachedir=TEMPLATES_DIR),
+                 saltenv='test'))
         SaltCacheLoader.file_client = _fc
 
     def test_macro_additional_log_for_undefined(self):
@@ -254,7 +266,8 @@ class TestGetTemplate(TestCase):
             expected,
             render_jinja_tmpl,
             salt.utils.fopen(filename).read(),
-            dict(opts=self.local_opts, saltenv='test'))
+            dict(opts=dict(self.local_opts, cachedir=TEMPLATES_DIR),
+                 saltenv='test'))
         SaltCacheLoader.file_client = _fc
 
     def test_macro_additional_log_syntaxerror(self):
@@ -279,7 +292,8 @@ class TestGetTemplate(TestCase):
             expected,
             render_jinja_tmpl,
             salt.utils.fopen(filename).read(),
-            dict(opts=self.local_opts, saltenv='test'))
+            dict(opts=dict(self.local_opts, cachedir=TEMPLATES_DIR),
+                 saltenv='test'))
         SaltCacheLoader.file_client = _fc
 
     def test_non_ascii_encoding(self):
@@ -717,8 +731,83 @@ class TestDotNotationLookup(ModuleCase):
         ret = self.render(tmpl_str)
         self.assertEqual(ret, 'Hello, jerry.')
 
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class TestBytecodeCache(TestCase):
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=TMP)
+        self.tmplpath = os.path.join(self.cachedir, 'template')
+        self.opts = {'cachedir': self.cachedir, 'jinja_bytecode_cache': True}
+        SaltBytecodeCache.memory.clear()
+
+    def tearDown(self):
+        SaltBytecodeCache.memory.clear()
+        shutil.rmtree(self.cachedir)
+
+    def render(self, tmplstr, tmplpath=None):
+        '''
+        Render a template, return the output and whether it was compiled
+        '''
+        with patch.object(Environment, 'compile', autospec=True,
+                          side_effect=Environment.compile) as compile_:
+            out = render_jinja_tmpl(
+                tmplstr,
+                dict(opts=self.opts, saltenv=None, name='world'),
+                tmplpath=tmplpath)
+        return out, compile_.called
+
+    def test_memory(self):
+        self.assertEqual(self.render('Hello {{ name }}'), ('Hello world', True))
+        self.assertEqual(self.render('Hello {{ name }}'), ('Hello world', False))
+        self.assertEqual(self.render('Bye {{ name }}'), ('Bye world', True))
+        # Templates which are not read from a file are not written to disk
+        self.assertFalse(os.path.isdir(os.path.join(self.cachedir, 'jinja')))
+
+    def test_disk(self):
+        tmplstr = 'Hello {{ name }}'
+        self.assertEqual(self.render(tmplstr, self.tmplpath), ('Hello world', True))
+        SaltBytecodeCache.memory.clear()
+        self.assertEqual(self.render(tmplstr, self.tmplpath), ('Hello world', False))
+        # The source of the template changed
+        SaltBytecodeCache.memory.clear()
+        self.assertEqual(self.render('Bye {{ name }}', self.tmplpath),
+                         ('Bye world', True))
+        self.assertEqual(len(os.listdir(os.path.join(self.cachedir, 'jinja'))), 1)
+
+    def test_options(self):
+        tmplstr = '{% if True %}\nHello {{ name }}{% endif %}'
+        self.assertEqual(self.render(tmplstr), ('\nHello world', True))
+        self.opts['jinja_trim_blocks'] = True
+        self.assertEqual(self.render(tmplstr), ('Hello world', True))
+        self.assertEqual(self.render(tmplstr), ('Hello world', False))
+
+    @patch('salt.utils.jinja.BYTECODE_MEMORY_SIZE', 8)
+    def test_threads(self):
+        env = Environment()
+        errors = []
+
+        def render(num):
+            cache = SaltBytecodeCache(self.opts)
+            try:
+                for count in range(200):
+                    tmpl = cache.from_string(
+                        env, 'T{0} {{{{ n }}}}'.format((num + count) % 20))
+                    tmpl.render(n=1)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=render, args=(num,))
+                   for num in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(SaltBytecodeCache.memory), 8)
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(TestSaltCacheLoader, TestGetTemplate, TestCustomExtensions,
-            TestDotNotationLookup,
+            TestDotNotationLookup, TestBytecodeCache,
               needs_daemon=False)
@@ -8,14 +8,18 @@ from __future__ import absolute_import
 import os
 import threading
 
+import msgpack
 import tornado.gen
 import tornado.ioloop
-from tornado.testing import AsyncTestCase
+import tornado.tcpclient
+from tornado.testing import AsyncTestCase, bind_unused_port, gen_test
 
 import salt.config
 import salt.utils
+import salt.transport.frame
 import salt.transport.server
 import salt.transport.client
+import salt.transport.tcp
 import salt.exceptions
 
 # Import Salt Testing libs
@@ -184,7 +188,77 @@ class AsyncPubChannelTest(BaseTCPPubCase, PubChannelMixin):
     Tests around the publish system
     '''
 
+class PubServerFilteringTest(AsyncTestCase):
+    '''
+    Test which subscribers the TCP publisher writes publications to
+    '''
+    def setUp(self):
+        super(PubServerFilteringTest, self).setUp()
+        self.pub_server = salt.transport.tcp.PubServer(io_loop=self.io_loop)
+        sock, self.port = bind_unused_port()
+        self.pub_server.add_sockets([sock])
+        self.streams = []
+
+    def tearDown(self):
+        for stream in self.streams:
+            stream.close()
+        for client in self.pub_server.clients:
+            client.stream.close()
+        self.pub_server.stop()
+        super(PubServerFilteringTest, self).tearDown()
+
+    @tornado.gen.coroutine
+    def _subscribe(self, id_=None):
+        '''
+        Connect to the publisher, identifying as id_ if one is given
+        '''
+        tcp_client = tornado.tcpclient.TCPClient(io_loop=self.io_loop)
+        stream = yield tcp_client.connect('127.0.0.1', self.port)
+        self.streams.append(stream)
+        if id_ is not None:
+            yield stream.write(salt.transport.frame.frame_msg({'id': id_}))
+        raise tornado.gen.Return(stream)
+
+    @tornado.gen.coroutine
+    def _recv(self, stream):
+        framed_msg_len = yield stream.read_until(' ')
+        framed_msg_raw = yield stream.read_bytes(int(framed_msg_len.strip()))
+        raise tornado.gen.Return(msgpack.loads(framed_msg_raw)['body'])
+
+    @gen_test
+    def test_delivery(self):
+        minion1 = yield self._subscribe('minion1')
+        minion2 = yield self._subscribe('minion2')
+        anonymous = yield self._subscribe()
+        while len(self.pub_server.clients) < 3 \
+                or sorted(self.pub_server.present) != ['minion1', 'minion2']:
+            yield tornado.gen.sleep(0.01)
+
+        # a minion listed twice still gets a single copy
+        yield self.pub_server.publish_payload(
+            {'payload': 'targeted', 'topic_lst': ['minion1', 'minion1']}, None)
+        yield self.pub_server.publish_payload({'payload': 'broadcast'}, None)
+
+        self.assertEqual((yield self._recv(minion1)), 'targeted')
+        self.assertEqual((yield self._recv(minion1)), 'broadcast')
+        self.assertEqual((yield self._recv(minion2)), 'broadcast')
+        # a subscriber which never identified itself gets everything
+        self.assertEqual((yield self._recv(anonymous)), 'targeted')
+        self.assertEqual((yield self._recv(anonymous)), 'broadcast')
+
+    @gen_test
+    def test_disconnect(self):
+        minion1 = yield self._subscribe('minion1')
+        while 'minion1' not in self.pub_server.present:
+            yield tornado.gen.sleep(0.01)
+        minion1.close()
+        while self.pub_server.clients:
+            yield tornado.gen.sleep(0.01)
+        self.assertEqual(self.pub_server.present, {})
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(PubServerFilteringTest, needs_daemon=False)
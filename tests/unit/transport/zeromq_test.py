@@ -6,6 +6,7 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import hashlib
 import threading
 import time
 
@@ -16,9 +17,12 @@ if not hasattr(zmq.eventloop.ioloop, 'ZMQIOLoop'):
 from tornado.testing import AsyncTestCase
 
 import tornado.gen
+import tornado.ioloop
 
 import salt.config
+import salt.payload
 import salt.utils
+import salt.transport.zeromq
 import salt.transport.server
 import salt.transport.client
 import salt.exceptions
@@ -26,6 +30,7 @@ import salt.exceptions
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock
 ensure_in_syspath('../')
 
 import integration
@@ -44,6 +49,8 @@ class BaseZMQReqCase(TestCase):
     '''
     Test the req server/client pair
     '''
+    extra_master_opts = {}
+
     @classmethod
     def setUpClass(cls):
         cls.master_opts = salt.config.master_config(get_config_file_path('master'))
@@ -51,6 +58,7 @@ class BaseZMQReqCase(TestCase):
             'transport': 'zeromq',
             'auto_accept': True,
         })
+        cls.master_opts.update(cls.extra_master_opts)
 
         cls.minion_opts = salt.config.minion_config(get_config_file_path('minion'))
         cls.minion_opts.update({
@@ -121,6 +129,13 @@ class AESReqTestCases(BaseZMQReqCase, ReqChannelMixin):
                 ret = self.channel.send(msg, timeout=1)
 
 
+class OffloadReqTestCases(AESReqTestCases):
+    '''
+    Test the AES req channel with the workers on a DEALER socket
+    '''
+    extra_master_opts = {'worker_offload_cmds': {'_file_recv': 2}}
+
+
 class BaseZMQPubCase(AsyncTestCase):
     '''
     Test the req server/client pair
@@ -183,6 +198,37 @@ class BaseZMQPubCase(AsyncTestCase):
             raise Exception('FDs still attached to the IOLoop: {0}'.format(failures))
 
 
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class PubChannelTopicTest(TestCase):
+    '''
+    Test a minion without zmq_filtering receiving publications from a master
+    which uses topics
+    '''
+    def setUp(self):
+        self.serial = salt.payload.Serial('msgpack')
+        self.channel = salt.transport.zeromq.AsyncZeroMQPubChannel.__new__(
+            salt.transport.zeromq.AsyncZeroMQPubChannel)
+        self.channel.hexid = hashlib.sha1('minion').hexdigest()
+        self.channel.serial = self.serial
+        self.channel._decode_payload = MagicMock(side_effect=tornado.gen.maybe_future)
+
+    def decode(self, topic):
+        messages = [topic, self.serial.dumps({'load': topic})]
+        return tornado.ioloop.IOLoop().run_sync(
+            lambda: self.channel._decode_messages(messages))
+
+    def test_broadcast(self):
+        self.assertEqual(self.decode('broadcast'), {'load': 'broadcast'})
+
+    def test_own_topic(self):
+        hexid = hashlib.sha1('minion').hexdigest()
+        self.assertEqual(self.decode(hexid), {'load': hexid})
+
+    def test_other_topic(self):
+        self.assertIsNone(self.decode(hashlib.sha1('other').hexdigest()))
+        self.assertFalse(self.channel._decode_payload.called)
+
+
 @skipIf(True, 'Skip until we can devote time to fix this test')
 class AsyncPubChannelTest(BaseZMQPubCase, PubChannelMixin):
     '''
@@ -196,3 +242,5 @@ if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(OffloadReqTestCases, needs_daemon=False)
+    run_tests(PubChannelTopicTest, needs_daemon=False)
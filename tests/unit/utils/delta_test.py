@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.delta_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import io
+import os
+import random
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+import salt.fileserver
+import salt.utils
+import salt.utils.delta
+
+# Import 3rd-party libs
+from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+
+
+class DeltaTestCase(TestCase):
+
+    def setUp(self):
+        rand = random.Random(42)
+        self.lines = [
+            'line {0} {1}\n'.format(idx, 'x' * rand.randint(0, 80))
+            for idx in range(20000)
+        ]
+        self.old = ''.join(self.lines).encode()
+
+    def _transfer(self, new, max_literal=65536, max_scan=1048576):
+        '''
+        Rebuild ``new`` from ``self.old`` the way the fileclient does, return
+        the rebuilt data and the number of literal bytes sent
+        '''
+        bsize = salt.utils.delta.block_size(len(self.old))
+        src = io.BytesIO(self.old)
+        blocks = salt.utils.delta.signatures(src, bsize, 'md5')
+        digests = [block[2] for block in blocks]
+        ret = b''
+        sent = 0
+        while True:
+            fp_ = io.BytesIO(new)
+            fp_.seek(len(ret))
+            ops = salt.utils.delta.diff(
+                fp_, digests, bsize, 'md5', max_literal, max_scan)
+            if not ops:
+                return ret, sent
+            sent += sum(len(op) for op in ops if not isinstance(op, int))
+            ret += b''.join(salt.utils.delta.patch(src, blocks, ops))
+
+    def test_blocks(self):
+        bsize = salt.utils.delta.block_size(len(self.old))
+        blocks = list(salt.utils.delta.iter_blocks(io.BytesIO(self.old), bsize))
+        self.assertEqual(b''.join(blocks), self.old)
+        for block in blocks[:-1]:
+            self.assertTrue(bsize <= len(block) <= bsize * 2)
+            self.assertTrue(block.endswith(b'\n'))
+
+    def test_unchanged(self):
+        ret, sent = self._transfer(self.old)
+        self.assertEqual(ret, self.old)
+        self.assertEqual(sent, 0)
+
+    def test_inserted_lines(self):
+        lines = list(self.lines)
+        lines.insert(100, 'a new line\n')
+        lines.insert(15000, 'another new line\n')
+        del lines[9000]
+        new = ''.join(lines).encode()
+        ret, sent = self._transfer(new)
+        self.assertEqual(ret, new)
+        # Only the blocks around the edits are sent
+        self.assertTrue(sent < len(new) / 20)
+
+    def test_binary(self):
+        rand = random.Random(42)
+        self.old = bytes(bytearray(rand.randint(0, 255) for _ in range(300000)))
+        new = self.old[:1000] + b'changed' + self.old[1000:]
+        ret, sent = self._transfer(new, max_literal=4096, max_scan=16384)
+        self.assertEqual(ret, new)
+        self.assertTrue(sent < len(new) / 10)
+
+
+class ServeDeltaTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.path = os.path.join(self.tmpdir, 'data')
+        self.data = b'x' * 8192
+        with salt.utils.fopen(self.path, 'wb') as fp_:
+            fp_.write(self.data)
+        self.fileserver = salt.fileserver.Fileserver.__new__(
+            salt.fileserver.Fileserver)
+        self.fileserver.opts = {'hash_type': 'md5', 'file_buffer_size': 4096}
+        bsize = salt.utils.delta.MIN_BLOCK_SIZE
+        self.load = {'path': 'data', 'saltenv': 'base', 'loc': 0,
+                     'block_size': bsize,
+                     'hash_type': 'md5',
+                     'delta': [block[2] for block in salt.utils.delta.signatures(
+                         io.BytesIO(self.data), bsize, 'md5')]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_local_file(self):
+        ret = self.fileserver._serve_delta(
+            self.load, {'path': self.path, 'rel': 'data'})
+        self.assertEqual(ret['dest'], 'data')
+        self.assertTrue(ret['delta'])
+
+    def test_remote_backend(self):
+        # s3fs finds files by their key in the bucket, without a rel
+        self.assertIsNone(self.fileserver._serve_delta(
+            self.load, {'path': 'bucket/data', 'bucket': 'bucket'}))
+        self.assertIsNone(self.fileserver._serve_delta(
+            self.load, {'path': 'bucket/data', 'rel': 'data'}))
+
+    def test_bad_signature(self):
+        self.load['delta'] = None
+        self.assertIsNone(self.fileserver._serve_delta(
+            self.load, {'path': self.path, 'rel': 'data'}))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(DeltaTestCase, ServeDeltaTestCase, needs_daemon=False)
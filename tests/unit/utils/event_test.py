@@ -10,6 +10,7 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import fnmatch
 import hashlib
 import time
 from tornado.testing import AsyncTestCase
@@ -279,6 +280,20 @@ class TestSaltEvent(TestCase):
             self.assertGotEvent(evt2, {'data': 'foo2'})
             self.assertGotEvent(evt1, {'data': 'foo1'})
 
+    def test_event_unsubscribe(self):
+        '''Test unsubscribing drops the messages nobody subscribed to'''
+        with eventpublisher_process():
+            me = event.MasterEvent(SOCK_DIR, listen=True)
+            me.subscribe('evt')
+            me.subscribe('evt1')
+            me.fire_event({'data': 'foo1'}, 'evt1')
+            me.fire_event({'data': 'foo2'}, 'evt2')
+            me.fire_event({'data': 'foo3'}, 'other')
+            self.assertGotEvent(me.get_event(tag='other'), {'data': 'foo3'})
+            me.unsubscribe('evt')
+            self.assertGotEvent(me.get_event(tag='evt1'), {'data': 'foo1'})
+            self.assertIsNone(me.get_event(tag='evt2', wait=0.5))
+
     def test_event_multiple_clients(self):
         '''Test event is received by multiple clients'''
         with eventpublisher_process():
@@ -340,6 +355,56 @@ class TestSaltEvent(TestCase):
             self.assertGotEvent(evt, {'data': data, 'tag': 'test_master', 'events': None, 'pretag': None})
 
 
+class TestSubscriptionIndex(TestCase):
+    def setUp(self):
+        self.index = event.SubscriptionIndex()
+        self.match = {'startswith': event.SaltEvent._match_tag_startswith,
+                      'fnmatch': lambda tag, search: fnmatch.fnmatch(tag, search),
+                      'endswith': event.SaltEvent._match_tag_endswith}
+
+    def add(self, tag, match_type='startswith'):
+        self.index.add(tag, match_type, self.match[match_type])
+
+    def remove(self, tag, match_type='startswith'):
+        self.index.remove(tag, match_type, self.match[match_type])
+
+    def test_match(self):
+        self.add('salt/job/')
+        self.add('salt/job/20151216')
+        self.add('salt/')
+        self.add('salt/auth', 'endswith')
+        self.add('salt/job/*/ret/web?', 'fnmatch')
+        self.add('')
+        self.assertEqual(
+            sorted(self.index.match('salt/job/20151216/ret/web1')),
+            [('', 'startswith'),
+             ('salt/', 'startswith'),
+             ('salt/job/', 'startswith'),
+             ('salt/job/*/ret/web?', 'fnmatch'),
+             ('salt/job/20151216', 'startswith')])
+        self.assertEqual(sorted(self.index.match('salt/auth')),
+                         [('', 'startswith'),
+                          ('salt/', 'startswith'),
+                          ('salt/auth', 'endswith')])
+        self.assertEqual(self.index.match('minion_start'), [('', 'startswith')])
+        self.assertEqual(len(self.index), 6)
+
+    def test_remove(self):
+        self.add('salt/job/')
+        self.add('salt/job/')
+        self.add('salt/job/1')
+        self.remove('salt/job/')
+        self.assertIn(('salt/job/', 'startswith'), self.index)
+        self.remove('salt/job/')
+        self.assertNotIn(('salt/job/', 'startswith'), self.index)
+        self.assertEqual(self.index.match('salt/job/1'),
+                         [('salt/job/1', 'startswith')])
+        self.remove('salt/job/1')
+        self.assertEqual(self.index.trie, {})
+        self.assertRaises(ValueError, self.remove, 'salt/job/1')
+        self.assertRaises(ValueError, self.remove, 'salt', 'endswith')
+
+
 class TestAsyncEventPublisher(AsyncTestCase):
     def get_new_ioloop(self):
         return zmq.eventloop.ioloop.ZMQIOLoop()
@@ -369,3 +434,4 @@ class TestAsyncEventPublisher(AsyncTestCase):
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(TestSaltEvent, needs_daemon=False)
+    run_tests(TestSubscriptionIndex, needs_daemon=False)
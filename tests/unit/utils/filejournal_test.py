@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.filejournal_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing Libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+
+ensure_in_syspath('../../')
+
+# Import Salt Libs
+import integration
+import salt.utils
+from salt.fileserver import roots
+from salt.utils.filejournal import FileJournal
+
+
+def _write(path, contents='', mtime=None):
+    with salt.utils.fopen(path, 'w') as fp_:
+        fp_.write(contents)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class FileJournalTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        os.makedirs(os.path.join(self.root, 'web', 'conf'))
+        os.makedirs(os.path.join(self.root, 'empty'))
+        _write(os.path.join(self.root, 'top.sls'), mtime=1000)
+        _write(os.path.join(self.root, 'web', 'init.sls'), mtime=1000)
+        _write(os.path.join(self.root, 'web', 'conf', 'httpd.conf'),
+               mtime=1000)
+        os.symlink('init.sls', os.path.join(self.root, 'web', 'link.sls'))
+        self.journal = FileJournal([self.root], use_inotify=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_walk_matches_os_walk(self):
+        expected = sorted(
+            (dirpath, sorted(dirnames), sorted(filenames))
+            for dirpath, dirnames, filenames in os.walk(self.root)
+        )
+        self.assertEqual(sorted(self.journal.walk(self.root)), expected)
+        self.assertTrue(self.journal.islink(self._path('web', 'link.sls')))
+        self.assertFalse(self.journal.islink(self._path('web', 'init.sls')))
+
+    def test_mtime_map(self):
+        mtime_map = self.journal.mtime_map()
+        self.assertEqual(mtime_map[self._path('top.sls')], 1000)
+        self.assertEqual(mtime_map[self._path('web', 'link.sls')], 1000)
+        self.assertEqual(len(mtime_map), 4)
+
+    def test_refresh_unchanged(self):
+        self.assertEqual(self.journal.refresh(), set())
+
+    def test_refresh_modified_file(self):
+        _write(self._path('web', 'conf', 'httpd.conf'), 'Listen 80', 2000)
+        self.assertEqual(self.journal.refresh(),
+                         set([self._path('web', 'conf', 'httpd.conf')]))
+        self.assertEqual(
+            self.journal.mtime_map()[self._path('web', 'conf', 'httpd.conf')],
+            2000)
+
+    def test_refresh_added_and_removed_files(self):
+        _write(self._path('web', 'new.sls'))
+        os.remove(self._path('top.sls'))
+        self.assertEqual(self.journal.refresh(),
+                         set([self._path('web', 'new.sls'),
+                              self._path('top.sls')]))
+        mtime_map = self.journal.mtime_map()
+        self.assertIn(self._path('web', 'new.sls'), mtime_map)
+        self.assertNotIn(self._path('top.sls'), mtime_map)
+
+    def test_refresh_added_and_removed_dirs(self):
+        os.makedirs(self._path('db', 'files'))
+        _write(self._path('db', 'files', 'my.cnf'))
+        shutil.rmtree(self._path('web', 'conf'))
+        self.assertEqual(self.journal.refresh(),
+                         set([self._path('db'),
+                              self._path('db', 'files'),
+                              self._path('db', 'files', 'my.cnf'),
+                              self._path('web', 'conf'),
+                              self._path('web', 'conf', 'httpd.conf')]))
+        expected = sorted(
+            (dirpath, sorted(dirnames), sorted(filenames))
+            for dirpath, dirnames, filenames in os.walk(self.root)
+        )
+        self.assertEqual(sorted(self.journal.walk(self.root)), expected)
+
+    def test_missing_root(self):
+        root = self._path('later')
+        journal = FileJournal([root], use_inotify=False)
+        self.assertEqual(journal.mtime_map(), {})
+        os.makedirs(root)
+        _write(os.path.join(root, 'init.sls'))
+        self.assertEqual(journal.refresh(),
+                         set([root, os.path.join(root, 'init.sls')]))
+
+    def test_followlinks(self):
+        target = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.addCleanup(shutil.rmtree, target, ignore_errors=True)
+        _write(os.path.join(target, 'linked.sls'), mtime=1000)
+        os.symlink(target, self._path('linkdir'))
+        journal = FileJournal([self.root], followlinks=True,
+                              use_inotify=False)
+        self.assertIn(self._path('linkdir', 'linked.sls'),
+                      journal.mtime_map())
+        _write(os.path.join(target, 'linked.sls'), mtime=2000)
+        self.assertEqual(journal.refresh(),
+                         set([self._path('linkdir', 'linked.sls')]))
+        nofollow = FileJournal([self.root], use_inotify=False)
+        self.assertNotIn(self._path('linkdir', 'linked.sls'),
+                         nofollow.mtime_map())
+        self.assertIn('linkdir', dict(
+            (dirpath, dirnames)
+            for dirpath, dirnames, _ in nofollow.walk(self.root)
+        )[self.root])
+
+
+class RootsJournalTestCase(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.cachedir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        _write(os.path.join(self.root, 'top.sls'), 'base: {}')
+        self.opts = getattr(roots, '__opts__', None)
+        roots.__opts__ = {'cachedir': self.cachedir,
+                          'file_roots': {'base': [self.root]},
+                          'fileserver_journal': True,
+                          'fileserver_followsymlinks': True,
+                          'fileserver_ignoresymlinks': False,
+                          'file_ignore_regex': None,
+                          'file_ignore_glob': None,
+                          'fileserver_list_cache_time': 30,
+                          'hash_type': 'md5',
+                          'loop_interval': 60}
+        roots._JOURNAL.clear()
+        roots._HASH_INDEX.clear()
+
+    def tearDown(self):
+        roots.__opts__ = self.opts
+        roots._JOURNAL.clear()
+        roots._HASH_INDEX.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.cachedir, ignore_errors=True)
+
+    def test_update_rewrites_changed_lists(self):
+        roots.update()
+        self.assertEqual(roots.file_list({'saltenv': 'base'}), ['top.sls'])
+        _write(os.path.join(self.root, 'web.sls'), 'pkg: []')
+        # the file lists follow the journal, not the list cache age
+        self.assertEqual(roots.file_list({'saltenv': 'base'}), ['top.sls'])
+        roots.update()
+        self.assertEqual(sorted(roots.file_list({'saltenv': 'base'})),
+                         ['top.sls', 'web.sls'])
+
+    @skipIf(NO_MOCK, NO_MOCK_REASON)
+    def test_update_hashes_served_files(self):
+        web = os.path.join(self.root, 'web.sls')
+        _write(web, 'pkg: []')
+        # a leftover per-file hash cache is removed
+        os.makedirs(os.path.join(self.cachedir, 'roots', 'hash', 'base'))
+        with patch('salt.utils.get_hash') as get_hash:
+            roots.update()
+            self.assertFalse(get_hash.called)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cachedir, 'roots', 'hash'))
+        )
+        self.assertEqual(roots._read_hash_index(), {})
+
+        # a served file is hashed once and queued for the shared index
+        load = {'saltenv': 'base', 'path': 'web.sls'}
+        hsum = roots.file_hash(load, {'path': web, 'rel': 'web.sls'})['hsum']
+        roots._HASH_INDEX.clear()
+        roots.update()
+        self.assertEqual(roots._read_hash_index()[web][0], hsum)
+        with patch('salt.utils.get_hash') as get_hash:
+            roots._HASH_INDEX.clear()
+            roots.file_hash(load, {'path': web, 'rel': 'web.sls'})
+            self.assertFalse(get_hash.called)
+
+        # a changed file is dropped until it is served again
+        _write(web, 'pkg: [vim]', mtime=2000)
+        roots.update()
+        self.assertNotIn(web, roots._read_hash_index())
+
+    def test_update_without_changes_keeps_lists(self):
+        roots.update()
+        list_cache = os.path.join(self.cachedir, 'file_lists', 'roots', 'base.p')
+        os.utime(list_cache, (1000, 1000))
+        roots.update()
+        self.assertEqual(os.path.getmtime(list_cache), 1000)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(FileJournalTestCase, RootsJournalTestCase, needs_daemon=False)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.gitfs_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import subprocess
+import tempfile
+
+# Import Salt Testing Libs
+from salttesting import skipIf, TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import Salt Libs
+import integration
+import salt.utils
+import salt.utils.gitfs as gitfs
+
+HAS_GIT = salt.utils.which('git') is not None
+
+ENTRIES = [
+    ('web', 'tree-web', True, None),
+    ('web/init.sls', 'blob-init', False, None),
+    ('web/files', 'tree-files', True, None),
+    ('web/files/httpd.conf', 'blob-httpd', False, None),
+    ('web/default.conf', 'blob-link', False, 'files/httpd.conf'),
+    ('web/dangling.conf', 'blob-dangling', False, 'nowhere.conf'),
+    ('top.sls', 'blob-top', False, None),
+]
+
+
+class FakeProvider(gitfs.GitProvider):
+    '''
+    A provider serving a fixed tree
+    '''
+    def __init__(self, opts, cache_root, tree_id='tree-1', **conf):
+        self.provider = 'fake'
+        self.tree_id = tree_id
+        self.traversals = 0
+        defaults = {'root': '', 'mountpoint': '', 'base': 'master'}
+        defaults.update(conf)
+        gitfs.GitProvider.__init__(self, opts, 'https://example.com/repo.git',
+                                   defaults, [], cache_root)
+
+    def init_remote(self):
+        return False
+
+    def get_tree(self, tgt_env):
+        return tgt_env == 'base' and self.tree_id or None
+
+    def get_tree_id(self, tree):
+        return tree
+
+    def tree_entries(self, tree):
+        self.traversals += 1
+        for repo_path, blob_id, is_tree, link_tgt in ENTRIES:
+            if self.root and not repo_path.startswith(self.root + '/'):
+                continue
+            yield repo_path, blob_id, is_tree, link_tgt
+
+
+class TreeIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.cache_root = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'hash_type': 'md5'}
+        gitfs._TREE_INDEXES.clear()
+
+    def tearDown(self):
+        gitfs._TREE_INDEXES.clear()
+        shutil.rmtree(self.cache_root, ignore_errors=True)
+
+    def test_index(self):
+        repo = FakeProvider(self.opts, self.cache_root)
+        index = repo.tree_index('base')
+        self.assertEqual(index['tree'], 'tree-1')
+        self.assertEqual(index['files'], {
+            'web/init.sls': 'blob-init',
+            'web/files/httpd.conf': 'blob-httpd',
+            'web/default.conf': 'blob-httpd',
+            'web/dangling.conf': None,
+            'top.sls': 'blob-top'})
+        self.assertEqual(index['symlinks'], {
+            'web/default.conf': 'files/httpd.conf',
+            'web/dangling.conf': 'nowhere.conf'})
+        self.assertEqual(index['dirs'], ['web', 'web/files'])
+        self.assertIsNone(repo.tree_index('dev'))
+
+    def test_root_and_mountpoint(self):
+        repo = FakeProvider(self.opts, self.cache_root,
+                            root='web', mountpoint='salt://srv')
+        index = repo.tree_index('base')
+        self.assertEqual(sorted(index['files']),
+                         ['srv/dangling.conf', 'srv/default.conf',
+                          'srv/files/httpd.conf', 'srv/init.sls'])
+        self.assertEqual(index['files']['srv/default.conf'], 'blob-httpd')
+        self.assertEqual(index['dirs'], ['srv', 'srv/files'])
+
+    def test_index_is_shared(self):
+        FakeProvider(self.opts, self.cache_root).tree_index('base')
+        # another process loads the index from the cachedir
+        gitfs._TREE_INDEXES.clear()
+        repo = FakeProvider(self.opts, self.cache_root)
+        self.assertEqual(repo.tree_index('base')['files']['top.sls'],
+                         'blob-top')
+        self.assertEqual(repo.traversals, 0)
+        # and keeps it in memory
+        os.remove(repo._tree_index_path('tree-1'))
+        repo.tree_index('base')
+        self.assertEqual(repo.traversals, 0)
+
+    def test_ref_moved(self):
+        FakeProvider(self.opts, self.cache_root).tree_index('base')
+        repo = FakeProvider(self.opts, self.cache_root, tree_id='tree-2')
+        self.assertEqual(repo.tree_index('base')['tree'], 'tree-2')
+        self.assertEqual(repo.traversals, 1)
+        repo.prune_tree_indexes(set(['tree-2']))
+        self.assertEqual(os.listdir(repo.tree_index_dir), ['tree-2.p'])
+
+    def test_root_changed(self):
+        FakeProvider(self.opts, self.cache_root).tree_index('base')
+        gitfs._TREE_INDEXES.clear()
+        repo = FakeProvider(self.opts, self.cache_root, root='web')
+        self.assertNotIn('top.sls', repo.tree_index('base')['files'])
+        self.assertEqual(repo.traversals, 1)
+
+
+class TreeEntriesMixin(object):
+    '''
+    Run the tree_entries of a provider against a real repository
+    '''
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        os.makedirs(os.path.join(self.repo_dir, 'web', 'files'))
+        for path in ('top.sls', 'web/init.sls', 'web/files/httpd.conf'):
+            with salt.utils.fopen(os.path.join(self.repo_dir, path), 'w') as fp_:
+                fp_.write('{0}\n'.format(path))
+        os.symlink('files/httpd.conf',
+                   os.path.join(self.repo_dir, 'web', 'default.conf'))
+        self._git('init', '-q')
+        self._git('add', '.')
+        self._git('-c', 'user.name=Salt', '-c', 'user.email=salt@example.com',
+                  'commit', '-q', '-m', 'init')
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir, ignore_errors=True)
+
+    def _git(self, *args):
+        return subprocess.check_output(('git',) + args, cwd=self.repo_dir)
+
+    def _expected(self, root=''):
+        ret = []
+        for line in self._git('ls-tree', '-r', '-t', 'HEAD').splitlines():
+            info, repo_path = line.split('\t', 1)
+            mode, otype, sha = info.split()
+            if root and not repo_path.startswith(root + '/'):
+                continue
+            link_tgt = None
+            if mode == '120000':
+                link_tgt = os.readlink(os.path.join(self.repo_dir, repo_path))
+            ret.append((repo_path, sha, otype == 'tree', link_tgt))
+        return sorted(ret)
+
+    def _entries(self, root=''):
+        provider, tree = self.get_provider()
+        provider.root = root
+        return sorted(provider.tree_entries(tree))
+
+    def test_tree_entries(self):
+        self.assertEqual(self._entries(), self._expected())
+        self.assertIn(('web/default.conf',
+                       self._git('rev-parse', 'HEAD:web/default.conf').strip(),
+                       False,
+                       'files/httpd.conf'),
+                      self._entries())
+
+    def test_tree_entries_root(self):
+        self.assertEqual(self._entries('web'), self._expected('web'))
+        self.assertEqual(self._entries('nowhere'), [])
+
+
+@skipIf(not HAS_GIT, 'git is not installed')
+@skipIf(not gitfs.HAS_GITPYTHON, 'GitPython is not installed')
+class GitPythonTreeEntriesTestCase(TreeEntriesMixin, TestCase):
+
+    def get_provider(self):
+        provider = gitfs.GitPython.__new__(gitfs.GitPython)
+        provider.repo = gitfs.git.Repo(self.repo_dir)
+        return provider, provider.repo.head.commit.tree
+
+
+@skipIf(not HAS_GIT, 'git is not installed')
+@skipIf(not gitfs.HAS_PYGIT2, 'pygit2 is not installed')
+class Pygit2TreeEntriesTestCase(TreeEntriesMixin, TestCase):
+
+    def get_provider(self):
+        provider = gitfs.Pygit2.__new__(gitfs.Pygit2)
+        provider.repo = gitfs.pygit2.Repository(self.repo_dir)
+        return provider, provider.repo.revparse_single('HEAD').tree
+
+
+@skipIf(not HAS_GIT, 'git is not installed')
+@skipIf(not gitfs.HAS_DULWICH, 'Dulwich is not installed')
+class DulwichTreeEntriesTestCase(TreeEntriesMixin, TestCase):
+
+    def get_provider(self):
+        provider = gitfs.Dulwich.__new__(gitfs.Dulwich)
+        provider.repo = gitfs.dulwich.repo.Repo(self.repo_dir)
+        commit = provider.repo.get_object(provider.repo.head())
+        return provider, provider.repo.get_object(commit.tree)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(TreeIndexTestCase,
+              GitPythonTreeEntriesTestCase,
+              Pygit2TreeEntriesTestCase,
+              DulwichTreeEntriesTestCase,
+              needs_daemon=False)
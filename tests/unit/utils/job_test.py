@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.job_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the batched writes of minion returns to the job cache
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import signal
+
+# Import 3rd-party libs
+import tornado.ioloop
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.master
+import salt.utils.job
+
+OPTS = {'master_job_cache': 'local_cache',
+        'job_cache': True,
+        'id': 'master',
+        'pki_dir': '/etc/salt/pki/master',
+        'return_batch_size': 3,
+        'return_batch_latency': 10}
+
+
+class FakeMasterMinion(object):
+    def __init__(self, batch=True):
+        self.returners = {'local_cache.returner': MagicMock(),
+                          'local_cache.get_load': MagicMock(return_value={}),
+                          'local_cache.save_load': MagicMock(),
+                          'local_cache.prep_jid': MagicMock()}
+        if batch:
+            self.returners['local_cache.returner_batch'] = MagicMock()
+
+
+def _load(minion_id):
+    return {'jid': '20151016000000000000',
+            'id': minion_id,
+            'fun': 'test.ping',
+            'return': True}
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ReturnBatchTestCase(TestCase):
+
+    def test_store_returns_batch_api(self):
+        mminion = FakeMasterMinion()
+        loads = [_load('minion1'), _load('minion2')]
+        salt.utils.job.store_returns(OPTS, [(load, None) for load in loads], mminion)
+        mminion.returners['local_cache.returner_batch'].assert_called_once_with(loads)
+        self.assertFalse(mminion.returners['local_cache.returner'].called)
+
+    def test_store_returns_fallback(self):
+        mminion = FakeMasterMinion(batch=False)
+        loads = [_load('minion1'), _load('minion2')]
+        salt.utils.job.store_returns(OPTS, [(load, None) for load in loads], mminion)
+        self.assertEqual(mminion.returners['local_cache.returner'].call_count, 2)
+
+    def test_flush_on_size(self):
+        mminion = FakeMasterMinion()
+        io_loop = MagicMock()
+        batch = salt.utils.job.ReturnBatch(OPTS, mminion, io_loop=io_loop)
+        for minion_id in ('minion1', 'minion2'):
+            salt.utils.job.store_job(OPTS, _load(minion_id), mminion=mminion, batch=batch)
+        self.assertFalse(mminion.returners['local_cache.returner_batch'].called)
+        # The latency flush is scheduled once for the first queued return
+        self.assertEqual(io_loop.call_later.call_count, 1)
+
+        salt.utils.job.store_job(OPTS, _load('minion3'), mminion=mminion, batch=batch)
+        self.assertEqual(
+            len(mminion.returners['local_cache.returner_batch'].call_args[0][0]), 3)
+        io_loop.remove_timeout.assert_called_once_with(
+            io_loop.call_later.return_value)
+        self.assertEqual(batch.queue, [])
+        self.assertEqual(batch.stats['flushed'], 3)
+        self.assertEqual(batch.stats['max_depth'], 3)
+
+    @patch('time.time')
+    def test_flush_on_age(self, now):
+        mminion = FakeMasterMinion()
+        returner_batch = mminion.returners['local_cache.returner_batch']
+        batch = salt.utils.job.ReturnBatch(OPTS, mminion)
+        now.return_value = 1000
+        batch.add(_load('minion1'), None)
+        now.return_value = 1005
+        batch.flush_expired()
+        self.assertFalse(returner_batch.called)
+        # The next return finds the oldest one has waited long enough
+        now.return_value = 1010
+        batch.add(_load('minion2'), None)
+        returner_batch.assert_called_once_with([_load('minion1'), _load('minion2')])
+
+        # A worker without an IOLoop flushes on its poll tick
+        batch.add(_load('minion3'), None)
+        worker = salt.master.FloMWorker.__new__(salt.master.FloMWorker)
+        worker.aes_funcs = MagicMock(return_batch=batch)
+        worker.poller = MagicMock()
+        worker.poller.poll.return_value = []
+        worker.handle_request()
+        self.assertEqual(returner_batch.call_count, 1)
+        now.return_value = 1020
+        worker.handle_request()
+        returner_batch.assert_called_with([_load('minion3')])
+        self.assertEqual(batch.queue, [])
+
+    def test_flush_on_worker_shutdown(self):
+        mminion = FakeMasterMinion()
+        aes_funcs = salt.master.AESFuncs.__new__(salt.master.AESFuncs)
+        aes_funcs.return_batch = salt.utils.job.ReturnBatch(OPTS, mminion)
+        worker = salt.master.MWorker.__new__(salt.master.MWorker)
+        worker.aes_funcs = aes_funcs
+        worker.offload_limits = {}
+        worker.io_loop = tornado.ioloop.IOLoop()
+
+        def handle_return():
+            salt.utils.job.store_job(OPTS, _load('minion1'), mminion=mminion,
+                                     batch=aes_funcs.return_batch)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        handler = signal.signal(signal.SIGTERM, worker._handle_signals)
+        try:
+            worker.io_loop.add_callback(handle_return)
+            worker.io_loop.start()
+        finally:
+            signal.signal(signal.SIGTERM, handler)
+            worker.io_loop.close()
+        self.assertFalse(mminion.returners['local_cache.returner_batch'].called)
+        worker._shutdown()
+        mminion.returners['local_cache.returner_batch'].assert_called_once_with(
+            [_load('minion1')])
+        self.assertEqual(aes_funcs.return_batch.queue, [])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(ReturnBatchTestCase, needs_daemon=False)
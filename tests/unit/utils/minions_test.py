@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.minions_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the in-memory minion data index used for targeting
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import integration
+import salt.payload
+import salt.utils
+import salt.utils.minions
+
+MINION_DATA = {
+    'web1': {'grains': {'os': 'Ubuntu', 'roles': ['web', 'db'], 'num': 2},
+             'pillar': {'env': 'prod'}},
+    'web2': {'grains': {'os': 'CentOS', 'roles': ['web'], 'num': 12},
+             'pillar': {'env': 'dev', 'app': {'name': 'foo'}}},
+    'db1': {'grains': {'os': 'Ubuntu', 'roles': 'db'},
+            'pillar': {'env': 'prod'}},
+}
+
+
+class MinionDataIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.opts = {'cachedir': self.cachedir,
+                     'minion_data_cache': True}
+        self.serial = salt.payload.Serial(self.opts)
+        for minion_id, data in MINION_DATA.items():
+            self._write(minion_id, data)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+        salt.utils.minions._DATA_INDEXES.pop(self.cachedir, None)
+
+    def _write(self, minion_id, data):
+        cdir = os.path.join(self.cachedir, 'minions', minion_id)
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+        with salt.utils.fopen(os.path.join(cdir, 'data.p'), 'w+b') as fp_:
+            self.serial.dump(data, fp_)
+
+    def _subdict_matches(self, search_type, expr, **kwargs):
+        return set(
+            minion_id for minion_id, data in MINION_DATA.items()
+            if salt.utils.subdict_match(data[search_type], expr, **kwargs)
+        )
+
+    def test_match_same_as_subdict_match(self):
+        index = salt.utils.minions.minion_data_index(self.opts)
+        self.assertEqual(index.ids(), set(MINION_DATA))
+        for search_type, expr, kwargs in (
+                ('grains', 'os:Ubuntu', {}),
+                ('grains', 'os:ubu*', {}),
+                ('grains', 'os:(Ubuntu|CentOS)', {'regex_match': True}),
+                ('grains', 'roles:db', {}),
+                ('grains', 'roles:w*', {}),
+                ('grains', 'num:1*', {}),
+                ('grains', 'os', {}),
+                ('grains', 'missing:foo', {}),
+                ('pillar', 'env:prod', {'exact_match': True}),
+                ('pillar', 'env:pro*', {'exact_match': True}),
+                ('pillar', 'app:name:foo', {}),
+                ('pillar', 'app:name', {})):
+            self.assertEqual(index.match(search_type, expr, **kwargs),
+                             self._subdict_matches(search_type, expr, **kwargs),
+                             expr)
+
+    def test_journal_update(self):
+        index = salt.utils.minions.minion_data_index(self.opts)
+        self.assertEqual(index.match('grains', 'os:CentOS'), set(['web2']))
+
+        self._write('web1', {'grains': {'os': 'CentOS'}})
+        # Without a journal entry the change is not visible
+        index = salt.utils.minions.minion_data_index(self.opts)
+        self.assertEqual(index.match('grains', 'os:CentOS'), set(['web2']))
+
+        salt.utils.minions.note_minion_data_change(self.opts, 'web1')
+        index = salt.utils.minions.minion_data_index(self.opts)
+        self.assertEqual(index.match('grains', 'os:CentOS'),
+                         set(['web1', 'web2']))
+        self.assertEqual(index.match('grains', 'roles:db'), set(['db1']))
+
+        shutil.rmtree(os.path.join(self.cachedir, 'minions', 'web2'))
+        salt.utils.minions.note_minion_data_change(self.opts, 'web2')
+        index = salt.utils.minions.minion_data_index(self.opts)
+        self.assertEqual(index.ids(), set(['web1', 'db1']))
+        self.assertEqual(index.match('grains', 'os:CentOS'), set(['web1']))
+
+    def test_disabled(self):
+        self.opts['minion_data_index'] = False
+        self.assertIs(salt.utils.minions.minion_data_index(self.opts), None)
+
+
+class PublishTargetsTestCase(TestCase):
+
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        for minion_id in ('web1', 'web2', 'db1'):
+            with salt.utils.fopen(os.path.join(self.pki_dir, 'minions', minion_id), 'w'):
+                pass
+        self.ckminions = salt.utils.minions.CkMinions({'pki_dir': self.pki_dir})
+
+    def tearDown(self):
+        shutil.rmtree(self.pki_dir)
+
+    def test_publish_targets(self):
+        targets = self.ckminions.publish_targets
+        self.assertEqual(targets({'tgt': 'web*', 'tgt_type': 'glob'}),
+                         ['web1', 'web2'])
+        self.assertEqual(targets({'tgt': '^db', 'tgt_type': 'pcre'}), ['db1'])
+        self.assertEqual(targets({'tgt': ['db1', 'unknown'], 'tgt_type': 'list'}),
+                         ['db1'])
+        self.assertEqual(targets({'tgt': 'web2,db1,web2', 'tgt_type': 'list'}),
+                         ['db1', 'web2'])
+        # Targets which cannot be resolved exactly are broadcast
+        self.assertIsNone(targets({'tgt': '*', 'tgt_type': 'glob'}))
+        self.assertIsNone(targets({'tgt': 'os:Ubuntu', 'tgt_type': 'grain'}))
+        self.ckminions.opts['order_masters'] = True
+        self.assertIsNone(targets({'tgt': 'web*', 'tgt_type': 'glob'}))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MinionDataIndexTestCase, PublishTargetsTestCase, needs_daemon=False)
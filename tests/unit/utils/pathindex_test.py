@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.pathindex_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing Libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import Salt Libs
+import integration
+import salt.utils
+import salt.fileserver
+import salt.utils.locales
+import salt.utils.pathindex as pathindex
+
+FILES = ['top.sls', 'apache/init.sls', 'apache/files/httpd.conf',
+         'apachectl.sls', 'zabbix/init.sls', 'apache/map.jinja']
+
+
+class PathIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.path = os.path.join(self.tmpdir, 'base.p')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_lists(self):
+        pathindex.write(self.path, {'files': FILES,
+                                    'dirs': set(['.', 'apache']),
+                                    'empty_dirs': []})
+        index = pathindex.load(self.path)
+        self.assertEqual(index.get('files'), sorted(FILES))
+        self.assertEqual(index.get('dirs'), ['.', 'apache'])
+        self.assertEqual(index.get('empty_dirs'), [])
+        self.assertEqual(index.get('links'), [])
+        self.assertEqual(index.count('files'), len(FILES))
+        self.assertNotIn('links', index)
+
+    def test_prefix(self):
+        pathindex.write(self.path, {'files': FILES})
+        index = pathindex.load(self.path)
+        self.assertEqual(index.get('files', 'apache/'),
+                         ['apache/files/httpd.conf', 'apache/init.sls',
+                          'apache/map.jinja'])
+        self.assertEqual(index.get('files', 'apache'),
+                         ['apache/files/httpd.conf', 'apache/init.sls',
+                          'apache/map.jinja', 'apachectl.sls'])
+        self.assertEqual(index.get('files', 'zabbix/init.sls'),
+                         ['zabbix/init.sls'])
+        self.assertEqual(index.get('files', 'nginx'), [])
+        self.assertEqual(index.get('files', 'zz'), [])
+
+    def test_dict(self):
+        links = {'apache/current': 'apache/2.4', 'apache': '/srv/apache',
+                 'web': 'apache'}
+        pathindex.write(self.path, {'symlinks': links})
+        index = pathindex.load(self.path)
+        self.assertEqual(index.get('symlinks'), links)
+        self.assertEqual(index.get('symlinks', 'apache/'),
+                         {'apache/current': 'apache/2.4'})
+
+    def test_unicode(self):
+        pathindex.write(self.path, {'files': [u'caf\xe9.sls', 'cafe.sls']})
+        index = pathindex.load(self.path)
+        self.assertEqual(
+            [salt.utils.locales.sdecode(f) for f in index.get('files', 'caf')],
+            ['cafe.sls', u'caf\xe9.sls'])
+
+    def test_reload_on_replace(self):
+        pathindex.write(self.path, {'files': ['top.sls']})
+        index = pathindex.load(self.path)
+        self.assertIs(pathindex.load(self.path), index)
+        pathindex.write(self.path, {'files': ['top.sls', 'web.sls']})
+        self.assertEqual(pathindex.load(self.path).get('files'),
+                         ['top.sls', 'web.sls'])
+
+    def test_invalid(self):
+        self.assertIsNone(pathindex.load(self.path))
+        with salt.utils.fopen(self.path, 'wb') as fp_:
+            fp_.write(b'\x81\xa5files\x90')
+        self.assertIsNone(pathindex.load(self.path))
+
+
+class FileListCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(dir=integration.SYS_TMP_DIR)
+        self.list_cache = os.path.join(self.tmpdir, 'base.p')
+        self.w_lock = os.path.join(self.tmpdir, '.base.w')
+        self.opts = {'fileserver_list_cache_time': 30}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_refresh_and_match(self):
+        self.assertEqual(
+            salt.fileserver.check_file_list_cache(
+                self.opts, 'files', self.list_cache, self.w_lock),
+            (None, True, True))
+        salt.fileserver.write_file_list_cache(
+            self.opts, {'files': FILES}, self.list_cache, self.w_lock)
+        self.assertFalse(os.path.exists(self.w_lock))
+        self.assertEqual(
+            salt.fileserver.check_file_list_cache(
+                self.opts, 'files', self.list_cache, self.w_lock,
+                prefix='zabbix'),
+            (['zabbix/init.sls'], False, False))
+
+    def test_stale_cache_served_while_locked(self):
+        salt.utils.pathindex.write(self.list_cache, {'files': FILES})
+        os.utime(self.list_cache, (1000, 1000))
+        os.mkdir(self.w_lock)
+        self.assertEqual(
+            salt.fileserver.check_file_list_cache(
+                self.opts, 'files', self.list_cache, self.w_lock,
+                prefix='top'),
+            (['top.sls'], False, False))
+
+    def test_stale_cache_refreshed(self):
+        salt.utils.pathindex.write(self.list_cache, {'files': FILES})
+        os.utime(self.list_cache, (1000, 1000))
+        self.assertEqual(
+            salt.fileserver.check_file_list_cache(
+                self.opts, 'files', self.list_cache, self.w_lock),
+            (None, True, True))
+        self.assertTrue(os.path.isdir(self.w_lock))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(PathIndexTestCase, FileListCacheTestCase, needs_daemon=False)
@@ -17,7 +17,7 @@ import salt.utils.process
 
 # Import 3rd-party libs
 import salt.ext.six as six
-from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
+from salt.ext.six.moves import queue, range  # pylint: disable=import-error,redefined-builtin
 
 
 class TestProcessManager(TestCase):
@@ -124,9 +124,129 @@ class TestThreadPool(TestCase):
         self.assertEqual(pool._job_queue.qsize(), 1)
 
 
+class TestProcessPool(TestCase):
+
+    def _collect(self, pool, results, count, timeout=10):
+        '''
+        Wait for ``count`` results of the pool's workers
+        '''
+        ret = []
+        end = time.time() + timeout
+        while len(ret) < count and time.time() < end:
+            pool.check_workers()
+            try:
+                ret.append(results.get(timeout=0.1))
+            except queue.Empty:
+                continue
+        return ret
+
+    def test_basic(self):
+        '''
+        Make sure the pool runs the items in forked workers
+        '''
+        results = multiprocessing.Queue()
+
+        def target(item):
+            results.put((item, os.getpid()))
+
+        pool = salt.utils.process.ProcessPool(target, num_procs=2)
+        self.addCleanup(pool.stop)
+        for item in range(3):
+            self.assertTrue(pool.fire_async(item))
+        ret = self._collect(pool, results, 3)
+        self.assertEqual(sorted(item for item, _ in ret), [0, 1, 2])
+        self.assertNotIn(os.getpid(), [pid for _, pid in ret])
+
+    def test_initializer(self):
+        '''
+        Make sure the initializer runs once in each worker
+        '''
+        results = multiprocessing.Queue()
+        state = {}
+
+        def initializer():
+            state['ready'] = state.get('ready', 0) + 1
+
+        def target(item):
+            results.put(state.get('ready'))
+
+        pool = salt.utils.process.ProcessPool(target, num_procs=1,
+                                              initializer=initializer)
+        self.addCleanup(pool.stop)
+        pool.fire_async(0)
+        pool.fire_async(1)
+        self.assertEqual(self._collect(pool, results, 2), [1, 1])
+        self.assertEqual(state, {})
+
+    def test_max_tasks(self):
+        '''
+        Make sure a worker is replaced after max_tasks items
+        '''
+        results = multiprocessing.Queue()
+
+        def target(item):
+            results.put(os.getpid())
+
+        pool = salt.utils.process.ProcessPool(target, num_procs=1,
+                                              max_tasks=1)
+        self.addCleanup(pool.stop)
+        pool.fire_async(0)
+        pool.fire_async(1)
+        pids = self._collect(pool, results, 2)
+        self.assertEqual(len(pids), 2)
+        self.assertNotEqual(pids[0], pids[1])
+
+    def test_recycle(self):
+        '''
+        Make sure recycled workers are replaced by new ones
+        '''
+        results = multiprocessing.Queue()
+
+        def target(item):
+            results.put(os.getpid())
+
+        pool = salt.utils.process.ProcessPool(target, num_procs=1)
+        self.addCleanup(pool.stop)
+        old_pid = pool._workers[0].pid
+        pool.recycle()
+        self.assertNotEqual(pool._workers[0].pid, old_pid)
+        pool.fire_async(0)
+        self.assertEqual(self._collect(pool, results, 1),
+                         [pool._workers[0].pid])
+
+    def test_recycle_waiting_worker(self):
+        '''
+        Make sure a recycled worker which waits for an item leaves the items
+        queued after recycle() to the new workers
+        '''
+        results = multiprocessing.Queue()
+
+        def target(item):
+            results.put(os.getpid())
+
+        pool = salt.utils.process.ProcessPool(target, num_procs=1)
+        self.addCleanup(pool.stop)
+        # let the worker block on the queue
+        time.sleep(0.5)
+        pool.recycle()
+        for item in range(5):
+            pool.fire_async(item)
+        self.assertEqual(self._collect(pool, results, 5),
+                         [pool._workers[0].pid] * 5)
+
+    def test_full_queue(self):
+        '''
+        Make sure a full queue refuses items
+        '''
+        pool = salt.utils.process.ProcessPool(lambda item: None, num_procs=0,
+                                              queue_size=1)
+        self.assertTrue(pool.fire_async(0))
+        self.assertFalse(pool.fire_async(1))
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(
-        [TestProcessManager, TestThreadPool],
+        [TestProcessManager, TestThreadPool, TestProcessPool],
         needs_daemon=False
     )
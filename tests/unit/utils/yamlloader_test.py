@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.yamlloader_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import textwrap
+
+# Import Salt Testing Libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import Salt Libs
+import salt.utils.yamlloader as yamlloader
+from salt.utils.odict import OrderedDict
+from yaml.constructor import ConstructorError
+
+SLS = textwrap.dedent('''\
+    /etc/motd:
+      file.managed:
+        - source: salt://motd
+        - mode: 0644
+        - user: root
+    zero: 000
+    hex: 0x1f
+    list: [1, 2.5, yes, ~, 'text', "ünïcode"]
+    ''')
+
+
+class YamlLoaderTestCase(TestCase):
+    '''
+    TestCase for salt.utils.yamlloader module
+    '''
+    def _load(self, loader, data, dictclass=dict):
+        return yamlloader.load(
+            data,
+            Loader=lambda stream: loader(stream, dictclass=dictclass))
+
+    def _check_loader(self, loader):
+        data = self._load(loader, SLS)
+        self.assertEqual(data['/etc/motd']['file.managed'][1], {'mode': 644})
+        self.assertEqual(data['zero'], 0)
+        self.assertEqual(data['hex'], 31)
+        self.assertEqual(data['list'], [1, 2.5, True, None, 'text', u'ünïcode'])
+        ordered = self._load(loader, SLS, dictclass=OrderedDict)
+        self.assertIsInstance(ordered, OrderedDict)
+        self.assertEqual(list(ordered), ['/etc/motd', 'zero', 'hex', 'list'])
+        self.assertRaises(ConstructorError, self._load, loader, 'a: 1\na: 2\n')
+        return data
+
+    def test_safe_loader(self):
+        self._check_loader(yamlloader.SaltYamlSafeLoader)
+
+    @skipIf(not yamlloader.HAS_LIBYAML, 'libyaml is not available')
+    def test_c_safe_loader(self):
+        self.assertIs(yamlloader.SaltYamlFastLoader,
+                      yamlloader.SaltYamlCSafeLoader)
+        self.assertEqual(self._check_loader(yamlloader.SaltYamlCSafeLoader),
+                         self._load(yamlloader.SaltYamlSafeLoader, SLS))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(YamlLoaderTestCase, needs_daemon=False)